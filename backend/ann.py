@@ -0,0 +1,228 @@
+# backend/ann.py
+"""
+Approximate nearest-neighbour index selection for FAISS.
+
+Chunks are always embedded into an exact flat index first (that is what
+streaming ingest appends to). Once ingest finishes, `finalize_index`
+converts it into the configured index type — training IVF quantizers on
+the ingested vectors — so the expensive work happens at ingest time and
+queries only pay for the approximate search.
+
+Index types (all L2, matching LangChain's FAISS default):
+
+- flat      exact search, memory d*4 bytes/vector, cost linear in size
+- hnsw      graph search, best recall/latency on CPU, ~+M*8 bytes/vector
+- ivf_flat  inverted lists over full vectors, tuned by nprobe
+- ivf_pq    inverted lists over product-quantized codes, smallest memory
+
+Vectors of flat, hnsw and ivf_flat indexes are stored with the configured
+encoding (VECTOR_ENCODING): float32, float16 (half the memory, ranking
+practically unchanged) or int8 (a quarter, per-dimension scalar
+quantization trained on the ingested vectors). ivf_pq is already
+compressed and ignores it.
+"""
+from __future__ import annotations
+
+import math
+from typing import Optional
+
+import faiss
+import numpy as np
+
+from backend.config import (
+    ANN_EF_SEARCH,
+    ANN_FLAT_MAX_VECTORS,
+    ANN_HNSW_M,
+    ANN_HNSW_MAX_VECTORS,
+    ANN_INDEX_TYPE,
+    ANN_IVF_FLAT_MAX_VECTORS,
+    ANN_NPROBE,
+    ANN_PQ_BITS,
+    VECTOR_ENCODING,
+)
+
+INDEX_TYPES = {"auto", "flat", "hnsw", "ivf_flat", "ivf_pq"}
+VECTOR_ENCODINGS = {"float32", "float16", "int8"}
+
+_SCALAR_QUANTIZERS = {
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# FAISS wants roughly this many training points per IVF centroid
+_MIN_POINTS_PER_CENTROID = 39
+
+
+def choose_index_type(n_vectors: int) -> str:
+    """Pick an index type from the corpus size."""
+    if n_vectors <= ANN_FLAT_MAX_VECTORS:
+        return "flat"
+    if n_vectors <= ANN_HNSW_MAX_VECTORS:
+        return "hnsw"
+    if n_vectors <= ANN_IVF_FLAT_MAX_VECTORS:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+def _nlist(n_vectors: int) -> int:
+    """Number of IVF lists: ~4*sqrt(n), capped by available training data."""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // _MIN_POINTS_PER_CENTROID))
+
+
+def _pq_subquantizers(dim: int) -> int:
+    """Largest divisor of `dim` that keeps sub-vectors >= 4 dims (max 64)."""
+    for m in range(min(64, dim // 4), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def build_index(
+    vectors: np.ndarray,
+    index_type: str = ANN_INDEX_TYPE,
+    encoding: str = VECTOR_ENCODING,
+) -> faiss.Index:
+    """
+    Build, train (if needed) and fill an index of `index_type` over
+    `vectors`, storing them with `encoding`. Positions in the index
+    follow the row order of `vectors`.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown ANN index type: {index_type}")
+    if encoding not in VECTOR_ENCODINGS:
+        raise ValueError(f"Unknown vector encoding: {encoding}")
+
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n_vectors, dim = vectors.shape
+
+    if index_type == "auto":
+        index_type = choose_index_type(n_vectors)
+
+    # Too few vectors to train IVF: exact search is both cheaper and exact
+    if index_type.startswith("ivf") and n_vectors < 2 * _MIN_POINTS_PER_CENTROID:
+        index_type = "flat"
+    # PQ codebooks need ~39 points per code as well
+    if index_type == "ivf_pq" and n_vectors < (1 << ANN_PQ_BITS) * _MIN_POINTS_PER_CENTROID:
+        index_type = "ivf_flat"
+
+    qtype = _SCALAR_QUANTIZERS.get(encoding)
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim) if qtype is None else faiss.IndexScalarQuantizer(dim, qtype)
+    elif index_type == "hnsw":
+        index = (
+            faiss.IndexHNSWFlat(dim, ANN_HNSW_M)
+            if qtype is None
+            else faiss.IndexHNSWSQ(dim, qtype, ANN_HNSW_M)
+        )
+    elif index_type == "ivf_flat":
+        quantizer = faiss.IndexFlatL2(dim)
+        index = (
+            faiss.IndexIVFFlat(quantizer, dim, _nlist(n_vectors))
+            if qtype is None
+            else faiss.IndexIVFScalarQuantizer(quantizer, dim, _nlist(n_vectors), qtype)
+        )
+    else:
+        index = faiss.IndexIVFPQ(
+            faiss.IndexFlatL2(dim), dim, _nlist(n_vectors), _pq_subquantizers(dim), ANN_PQ_BITS
+        )
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+
+    configure_search(index)
+    return index
+
+
+def configure_search(
+    index: faiss.Index,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+) -> faiss.Index:
+    """
+    Apply query-time knobs: `nprobe` (IVF lists scanned) and `efSearch`
+    (HNSW candidate list size). Higher means better recall, slower search.
+    """
+    ivf = None
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        pass
+
+    if ivf is not None:
+        ivf.nprobe = min(nprobe or ANN_NPROBE, ivf.nlist)
+
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search or ANN_EF_SEARCH
+
+    return index
+
+
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def index_encoding_of(index: faiss.Index) -> str:
+    """How the vectors are stored: a VECTOR_ENCODINGS value, or "pq"."""
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    sq = getattr(index, "sq", None)
+    if sq is not None:
+        for encoding, qtype in _SCALAR_QUANTIZERS.items():
+            if sq.qtype == qtype:
+                return encoding
+    return "float32"
+
+
+def vector_bytes(index: faiss.Index) -> int:
+    """
+    Memory taken by the stored vector codes (graph links and inverted
+    list bookkeeping not included).
+    """
+    try:
+        code_size = faiss.extract_index_ivf(index).code_size
+    except RuntimeError:
+        inner = faiss.downcast_index(index.storage) if isinstance(index, faiss.IndexHNSW) else index
+        code_size = getattr(inner, "code_size", index.d * 4)
+    return index.ntotal * code_size
+
+
+def index_vectors(index: faiss.Index) -> np.ndarray:
+    """
+    Every vector of `index`, in position order (approximate for PQ).
+    """
+    try:
+        faiss.extract_index_ivf(index).make_direct_map()
+    except RuntimeError:
+        pass  # not an IVF index: reconstruct works directly
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def finalize_index(
+    vectorstore,
+    index_type: str = ANN_INDEX_TYPE,
+    encoding: str = VECTOR_ENCODING,
+) -> None:
+    """
+    Replace a LangChain FAISS store's flat index with `index_type` stored
+    as `encoding`, in place. Vector positions (and so
+    `index_to_docstore_id`) are preserved.
+    """
+    index = vectorstore.index
+    if index.ntotal == 0:
+        return
+
+    target = choose_index_type(index.ntotal) if index_type == "auto" else index_type
+    if target == "flat" and index_type_of(index) == "flat" and index_encoding_of(index) == encoding:
+        return
+
+    vectors = index.reconstruct_n(0, index.ntotal)
+    vectorstore.index = build_index(vectors, target, encoding)
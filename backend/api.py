@@ -0,0 +1,307 @@
+# backend/api.py
+"""
+Asyncio HTTP API around ChatService (aiohttp).
+
+One process serves many clients: the model, graph, ChatService and index
+registry are created once and shared by every request. Each API session
+maps 1:1 to a graph `thread_id` and owns a DocumentCollection.
+
+Endpoints:
+    GET    /health
+    GET    /metrics                           Prometheus text format (backend/metrics.py)
+    POST   /sessions                          {"persona", "language", "retrieval_mode", "library"}
+    GET    /sessions/{session_id}
+    DELETE /sessions/{session_id}
+    POST   /sessions/{session_id}/documents   multipart upload, field "file"
+    DELETE /sessions/{session_id}/documents/{doc_id}
+    POST   /sessions/{session_id}/chat        {"message", "use_rag"} -> text/event-stream
+
+The chat stream sends `token` events ({"text": ...}) as the answer is
+generated, then one `done` event ({"answer": ...}), or an `error` event.
+
+Session metadata lives in this process (conversation state is in the
+local checkpointer), so a load balancer should route a session to the
+same instance (sticky sessions).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+from aiohttp import web
+
+from backend import metrics
+from backend.chat_service import ChatService
+from backend.collection import DocumentCollection
+from backend.config import API_MAX_UPLOAD_BYTES, API_SESSION_IDLE_SECONDS
+from backend.document_rag import SUPPORTED_EXTENSIONS, compute_file_hash
+from backend.index_registry import get_index_registry
+from backend.library import load_library
+from backend.rag import RETRIEVAL_MODES
+from backend.streaming import acoalesce
+
+
+@dataclass
+class Session:
+    session_id: str
+    persona: str = "Friendly Assistant"
+    language: str = "English"
+    retrieval_mode: Optional[str] = None
+    collection: DocumentCollection = field(default_factory=DocumentCollection)
+    last_access: float = field(default_factory=time.monotonic)
+
+    def to_json(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "persona": self.persona,
+            "language": self.language,
+            "retrieval_mode": self.retrieval_mode,
+            "documents": [
+                {"doc_id": doc_id, "filename": filename}
+                for doc_id, filename in self.collection.documents()
+            ],
+        }
+
+
+CHAT_SERVICE = web.AppKey("chat_service", ChatService)
+REGISTRY = web.AppKey("registry", object)
+SESSIONS = web.AppKey("sessions", dict)
+
+
+def _error(exc_class, message: str):
+    return exc_class(text=json.dumps({"error": message}), content_type="application/json")
+
+
+def _session(request: web.Request) -> Session:
+    session = request.app[SESSIONS].get(request.match_info["session_id"])
+    if session is None:
+        raise _error(web.HTTPNotFound, "Unknown session")
+    session.last_access = time.monotonic()
+    return session
+
+
+def _release_session(app: web.Application, session: Session) -> None:
+    for doc_id in session.collection.doc_ids():
+        session.collection.remove(doc_id)
+        app[REGISTRY].release(doc_id, owner=session.session_id)
+
+
+async def _read_json(request: web.Request) -> dict:
+    if not request.can_read_body:
+        return {}
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise _error(web.HTTPBadRequest, "Body must be JSON")
+    if not isinstance(body, dict):
+        raise _error(web.HTTPBadRequest, "Body must be a JSON object")
+    return body
+
+
+# ---------------------------------------------------------------------
+# Handlers
+# ---------------------------------------------------------------------
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok", "sessions": len(request.app[SESSIONS])})
+
+
+async def metrics_endpoint(request: web.Request) -> web.Response:
+    # text/plain; version=0.0.4 is the Prometheus exposition content type
+    response = web.Response(text=metrics.prometheus_text(), content_type="text/plain")
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return response
+
+
+async def create_session(request: web.Request) -> web.Response:
+    body = await _read_json(request)
+    retrieval_mode = body.get("retrieval_mode")
+    if retrieval_mode is not None and retrieval_mode not in RETRIEVAL_MODES:
+        raise _error(web.HTTPBadRequest, f"retrieval_mode must be one of {sorted(RETRIEVAL_MODES)}")
+
+    session = Session(
+        session_id=str(uuid.uuid4()),
+        retrieval_mode=retrieval_mode,
+        collection=DocumentCollection(request.app[REGISTRY]),
+    )
+    if body.get("persona"):
+        session.persona = str(body["persona"])
+    if body.get("language"):
+        session.language = str(body["language"])
+    if body.get("library"):
+        # Library ingested by scripts/ingest_dir.py, attached by handle
+        try:
+            library = load_library(str(body["library"]))
+            session.collection = library.collection(request.app[REGISTRY])
+        except FileNotFoundError as e:
+            raise _error(web.HTTPNotFound, str(e))
+        except ValueError as e:
+            raise _error(web.HTTPBadRequest, str(e))
+
+    request.app[SESSIONS][session.session_id] = session
+    return web.json_response(session.to_json(), status=201)
+
+
+async def get_session(request: web.Request) -> web.Response:
+    return web.json_response(_session(request).to_json())
+
+
+async def delete_session(request: web.Request) -> web.Response:
+    session = _session(request)
+    del request.app[SESSIONS][session.session_id]
+    _release_session(request.app, session)
+
+    # Explicit delete also drops the conversation state and memory
+    chat_service = request.app[CHAT_SERVICE]
+    checkpointer = getattr(chat_service.graph, "checkpointer", None)
+    if hasattr(checkpointer, "delete_thread"):
+        await asyncio.to_thread(checkpointer.delete_thread, session.session_id)
+    if chat_service.memory is not None:
+        await asyncio.to_thread(chat_service.memory.forget, session.session_id)
+    return web.Response(status=204)
+
+
+async def upload_document(request: web.Request) -> web.Response:
+    session = _session(request)
+
+    reader = await request.multipart()
+    part = await reader.next()
+    while part is not None and part.name != "file":
+        part = await reader.next()
+    if part is None or not part.filename:
+        raise _error(web.HTTPBadRequest, 'Expected a multipart field "file"')
+
+    filename = part.filename
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise _error(web.HTTPUnsupportedMediaType, f"Unsupported file type: {ext or filename}")
+
+    file_bytes = await part.read()
+    if not file_bytes:
+        raise _error(web.HTTPBadRequest, "Empty file")
+
+    # Hashing, extraction and embedding block: keep them off the event loop
+    file_hash = await asyncio.to_thread(compute_file_hash, file_bytes)
+    if file_hash not in session.collection:
+        try:
+            built = await asyncio.to_thread(
+                request.app[REGISTRY].acquire,
+                file_bytes,
+                filename,
+                session.session_id,
+                file_hash,
+            )
+        except ValueError as e:
+            raise _error(web.HTTPUnprocessableEntity, str(e))
+        session.collection.add(built)
+
+    return web.json_response({"doc_id": file_hash, "filename": filename}, status=201)
+
+
+async def delete_document(request: web.Request) -> web.Response:
+    session = _session(request)
+    doc_id = request.match_info["doc_id"]
+    if session.collection.remove(doc_id) is None:
+        raise _error(web.HTTPNotFound, "Unknown document")
+    request.app[REGISTRY].release(doc_id, owner=session.session_id)
+    return web.Response(status=204)
+
+
+async def _send_event(response: web.StreamResponse, event: str, data: dict) -> None:
+    payload = json.dumps(data, ensure_ascii=False)
+    await response.write(f"event: {event}\ndata: {payload}\n\n".encode("utf-8"))
+
+
+async def chat(request: web.Request) -> web.StreamResponse:
+    session = _session(request)
+    body = await _read_json(request)
+    message = str(body.get("message") or "").strip()
+    if not message:
+        raise _error(web.HTTPBadRequest, '"message" is required')
+
+    use_rag = body.get("use_rag", len(session.collection) > 0)
+
+    response = web.StreamResponse(
+        headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # don't let proxies buffer the stream
+        }
+    )
+    await response.prepare(request)
+
+    answer = []
+    stream = request.app[CHAT_SERVICE].astream(
+        query=message,
+        session_id=session.session_id,
+        persona=session.persona,
+        language=session.language,
+        use_rag=bool(use_rag),
+        vectorstore=session.collection,
+        retrieval_mode=session.retrieval_mode,
+    )
+    try:
+        # Tokens are batched into fewer, larger events (backend/streaming.py)
+        async for text in acoalesce(stream):
+            answer.append(text)
+            await _send_event(response, "token", {"text": text})
+        await _send_event(response, "done", {"answer": "".join(answer)})
+    except ConnectionResetError:
+        # Client went away; stop generating
+        pass
+    except Exception as e:
+        await _send_event(response, "error", {"error": str(e)})
+    finally:
+        await stream.aclose()
+        session.last_access = time.monotonic()
+
+    return response
+
+
+# ---------------------------------------------------------------------
+# App
+# ---------------------------------------------------------------------
+async def _expire_idle_sessions(app: web.Application):
+    """Drop sessions (and their index references) idle for too long."""
+
+    async def sweep():
+        while True:
+            await asyncio.sleep(min(60.0, API_SESSION_IDLE_SECONDS))
+            cutoff = time.monotonic() - API_SESSION_IDLE_SECONDS
+            for session_id, session in list(app[SESSIONS].items()):
+                if session.last_access < cutoff:
+                    del app[SESSIONS][session_id]
+                    _release_session(app, session)
+
+    task = asyncio.create_task(sweep())
+    yield
+    task.cancel()
+
+
+def create_app(chat_service: ChatService, registry=None) -> web.Application:
+    """
+    chat_service: shared by all requests (one model + graph per process).
+    registry: IndexRegistry for uploaded documents (default: the
+    process-wide one).
+    """
+    if registry is None:
+        registry = get_index_registry()
+
+    app = web.Application(client_max_size=API_MAX_UPLOAD_BYTES)
+    app[CHAT_SERVICE] = chat_service
+    app[REGISTRY] = registry
+    app[SESSIONS] = {}
+    app.cleanup_ctx.append(_expire_idle_sessions)
+
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics_endpoint)
+    app.router.add_post("/sessions", create_session)
+    app.router.add_get("/sessions/{session_id}", get_session)
+    app.router.add_delete("/sessions/{session_id}", delete_session)
+    app.router.add_post("/sessions/{session_id}/documents", upload_document)
+    app.router.add_delete("/sessions/{session_id}/documents/{doc_id}", delete_document)
+    app.router.add_post("/sessions/{session_id}/chat", chat)
+    return app
@@ -1,14 +1,217 @@
 # backend/chat_service.py
 
-from langchain_core.messages import HumanMessage, AIMessage
+import asyncio
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
 from google.api_core.exceptions import ResourceExhausted
 
-from backend.rag import RAGService
+from backend import metrics
+from backend.config import MODEL_MAX_CONCURRENCY
+from backend.rag import RAGService, cached_query_embedding
+from backend.response_cache import replay_chunks
+
+QUOTA_EXCEEDED_MESSAGE = "⚠️ API quota exceeded. Please wait a bit and try again."
+
+
+# Metadata of chunks replayed from the response cache
+CACHED_REPLY_METADATA = {"langgraph_node": "model", "response_cache": "hit"}
+
+
+def _is_reply_chunk(metadata) -> bool:
+    # Only the reply; skip tokens from any other graph node
+    return metadata.get("langgraph_node") == "model"
+
+
+class _TurnTimer:
+    """Records time to first token and total turn time of one chat turn."""
+
+    __slots__ = ("start", "first_token")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+
+    def token(self) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+            metrics.observe("chat_ttft_seconds", self.first_token - self.start)
+
+    def done(self, outcome: str) -> None:
+        metrics.observe("chat_turn_seconds", time.perf_counter() - self.start, outcome=outcome)
+        metrics.increment("chat_turns", outcome=outcome)
 
 
 class ChatService:
-    def __init__(self, graph):
+    def __init__(
+        self,
+        graph,
+        memory=None,
+        max_concurrency: int = MODEL_MAX_CONCURRENCY,
+        response_cache=None,
+        compactor=None,
+        rate_limiter=None,
+    ):
+        """
+        memory: optional ConversationMemory (backend/memory.py). When set,
+        relevant earlier turns are recalled into each prompt and every
+        finished turn is stored in the background.
+
+        response_cache: optional ResponseCache (backend/response_cache.py).
+        When set, first-turn answers are cached and replayed for repeated
+        questions without calling the model.
+
+        max_concurrency: most `astream` turns generating at once (bounds
+        concurrent requests to the model provider).
+
+        compactor: optional HistoryCompactor (backend/graph.py). When set,
+        long histories are folded into a running summary after a turn has
+        returned; the next turn of the same session waits for it.
+
+        rate_limiter: optional TokenBucket (backend/embedding_pipeline.py)
+        taken before every model request (turns and summaries), e.g. to
+        stay under the provider's requests-per-minute quota.
+        """
         self.graph = graph
+        self.memory = memory
+        self.response_cache = response_cache
+        self.max_concurrency = max_concurrency
+        self.compactor = compactor
+        self.rate_limiter = rate_limiter
+
+        # Pending compaction per session (sync API). The pool is shared by
+        # every session, so it is sized like the model concurrency; each
+        # session has at most one job in it, which keeps its turns ordered.
+        self._compactions: Dict[str, Future] = {}
+        self._compactions_lock = threading.Lock()
+        self._executor = (
+            ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="compaction")
+            if compactor is not None else None
+        )
+        # Running compaction tasks (async API); referenced so they are not collected
+        self._compaction_tasks = set()
+
+        # asyncio primitives belong to one event loop; created lazily
+        self._loop = None
+        self._model_slots: Optional[asyncio.Semaphore] = None
+        self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def _input(query, persona, language, retrieved_context, recalled_memory) -> dict:
+        return {
+            "messages": [HumanMessage(content=query)],
+            "persona": persona,
+            "language": language,
+            "retrieved_context": retrieved_context,
+            "recalled_memory": recalled_memory,
+        }
+
+    # -----------------------------------------------------------------
+    # Response cache helpers
+    # -----------------------------------------------------------------
+    def _cache_lookup(self, query: str, input_data: dict, vectorstore, use_rag: bool):
+        """
+        (scope, query vector, cached answer) for a first turn. Called only
+        when the thread has no history yet.
+        """
+        doc_set = getattr(vectorstore, "fingerprint", None) if use_rag else None
+        context = f"{input_data['retrieved_context']}\x00{input_data['recalled_memory']}"
+        scope = self.response_cache.scope(doc_set, input_data["persona"], input_data["language"], context)
+
+        # Paraphrase matching needs a query embedding. Use one only if
+        # retrieval or memory recall already computed it this turn (a
+        # first turn often has neither); otherwise match exact text only
+        # rather than pay for an embedding call.
+        query_vector = None
+        for embeddings in (
+            getattr(vectorstore, "embeddings", None) if use_rag else None,
+            getattr(self.memory, "embeddings", None),
+        ):
+            if embeddings is not None and query_vector is None:
+                query_vector = cached_query_embedding(embeddings, query)
+
+        return scope, query_vector, self.response_cache.get(scope, query, query_vector)
+
+    @staticmethod
+    def _cached_turn(input_data: dict, answer: str) -> dict:
+        """State update recording a replayed turn as if the model answered."""
+        return {**input_data, "messages": input_data["messages"] + [AIMessage(content=answer)]}
+
+    # -----------------------------------------------------------------
+    # History compaction (after the turn, off the streamed reply)
+    # -----------------------------------------------------------------
+    def _compact(self, config: dict) -> None:
+        state = self.graph.get_state(config).values
+        if not self.compactor.messages_to_fold(state):
+            return
+        try:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            update = self.compactor.compact(state)
+        except ResourceExhausted:
+            # Retried after the next turn; the history is trimmed meanwhile
+            metrics.increment("quota_errors", stage="compaction")
+            return
+        if update is not None:
+            self.graph.update_state(config, update, as_node="model")
+
+    def _schedule_compaction(self, session_id: str, config: dict) -> None:
+        if self.compactor is None:
+            return
+        with self._compactions_lock:
+            if session_id in self._compactions:
+                return  # still pending; it reads the latest history when it runs
+            future = self._executor.submit(self._compact, config)
+            self._compactions[session_id] = future
+        future.add_done_callback(lambda f: self._forget_compaction(session_id, f))
+
+    def _forget_compaction(self, session_id: str, future: Future) -> None:
+        with self._compactions_lock:
+            if self._compactions.get(session_id) is future:
+                del self._compactions[session_id]
+
+    def _wait_for_compaction(self, session_id: str) -> None:
+        """Block until the session's pending compaction (if any) is applied."""
+        with self._compactions_lock:
+            pending = self._compactions.get(session_id)
+        if pending is not None:
+            pending.result()
+
+    def flush(self) -> None:
+        """Wait until every compaction submitted so far is applied."""
+        with self._compactions_lock:
+            pending = list(self._compactions.values())
+        for future in pending:
+            future.result()
+
+    async def _acompact(self, config: dict, session_lock: asyncio.Lock, model_slots: asyncio.Semaphore) -> None:
+        # Holds the session lock, so the next turn of this session starts
+        # from the compacted history; a model slot only for the summary
+        async with session_lock:
+            state = (await self.graph.aget_state(config)).values
+            if not self.compactor.messages_to_fold(state):
+                return
+            try:
+                async with model_slots:
+                    if self.rate_limiter is not None:
+                        await self.rate_limiter.aacquire()
+                    update = await self.compactor.acompact(state)
+            except ResourceExhausted:
+                metrics.increment("quota_errors", stage="compaction")
+                return
+            if update is not None:
+                await self.graph.aupdate_state(config, update, as_node="model")
+
+    def _schedule_acompaction(self, config: dict, session_lock, model_slots) -> None:
+        if self.compactor is None:
+            return
+        task = asyncio.create_task(self._acompact(config, session_lock, model_slots))
+        self._compaction_tasks.add(task)
+        task.add_done_callback(self._compaction_tasks.discard)
 
     def stream(
         self,
@@ -18,30 +221,167 @@ class ChatService:
         language: str,
         use_rag: bool = False,
         vectorstore=None,
+        retrieval_mode: Optional[str] = None,
     ):
+        timer = _TurnTimer()
+
         # Get document context (if any)
         retrieved_context = ""
         if use_rag and vectorstore is not None:
-            retrieved_context = RAGService(vectorstore).retrieve(query)
+            retrieved_context = RAGService(vectorstore).retrieve(query, mode=retrieval_mode)
 
-        input_data = {
-            "messages": [HumanMessage(content=query)],
-            "persona": persona,
-            "language": language,
-            "retrieved_context": retrieved_context,
-        }
+        # Recall relevant earlier turns (if any)
+        recalled_memory = ""
+        if self.memory is not None:
+            recalled_memory = self.memory.recall(session_id, query)
+
+        input_data = self._input(query, persona, language, retrieved_context, recalled_memory)
+        config = {"configurable": {"thread_id": session_id}}
+
+        # Start from the compacted history of the previous turn
+        self._wait_for_compaction(session_id)
 
+        # Repeated first-turn question: replay the cached answer
+        cache_scope = None
+        if self.response_cache is not None and not self.graph.get_state(config).values.get("messages"):
+            cache_scope, query_vector, cached = self._cache_lookup(query, input_data, vectorstore, use_rag)
+            metrics.increment("response_cache", result="miss" if cached is None else "hit")
+            if cached is not None:
+                for piece in replay_chunks(cached):
+                    timer.token()
+                    yield AIMessageChunk(content=piece), dict(CACHED_REPLY_METADATA)
+                self.graph.update_state(config, self._cached_turn(input_data, cached), as_node="model")
+                if self.memory is not None:
+                    self.memory.remember(session_id, query, cached)
+                timer.done("cached")
+                return
+
+        answer = []
         try:
-            for chunk, metadata in self.graph.stream(
-                input_data,
-                {"configurable": {"thread_id": session_id}},
-                stream_mode="messages",
-            ):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            for chunk, metadata in self.graph.stream(input_data, config, stream_mode="messages"):
+                if not _is_reply_chunk(metadata):
+                    continue
+                if isinstance(chunk, AIMessage) and isinstance(chunk.content, str):
+                    answer.append(chunk.content)
+                timer.token()
                 yield chunk, metadata
 
         except ResourceExhausted:
+            metrics.increment("quota_errors", stage="chat")
+            timer.done("quota_exceeded")
             # Simple, friendly message — no crash
-            yield (
-                AIMessage(content="⚠️ API quota exceeded. Please wait a bit and try again."),
-                None,
+            yield AIMessage(content=QUOTA_EXCEEDED_MESSAGE), None
+            return
+
+        timer.done("model")
+
+        answer = "".join(answer)
+        if cache_scope is not None and answer:
+            self.response_cache.put(cache_scope, query, answer, query_vector)
+
+        # Embedded off the critical path
+        if self.memory is not None and answer:
+            self.memory.remember(session_id, query, answer)
+
+        # Summarized in the background; the turn has already returned
+        self._schedule_compaction(session_id, config)
+
+    # -----------------------------------------------------------------
+    # Async API
+    # -----------------------------------------------------------------
+    def _async_limits(self, session_id: str):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._model_slots = asyncio.Semaphore(self.max_concurrency)
+            self._session_locks = weakref.WeakValueDictionary()
+
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = self._session_locks[session_id] = asyncio.Lock()
+        return lock, self._model_slots
+
+    async def astream(
+        self,
+        query: str,
+        session_id: str,
+        persona: str,
+        language: str,
+        use_rag: bool = False,
+        vectorstore=None,
+        retrieval_mode: Optional[str] = None,
+    ):
+        """
+        Async version of `stream`, for serving many sessions on one event
+        loop. Turns of the same session run one after another (they share
+        a checkpoint thread); at most `max_concurrency` turns call the
+        model at once, the rest wait their turn.
+        """
+        timer = _TurnTimer()
+        session_lock, model_slots = self._async_limits(session_id)
+
+        async with session_lock:
+            # Retrieval and memory recall are independent: run them together
+            retrieval = None
+            if use_rag and vectorstore is not None:
+                retrieval = RAGService(vectorstore).aretrieve(query, mode=retrieval_mode)
+            recall = self.memory.arecall(session_id, query) if self.memory is not None else None
+
+            retrieved_context, recalled_memory = await asyncio.gather(
+                retrieval or _empty(), recall or _empty()
             )
+            input_data = self._input(query, persona, language, retrieved_context, recalled_memory)
+            config = {"configurable": {"thread_id": session_id}}
+
+            cache_scope = None
+            if self.response_cache is not None and not (await self.graph.aget_state(config)).values.get("messages"):
+                cache_scope, query_vector, cached = await asyncio.to_thread(
+                    self._cache_lookup, query, input_data, vectorstore, use_rag
+                )
+                metrics.increment("response_cache", result="miss" if cached is None else "hit")
+                if cached is not None:
+                    for piece in replay_chunks(cached):
+                        timer.token()
+                        yield AIMessageChunk(content=piece), dict(CACHED_REPLY_METADATA)
+                    await self.graph.aupdate_state(config, self._cached_turn(input_data, cached), as_node="model")
+                    if self.memory is not None:
+                        self.memory.remember(session_id, query, cached)
+                    timer.done("cached")
+                    return
+
+            answer = []
+            try:
+                async with model_slots:
+                    if self.rate_limiter is not None:
+                        await self.rate_limiter.aacquire()
+                    async for chunk, metadata in self.graph.astream(input_data, config, stream_mode="messages"):
+                        if not _is_reply_chunk(metadata):
+                            continue
+                        if isinstance(chunk, AIMessage) and isinstance(chunk.content, str):
+                            answer.append(chunk.content)
+                        timer.token()
+                        yield chunk, metadata
+
+            except ResourceExhausted:
+                metrics.increment("quota_errors", stage="chat")
+                timer.done("quota_exceeded")
+                yield AIMessage(content=QUOTA_EXCEEDED_MESSAGE), None
+                return
+
+            timer.done("model")
+
+            answer = "".join(answer)
+            if cache_scope is not None and answer:
+                self.response_cache.put(cache_scope, query, answer, query_vector)
+
+            if self.memory is not None and answer:
+                self.memory.remember(session_id, query, answer)
+
+            # Runs once this turn has released the session lock
+            self._schedule_acompaction(config, session_lock, model_slots)
+
+
+async def _empty() -> str:
+    return ""
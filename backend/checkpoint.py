@@ -0,0 +1,424 @@
+# backend/checkpoint.py
+"""
+Bounded, durable LangGraph checkpointer backed by a local SQLite file.
+
+Replaces the in-process `MemorySaver`, which keeps every checkpoint of
+every thread forever and loses them all on restart:
+
+- only the latest `keep_per_thread` checkpoints of each thread are kept
+  (LangGraph only needs the latest one to continue a conversation);
+- threads idle for longer than `max_idle_seconds` are deleted, and the
+  least recently used threads go first once the store is over
+  `max_total_bytes`;
+- nothing is held in memory: a thread is read from disk when it is
+  accessed.
+
+Each checkpoint is stored whole (channel values included), which keeps
+pruning trivial: deleting a checkpoint row never orphans shared blobs.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+
+try:
+    from langgraph.checkpoint.base import get_checkpoint_metadata
+except ImportError:  # older langgraph-checkpoint
+    def get_checkpoint_metadata(config, metadata):
+        return metadata
+
+from backend.config import (
+    CACHE_DIR,
+    CHECKPOINT_KEEP_PER_THREAD,
+    CHECKPOINT_MAX_IDLE_SECONDS,
+    CHECKPOINT_MAX_TOTAL_BYTES,
+)
+
+# Run idle/size eviction every this many checkpoint writes
+_COMPACT_EVERY = 200
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver):
+    def __init__(
+        self,
+        path: str | Path,
+        keep_per_thread: int = CHECKPOINT_KEEP_PER_THREAD,
+        max_idle_seconds: Optional[float] = CHECKPOINT_MAX_IDLE_SECONDS,
+        max_total_bytes: Optional[int] = CHECKPOINT_MAX_TOTAL_BYTES,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.keep_per_thread = max(1, keep_per_thread)
+        self.max_idle_seconds = max_idle_seconds
+        self.max_total_bytes = max_total_bytes
+
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                parent_id TEXT,
+                type TEXT NOT NULL,
+                checkpoint BLOB NOT NULL,
+                metadata_type TEXT NOT NULL,
+                metadata BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT NOT NULL,
+                value BLOB NOT NULL,
+                task_path TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            CREATE TABLE IF NOT EXISTS threads (
+                thread_id TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_threads_access ON threads(last_access);
+            """
+        )
+        self._conn.commit()
+        self.compact()
+
+    # -----------------------------------------------------------------
+    # Helpers
+    # -----------------------------------------------------------------
+    def _touch_locked(self, thread_id: str) -> None:
+        self._conn.execute(
+            "INSERT INTO threads(thread_id, last_access) VALUES (?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET last_access = excluded.last_access",
+            (thread_id, time.time()),
+        )
+
+    def _delete_threads_locked(self, thread_ids: Sequence[str]) -> None:
+        for table in ("checkpoints", "writes", "threads"):
+            self._conn.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in thread_ids]
+            )
+
+    def _row_to_tuple(self, row, pending_rows) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, blob, mtype, mblob = row
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed((type_, blob)),
+            metadata=self.serde.loads_typed((mtype, mblob)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((wtype, value)))
+                for task_id, channel, wtype, value in pending_rows
+            ],
+        )
+
+    def _pending_locked(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str):
+        return self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+
+    # -----------------------------------------------------------------
+    # BaseCheckpointSaver API
+    # -----------------------------------------------------------------
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, "
+            "metadata_type, metadata FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ? "
+        )
+        params: Tuple[Any, ...] = (thread_id, checkpoint_ns)
+        if checkpoint_id:
+            query += "AND checkpoint_id = ?"
+            params += (checkpoint_id,)
+        else:
+            query += "ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+            pending = self._pending_locked(thread_id, checkpoint_ns, row[2])
+            self._touch_locked(thread_id)
+            self._conn.commit()
+
+        return self._row_to_tuple(row, pending)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, "
+            "metadata_type, metadata FROM checkpoints WHERE 1 = 1 "
+        )
+        params: Tuple[Any, ...] = ()
+        if config:
+            query += "AND thread_id = ? "
+            params += (config["configurable"]["thread_id"],)
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query += "AND checkpoint_ns = ? "
+                params += (config["configurable"]["checkpoint_ns"],)
+            if checkpoint_id := get_checkpoint_id(config):
+                query += "AND checkpoint_id = ? "
+                params += (checkpoint_id,)
+        if before and (before_id := get_checkpoint_id(before)):
+            query += "AND checkpoint_id < ? "
+            params += (before_id,)
+        query += "ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            results = [(row, self._pending_locked(row[0], row[1], row[2])) for row in rows]
+
+        for row, pending in results:
+            item = self._row_to_tuple(row, pending)
+            if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield item
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+
+        type_, blob = self.serde.dumps_typed(checkpoint)
+        mtype, mblob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    parent_id,
+                    type_,
+                    blob,
+                    mtype,
+                    mblob,
+                    len(blob) + len(mblob),
+                ),
+            )
+            self._prune_thread_locked(thread_id, checkpoint_ns)
+            self._touch_locked(thread_id)
+            self._conn.commit()
+            self._puts += 1
+            compact_now = self._puts % _COMPACT_EVERY == 0
+
+        if compact_now:
+            self.compact()
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self.serde.dumps_typed(value)
+            rows.append((
+                thread_id, checkpoint_ns, checkpoint_id, task_id,
+                WRITES_IDX_MAP.get(channel, idx), channel, type_, blob, task_path,
+            ))
+
+        # Regular writes are idempotent per (task, idx); special channels
+        # (negative idx, e.g. errors/interrupts) overwrite.
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [r for r in rows if r[4] >= 0],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [r for r in rows if r[4] < 0],
+            )
+            self._conn.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._delete_threads_locked([thread_id])
+            self._conn.commit()
+
+    # Async variants: SQLite calls are short and local, so run inline
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return self.delete_thread(thread_id)
+
+    # -----------------------------------------------------------------
+    # Retention
+    # -----------------------------------------------------------------
+    def _prune_thread_locked(self, thread_id: str, checkpoint_ns: str) -> None:
+        """Keep only the newest `keep_per_thread` checkpoints (and their writes)."""
+        stale = self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_per_thread),
+        ).fetchall()
+        if not stale:
+            return
+        params = [(thread_id, checkpoint_ns, cid) for (cid,) in stale]
+        self._conn.executemany(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            params,
+        )
+        self._conn.executemany(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            params,
+        )
+
+    def compact(self) -> None:
+        """
+        Delete idle threads, then the least recently used ones until the
+        store is within its size budget.
+        """
+        with self._lock:
+            if self.max_idle_seconds is not None:
+                cutoff = time.time() - self.max_idle_seconds
+                idle = [
+                    t for (t,) in self._conn.execute(
+                        "SELECT thread_id FROM threads WHERE last_access < ?", (cutoff,)
+                    )
+                ]
+                self._delete_threads_locked(idle)
+
+            if self.max_total_bytes is not None:
+                total = self._conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM checkpoints"
+                ).fetchone()[0]
+                if total > self.max_total_bytes:
+                    rows = self._conn.execute(
+                        "SELECT t.thread_id, COALESCE(SUM(c.size), 0) FROM threads t "
+                        "LEFT JOIN checkpoints c ON c.thread_id = t.thread_id "
+                        "GROUP BY t.thread_id ORDER BY t.last_access ASC"
+                    ).fetchall()
+                    victims = []
+                    for thread_id, size in rows:
+                        if total <= self.max_total_bytes:
+                            break
+                        victims.append(thread_id)
+                        total -= size
+                    self._delete_threads_locked(victims)
+
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            threads, checkpoints, size = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM threads), COUNT(*), COALESCE(SUM(size), 0) "
+                "FROM checkpoints"
+            ).fetchone()
+        return {"threads": threads, "checkpoints": checkpoints, "total_bytes": size}
+
+
+@lru_cache(maxsize=1)
+def get_checkpointer() -> SQLiteCheckpointer:
+    """Process-wide checkpointer stored under CACHE_DIR."""
+    return SQLiteCheckpointer(Path(CACHE_DIR) / "checkpoints.sqlite")
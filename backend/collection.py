@@ -0,0 +1,188 @@
+# backend/collection.py
+"""
+Per-chat document collections.
+
+A collection is a set of per-file indexes ("shards"), keyed by document
+id (the file hash). The collection only stores handles (document id and
+filename); each shard is resolved through the `IndexRegistry` when the
+collection is searched or warmed. The registry keeps indexes resident
+under a per-process memory budget and spills the least recently used ones
+to their disk snapshots, so a user's memory footprint does not grow with
+the number of document-backed chats. Adding a file to a chat attaches its
+already-built index and removing a file detaches exactly that file —
+nothing is re-embedded or rebuilt when the set changes.
+
+Vector searches embed the query once and merge the per-shard top-k by
+distance; lexical searches score every shard with collection-wide BM25
+statistics, so the per-shard top-k can be merged by score.
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+    from backend.document_rag import BuiltIndex
+    from backend.index_registry import IndexRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentCollection:
+    def __init__(self, registry: Optional[IndexRegistry] = None):
+        """
+        registry: where the shards live (default: the process-wide
+        registry). Indexes added to the collection must come from it
+        (`registry.acquire`).
+        """
+        self._registry = registry
+        self._filenames: Dict[str, str] = {}  # doc_id (file hash) -> filename
+        self._embeddings = None
+        # Bumped on every add/remove so callers can tell the contents changed
+        self.version = 0
+
+    @property
+    def registry(self) -> IndexRegistry:
+        if self._registry is None:
+            from backend.index_registry import get_index_registry
+
+            self._registry = get_index_registry()
+        return self._registry
+
+    # -----------------------------------------------------------------
+    # Membership
+    # -----------------------------------------------------------------
+    def add(self, built: BuiltIndex) -> bool:
+        """
+        Attach a document's index (by handle). Returns False if it was
+        already there.
+        """
+        if self._embeddings is None:
+            self._embeddings = built.vectorstore.embeddings
+        return self.attach(built.file_hash, built.filename)
+
+    def attach(self, doc_id: str, filename: str) -> bool:
+        """
+        Attach an index the registry already has (resident or on disk)
+        without loading it, e.g. a library built by scripts/ingest_dir.py.
+        """
+        if doc_id in self._filenames:
+            return False
+        self._filenames[doc_id] = filename
+        self.version += 1
+        return True
+
+    def remove(self, doc_id: str) -> Optional[str]:
+        """
+        Detach a document by id (file hash) and return its filename.
+        """
+        filename = self._filenames.pop(doc_id, None)
+        if filename is not None:
+            self.version += 1
+        return filename
+
+    def doc_ids(self) -> List[str]:
+        return list(self._filenames)
+
+    def documents(self) -> List[Tuple[str, str]]:
+        """(doc_id, filename) for every document, in insertion order."""
+        return list(self._filenames.items())
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Content identity of the collection: the same set of documents
+        gives the same fingerprint, in any chat.
+        """
+        return ",".join(sorted(self._filenames))
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._filenames
+
+    def __len__(self) -> int:
+        return len(self._filenames)
+
+    # -----------------------------------------------------------------
+    # Shard resolution
+    # -----------------------------------------------------------------
+    def _shards(self) -> Iterator[BuiltIndex]:
+        """Resident shards, reloading spilled ones from disk as needed."""
+        for doc_id, filename in list(self._filenames.items()):
+            built = self.registry.get(doc_id)
+            if built is None:
+                # Snapshot deleted behind our back; the file must be re-uploaded
+                logger.warning("Index for %s (%s) is no longer available", filename, doc_id)
+                continue
+            yield built
+
+    def warm(self) -> int:
+        """
+        Make every shard resident (e.g. when the chat becomes active), so
+        the first question does not pay for the reload. Returns the number
+        of shards available.
+        """
+        return sum(1 for _ in self._shards())
+
+    # -----------------------------------------------------------------
+    # Search (vectorstore-compatible subset)
+    # -----------------------------------------------------------------
+    @property
+    def embeddings(self):
+        if not self._filenames:
+            return None
+        if self._embeddings is None:
+            from backend.document_rag import get_embeddings
+
+            self._embeddings = self.registry.embeddings or get_embeddings()
+        return self._embeddings
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Top-k (document, L2 distance) across every shard.
+        """
+        hits: List[Tuple[Document, float]] = []
+        for built in self._shards():
+            hits.extend(
+                built.vectorstore.similarity_search_with_score_by_vector(embedding, k=k)
+            )
+        return heapq.nsmallest(k, hits, key=lambda hit: hit[1])
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k)]
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        if not self._filenames:
+            return []
+        embedding = self.embeddings.embed_query(query)
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k)]
+
+    def lexical_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        Top-k (document, BM25 score) across every shard that has a
+        lexical index, best first. Shards are scored with the statistics
+        of all of them (document count, lengths, term frequencies), so
+        their scores are comparable.
+        """
+        from backend.lexical import corpus_stats
+
+        shards = [built for built in self._shards() if built.lexical is not None]
+        stats = corpus_stats([built.lexical for built in shards], query) if len(shards) > 1 else None
+
+        hits: List[Tuple[Document, float]] = []
+        for built in shards:
+            docstore = built.vectorstore.docstore
+            for doc_id, score in built.lexical.search(query, k=k, stats=stats):
+                doc = docstore.search(doc_id)
+                if not isinstance(doc, str):  # docstore returns a message on misses
+                    hits.append((doc, score))
+        return heapq.nlargest(k, hits, key=lambda hit: hit[1])
+
+    def lexical_search(self, query: str, k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.lexical_search_with_score(query, k=k)]
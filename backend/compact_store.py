@@ -0,0 +1,207 @@
+# backend/compact_store.py
+"""
+Compact, memory-mapped storage for indexed chunks.
+
+LangChain's FAISS store keeps every chunk as a `Document` in an
+`InMemoryDocstore`, plus a dict from index position to docstore id. For
+large collections those Python objects cost more memory than the text
+itself, and all of them are unpickled when a snapshot is loaded.
+
+A `ChunkStore` keeps the chunks of one index in a single file instead:
+
+    header | record offsets | ids (sorted) + their positions | records
+
+Each record is the JSON of (id, text, metadata), optionally
+zlib-compressed. The file is memory-mapped; only the offset and id
+tables are touched on open, and a record is decoded only when a search
+returns it (the top-k hits). `CompactVectorStore` pairs it with a FAISS
+index and offers the vectorstore subset the rest of the backend uses
+(similarity search by vector, `docstore.search` for lexical hits), so it
+plugs in behind `RAGService` and `DocumentCollection` unchanged.
+
+The index registry writes this format for snapshots when CHUNK_STORE is
+"compact" and serves indexes from it.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.config import CHUNK_STORE_COMPRESS
+
+CHUNK_FILE = "chunks.bin"
+
+_MAGIC = b"RFCHUNK1"
+_HEADER = struct.Struct("<8sIIQ")  # magic, flags, id width, record count
+_FLAG_ZLIB = 1
+
+
+def _encode(doc_id: str, doc: Document, compress: bool) -> bytes:
+    raw = json.dumps(
+        [doc_id, doc.page_content, doc.metadata or {}],
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    ).encode("utf-8")
+    return zlib.compress(raw) if compress else raw
+
+
+def iter_stored_chunks(vectorstore) -> Iterator[Tuple[str, Document]]:
+    """
+    (chunk id, document) for every vector of a LangChain FAISS store or a
+    CompactVectorStore, in index position order.
+    """
+    if isinstance(vectorstore, CompactVectorStore):
+        yield from vectorstore.chunks.items()
+        return
+    for position in range(vectorstore.index.ntotal):
+        doc_id = vectorstore.index_to_docstore_id[position]
+        yield doc_id, vectorstore.docstore.search(doc_id)
+
+
+class ChunkStore:
+    """Read-only, memory-mapped chunk records of one index."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, flags, id_width, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"Not a chunk store: {self.path}")
+        self.compressed = bool(flags & _FLAG_ZLIB)
+        self._count = count
+
+        # Tables are views into the mapping, not copies
+        offset = _HEADER.size
+        self._offsets = np.frombuffer(self._mm, dtype="<u8", count=count + 1, offset=offset)
+        offset += self._offsets.nbytes
+        self._id_positions = np.frombuffer(self._mm, dtype="<u4", count=count, offset=offset)
+        offset += self._id_positions.nbytes
+        self._sorted_ids = np.frombuffer(self._mm, dtype=f"S{max(id_width, 1)}", count=count, offset=offset)
+        self._data_start = offset + self._sorted_ids.nbytes
+
+    @classmethod
+    def write(
+        cls,
+        path: str | Path,
+        chunks: Iterable[Tuple[str, Document]],
+        compress: bool = CHUNK_STORE_COMPRESS,
+    ) -> None:
+        """Write (id, document) pairs, in index position order, to `path`."""
+        ids: List[bytes] = []
+        records: List[bytes] = []
+        for doc_id, doc in chunks:
+            ids.append(doc_id.encode("utf-8"))
+            records.append(_encode(doc_id, doc, compress))
+
+        count = len(records)
+        id_width = max((len(i) for i in ids), default=1)
+        offsets = np.zeros(count + 1, dtype="<u8")
+        np.cumsum([len(r) for r in records], out=offsets[1:])
+        id_array = np.array(ids, dtype=f"S{id_width}")
+        order = np.argsort(id_array, kind="stable").astype("<u4")
+
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _FLAG_ZLIB if compress else 0, id_width, count))
+            f.write(offsets.tobytes())
+            f.write(order.tobytes())
+            f.write(id_array[order].tobytes())
+            for record in records:
+                f.write(record)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def table_bytes(self) -> int:
+        """Size of the offset and id tables (the part touched on every lookup)."""
+        return self._offsets.nbytes + self._id_positions.nbytes + self._sorted_ids.nbytes
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._mm)
+
+    def item(self, position: int) -> Tuple[str, Document]:
+        """Decode the record at index `position`."""
+        start = self._data_start + int(self._offsets[position])
+        stop = self._data_start + int(self._offsets[position + 1])
+        raw = self._mm[start:stop]
+        if self.compressed:
+            raw = zlib.decompress(raw)
+        doc_id, text, metadata = json.loads(raw)
+        return doc_id, Document(page_content=text, metadata=metadata)
+
+    def document(self, position: int) -> Document:
+        return self.item(position)[1]
+
+    def items(self) -> Iterator[Tuple[str, Document]]:
+        for position in range(self._count):
+            yield self.item(position)
+
+    def position(self, doc_id: str) -> Optional[int]:
+        key = doc_id.encode("utf-8")
+        i = int(np.searchsorted(self._sorted_ids, key))
+        if i < self._count and self._sorted_ids[i] == key:
+            return int(self._id_positions[i])
+        return None
+
+    def search(self, doc_id: str) -> Document | str:
+        """Docstore-compatible lookup: the document, or a message on misses."""
+        position = self.position(doc_id)
+        if position is None:
+            return f"ID {doc_id} not found."
+        return self.document(position)
+
+
+class CompactVectorStore:
+    """
+    A FAISS index over a ChunkStore, with the search methods of
+    LangChain's FAISS store (L2 distance, lower is closer). Read-only.
+    """
+
+    def __init__(self, embeddings, index, chunks: ChunkStore):
+        if index.ntotal != len(chunks):
+            raise ValueError(
+                f"Index has {index.ntotal} vectors but the chunk store has {len(chunks)} records"
+            )
+        self.embeddings = embeddings
+        self.index = index
+        self.chunks = chunks
+
+    @property
+    def docstore(self) -> ChunkStore:
+        return self.chunks
+
+    def resident_bytes(self) -> int:
+        """Vectors plus lookup tables; chunk text stays on disk until a hit is decoded."""
+        from backend.ann import vector_bytes
+
+        return vector_bytes(self.index) + self.chunks.table_bytes
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+    ) -> List[Tuple[Document, float]]:
+        vector = np.asarray([embedding], dtype="float32")
+        scores, positions = self.index.search(vector, k)
+        return [
+            (self.chunks.document(int(position)), float(score))
+            for score, position in zip(scores[0], positions[0])
+            if position != -1
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k)]
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k)
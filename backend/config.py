@@ -43,6 +43,12 @@ If no reliable answer can be given:
 - Do not fabricate or speculate.
 - Offer next steps (e.g., asking for more context or permission to look it up later).
 
+--------------------------------
+Summary of the earlier conversation (if any):
+{summary}
+--------------------------------
+Relevant earlier turns from this conversation (if any):
+{recalled_memory}
 --------------------------------
 Document Context (if available):
 {retrieved_context}
@@ -61,3 +67,125 @@ CHUNK_OVERLAP = 100
 
 # Embeddings
 EMBEDDING_MODEL_NAME = "models/embedding-001"
+
+# Local caches (embeddings, index snapshots, ...)
+CACHE_DIR = ".ragflow_cache"
+EMBEDDING_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+# Resident indexes per process; beyond it the least recently used ones are
+# spilled to their disk snapshots (reloaded when their chat is used again)
+INDEX_REGISTRY_MEMORY_BUDGET_BYTES = 1024 * 1024 * 1024  # 1 GB
+
+# Embedding pipeline (batching, concurrency, rate limiting)
+EMBED_BATCH_SIZE = 64
+EMBED_MAX_WORKERS = 4
+EMBED_REQUESTS_PER_MINUTE = 120
+EMBED_MAX_RETRIES = 5
+EMBED_RETRY_BASE_DELAY = 2.0  # seconds; doubled on every retry
+
+# Streaming ingest
+PDF_EXTRACT_WORKERS = 0  # >1 extracts PDF pages in a process pool
+PDF_PAGES_PER_TASK = 16
+
+# Retrieval: "vector", "lexical" (BM25) or "hybrid" (both, fused with RRF)
+RAG_RETRIEVAL_MODE = "hybrid"
+RAG_FETCH_K = 20  # candidates per retriever before fusion
+RRF_K = 60  # reciprocal rank fusion damping constant
+
+# Query-side caches (shared by every RAGService in the process)
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = 3600
+RETRIEVAL_CACHE_SIZE = 512
+RETRIEVAL_CACHE_TTL_SECONDS = 600
+
+# ANN index selection: "auto", "flat", "ivf_flat", "hnsw" or "ivf_pq".
+# "auto" keeps small documents exact and switches to approximate
+# indexes as the number of chunks grows.
+ANN_INDEX_TYPE = "auto"
+ANN_FLAT_MAX_VECTORS = 20_000
+ANN_HNSW_MAX_VECTORS = 200_000
+ANN_IVF_FLAT_MAX_VECTORS = 1_000_000
+ANN_HNSW_M = 32
+ANN_EF_SEARCH = 64
+ANN_NPROBE = 16
+ANN_PQ_BITS = 8
+
+# Compact index storage. Vectors: "float32", "float16" (half the memory,
+# ranking practically unchanged) or "int8" (a quarter, scalar quantized).
+# Chunks: "compact" keeps chunk text + metadata of each index in one
+# memory-mapped, offset-indexed file and decodes only the top-k hits;
+# "docstore" keeps LangChain's pickled in-memory Document objects.
+VECTOR_ENCODING = "float16"
+CHUNK_STORE = "compact"
+CHUNK_STORE_COMPRESS = True  # zlib per chunk record
+
+# Context packing (merge overlapping chunks, dedupe, MMR, token budget)
+RAG_CONTEXT_CANDIDATES = 2 * RAG_TOP_K  # chunks retrieved before packing
+RAG_CONTEXT_TOKEN_BUDGET = 1500
+RAG_MMR_LAMBDA = 0.7  # 1.0 = pure relevance, 0.0 = pure diversity
+RAG_DEDUP_THRESHOLD = 0.8  # word-set Jaccard above which chunks are duplicates
+
+# History trimming: "local" (offline estimate) or "model" (provider tokenizer)
+TOKEN_COUNTER = "local"
+
+# Conversation checkpoints (SQLite under CACHE_DIR)
+CHECKPOINT_KEEP_PER_THREAD = 2  # latest checkpoints kept per chat thread
+CHECKPOINT_MAX_IDLE_SECONDS = 7 * 24 * 3600  # drop chats untouched this long
+CHECKPOINT_MAX_TOTAL_BYTES = 256 * 1024 * 1024
+
+# Rolling-summary compaction (opt-in; each compaction is an extra model
+# call): once the stored history passes the threshold, turns older than the last HISTORY_KEEP_TURNS are folded into
+# a running summary (in the background, after the turn has returned).
+# At least HISTORY_COMPACT_MIN_TOKENS must be foldable, so long recent
+# turns do not cause a summarizer call on every turn.
+HISTORY_COMPACTION = False
+HISTORY_COMPACT_THRESHOLD_TOKENS = 6000
+HISTORY_COMPACT_MIN_TOKENS = 1500
+HISTORY_KEEP_TURNS = 4
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a user and an assistant.
+Update the existing summary with the new turns below. Keep every fact, name, number,
+decision, preference and open question that may matter later; drop greetings and filler.
+Write it in {language}, as compact notes of at most ~300 words.
+
+Existing summary:
+{summary}
+"""
+
+# Long-term conversation memory (opt-in; one embedding call per turn):
+# finished turns are embedded in the background and the most relevant
+# ones are recalled into the prompt. With memory on, only the last
+# MEMORY_VERBATIM_TURNS turns are sent verbatim; older turns reach the
+# prompt through recall, so no turn is sent twice.
+CONVERSATION_MEMORY = False
+MEMORY_VERBATIM_TURNS = 3
+MEMORY_TOP_K = 3
+MEMORY_MIN_SIMILARITY = 0.55  # cosine similarity
+MEMORY_TOKEN_BUDGET = 600
+MEMORY_MAX_TURN_CHARS = 4000  # longer turns are truncated before embedding
+MEMORY_LOADED_THREADS = 64  # per-thread matrices kept in RAM
+
+# Async serving: most turns generating at once (requests to the provider)
+MODEL_MAX_CONCURRENCY = 16
+
+# HTTP API (backend/api.py)
+API_HOST = "127.0.0.1"
+API_PORT = 8080
+API_MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+API_SESSION_IDLE_SECONDS = 2 * 3600  # idle sessions release their documents
+API_KEEPALIVE_SECONDS = 75
+
+# Answer cache for repeated first-turn questions (opt-in)
+RESPONSE_CACHE = False
+RESPONSE_CACHE_SIZE = 2048
+RESPONSE_CACHE_TTL_SECONDS = 24 * 3600
+RESPONSE_CACHE_SIMILARITY = 0.95  # query-embedding cosine for paraphrase hits
+RESPONSE_CACHE_SCAN_LIMIT = 256  # questions compared per (documents, persona, language, context)
+
+# Instrumentation (backend/metrics.py): spans, counters, histograms
+METRICS_ENABLED = True
+
+# Streamed reply rendering (backend/streaming.py): tokens are batched and
+# flushed every STREAM_FLUSH_INTERVAL_SECONDS or STREAM_FLUSH_CHARS chars
+STREAM_FLUSH_INTERVAL_SECONDS = 0.08
+STREAM_FLUSH_CHARS = 400
@@ -0,0 +1,193 @@
+# backend/context.py
+"""
+Context assembly: retrieved chunks → prompt context string.
+
+Retrievers return more candidates than the prompt needs, and with
+CHUNK_OVERLAP neighbouring chunks repeat each other. Before anything goes
+into the prompt we:
+
+1. merge chunks that are adjacent in the same document (dropping the
+   overlapping text once),
+2. drop near-duplicates,
+3. order the rest with maximal marginal relevance (MMR), and
+4. pack them into a token budget.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Set
+
+from langchain_core.documents import Document
+
+from backend.config import (
+    CHUNK_OVERLAP,
+    RAG_CONTEXT_TOKEN_BUDGET,
+    RAG_DEDUP_THRESHOLD,
+    RAG_MMR_LAMBDA,
+)
+from backend.tokens import estimate_tokens
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@dataclass
+class _Passage:
+    text: str
+    rank: int  # best retrieval rank among the merged chunks (0 = best)
+    document: Optional[str] = None  # doc id (file hash), else source name
+    source: Optional[str] = None
+    first: Optional[int] = None  # first / last chunk_index covered
+    last: Optional[int] = None
+    csv: bool = False
+    words: Set[str] = field(default_factory=set)
+
+
+def _words(text: str) -> Set[str]:
+    return set(_WORD_RE.findall(text.lower()))
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _join_overlapping(left: str, right: str) -> str:
+    """Concatenate two consecutive chunks, writing their shared overlap once."""
+    max_overlap = min(len(left), len(right), 2 * CHUNK_OVERLAP)
+    for size in range(max_overlap, 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left}\n{right}"
+
+
+def _merge_adjacent(passages: List[_Passage]) -> List[_Passage]:
+    """Merge runs of consecutive chunks from the same document."""
+    positioned = sorted(
+        (p for p in passages if p.first is not None),
+        key=lambda p: (str(p.document), p.first),
+    )
+    merged: List[_Passage] = []
+    for p in positioned:
+        prev = merged[-1] if merged else None
+        if prev is not None and prev.document == p.document and p.first == prev.last + 1:
+            if p.csv:
+                # Row chunks don't overlap, but each repeats the header line
+                body = p.text.split("\n", 1)[1] if "\n" in p.text else ""
+                prev.text = f"{prev.text}\n{body}" if body else prev.text
+            else:
+                prev.text = _join_overlapping(prev.text, p.text)
+            prev.last = p.last
+            prev.rank = min(prev.rank, p.rank)
+        else:
+            merged.append(p)
+
+    merged.extend(p for p in passages if p.first is None)
+    return merged
+
+
+def _dedupe(passages: List[_Passage], threshold: float) -> List[_Passage]:
+    kept: List[_Passage] = []
+    for p in sorted(passages, key=lambda p: p.rank):
+        if all(_jaccard(p.words, k.words) < threshold for k in kept):
+            kept.append(p)
+    return kept
+
+
+def _mmr_order(passages: List[_Passage], lambda_mult: float) -> List[_Passage]:
+    """
+    Greedy MMR: relevance comes from retrieval rank, redundancy from word
+    overlap with passages already selected.
+    """
+    if not passages:
+        return []
+
+    worst = max(p.rank for p in passages) + 1
+    relevance = {id(p): 1.0 - p.rank / worst for p in passages}
+
+    remaining = list(passages)
+    selected: List[_Passage] = []
+    while remaining:
+        best = max(
+            remaining,
+            key=lambda p: lambda_mult * relevance[id(p)]
+            - (1 - lambda_mult) * max((_jaccard(p.words, s.words) for s in selected), default=0.0),
+        )
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    if budget <= 0:
+        return ""
+    # estimate_tokens is roughly linear in length; trim proportionally
+    while text and estimate_tokens(text) > budget:
+        text = text[: int(len(text) * budget / estimate_tokens(text)) - 1]
+    return text
+
+
+def _packed(p: _Passage, text: str) -> Dict:
+    return {"source": p.source, "chunk_range": [p.first, p.last], "text": text}
+
+
+def pack_passages(
+    docs: Sequence[Document],
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+    mmr_lambda: float = RAG_MMR_LAMBDA,
+    dedup_threshold: float = RAG_DEDUP_THRESHOLD,
+) -> List[Dict]:
+    """
+    The passages `pack_context` puts into the prompt, in order, as
+    {"source", "chunk_range": [first, last], "text"}.
+    """
+    passages = []
+    for rank, doc in enumerate(docs):
+        meta = doc.metadata or {}
+        index = meta.get("chunk_index")
+        passages.append(
+            _Passage(
+                text=doc.page_content,
+                rank=rank,
+                document=meta.get("doc_id") or meta.get("source"),
+                source=meta.get("source"),
+                first=index,
+                last=index,
+                csv="row_start" in meta,
+            )
+        )
+
+    passages = _merge_adjacent(passages)
+    for p in passages:
+        p.words = _words(p.text)
+    passages = _dedupe(passages, dedup_threshold)
+    passages = _mmr_order(passages, mmr_lambda)
+
+    packed: List[Dict] = []
+    used = 0
+    for p in passages:
+        cost = estimate_tokens(p.text)
+        if used + cost <= token_budget:
+            packed.append(_packed(p, p.text))
+            used += cost
+        elif not packed:
+            # Never return nothing just because the best passage is long
+            packed.append(_packed(p, _truncate_to_tokens(p.text, token_budget)))
+            break
+
+    return packed
+
+
+def pack_context(
+    docs: Sequence[Document],
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+    mmr_lambda: float = RAG_MMR_LAMBDA,
+    dedup_threshold: float = RAG_DEDUP_THRESHOLD,
+) -> str:
+    """
+    Turn ranked retrieval results (best first) into a context string of at
+    most ~`token_budget` tokens.
+    """
+    passages = pack_passages(docs, token_budget, mmr_lambda, dedup_threshold)
+    return "\n\n".join(p["text"] for p in passages)
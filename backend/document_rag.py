@@ -1,79 +1,455 @@
 # backend/document_rag.py
+"""
+Document ingestion: extract → chunk → embed → FAISS.
+
+Ingestion is streamed: text is produced page by page (PDF) or paragraph
+by paragraph (DOCX), chunked as it arrives, and chunk batches are handed
+to the embedding pipeline while extraction continues. Peak memory is
+bounded by the chunks in flight plus the index itself, not by the size
+of the extracted text.
+
+Format parsers (PyPDF2, python-docx), the text splitter, FAISS and the
+embeddings client are imported on first use, so importing this module
+(e.g. for `compute_file_hash`) stays cheap for chats without documents.
+"""
 from __future__ import annotations
 
+import csv
 import hashlib
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from io import BytesIO, StringIO
+from functools import lru_cache
+from io import BytesIO, StringIO, TextIOWrapper
+from itertools import count, islice
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional
 
-import pandas as pd
-import docx
-from PyPDF2 import PdfReader
+from langchain_core.embeddings import Embeddings
+from langchain_core.documents import Document
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
+from backend import metrics
+from backend.config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    EMBED_BATCH_SIZE,
+    EMBEDDING_MODEL_NAME,
+    PDF_EXTRACT_WORKERS,
+    PDF_PAGES_PER_TASK,
+)
+from backend.embedding_cache import CachedEmbeddings, get_embedding_cache
+from backend.embedding_pipeline import ProgressCallback, TokenBucket, embed_batches
+from backend.lexical import BM25Index
 
-from backend.config import CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL_NAME
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+    from PyPDF2 import PdfReader
 
 
 SUPPORTED_EXTENSIONS = {"pdf", "txt", "docx", "csv"}
 
+# How much extracted text to buffer before running the splitter
+_STREAM_BUFFER_CHARS = CHUNK_SIZE * 8
+
 
 @dataclass(frozen=True)
 class BuiltIndex:
+    # LangChain FAISS store, or a CompactVectorStore served from a snapshot
     vectorstore: FAISS
     file_hash: str
     filename: str
+    # BM25 index over the same chunks, keyed by FAISS docstore id
+    lexical: Optional[BM25Index] = None
 
 
 def compute_file_hash(file_bytes: bytes) -> str:
     return hashlib.md5(file_bytes).hexdigest()
 
 
+@lru_cache(maxsize=1)
+def get_embeddings() -> CachedEmbeddings:
+    """
+    Document embeddings backed by the on-disk embedding cache, so
+    unchanged chunks are never sent to the provider twice. One client
+    per process.
+    """
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    return CachedEmbeddings(
+        GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL_NAME),
+        model_name=EMBEDDING_MODEL_NAME,
+        cache=get_embedding_cache(),
+    )
+
+
 def _ext(filename: str) -> str:
     return filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
 
 
-def extract_text(file_bytes: bytes, filename: str) -> str:
+# ---------------------------------------------------------------------
+# Extraction
+# ---------------------------------------------------------------------
+_worker_pdf_reader: Optional[PdfReader] = None
+
+
+def _init_pdf_worker(file_bytes: bytes) -> None:
+    # Each worker process parses the PDF once, not once per task
+    from PyPDF2 import PdfReader
+
+    global _worker_pdf_reader
+    _worker_pdf_reader = PdfReader(BytesIO(file_bytes))
+
+
+def _extract_pdf_pages(start: int, stop: int) -> List[str]:
+    return [(_worker_pdf_reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def _iter_pdf_pages(file_bytes: bytes, workers: int) -> Iterator[str]:
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(BytesIO(file_bytes))
+
+    if workers <= 1:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+
+    n_pages = len(reader.pages)
+    ranges = iter(
+        (start, min(start + PDF_PAGES_PER_TASK, n_pages))
+        for start in range(0, n_pages, PDF_PAGES_PER_TASK)
+    )
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_pdf_worker,
+        initargs=(file_bytes,),
+    ) as pool:
+        # Keep a bounded window of page ranges in flight, yielded in order
+        pending = deque(pool.submit(_extract_pdf_pages, *r) for r in islice(ranges, workers * 2))
+        while pending:
+            pages = pending.popleft().result()
+            nxt = next(ranges, None)
+            if nxt is not None:
+                pending.append(pool.submit(_extract_pdf_pages, *nxt))
+            yield from pages
+
+
+def iter_text_segments(
+    file_bytes: bytes,
+    filename: str,
+    pdf_workers: int = PDF_EXTRACT_WORKERS,
+) -> Iterator[str]:
+    """
+    Yield the document's text in natural segments: pages for PDF,
+    paragraphs for DOCX, lines for TXT, row-aligned chunks for CSV.
+    """
     ext = _ext(filename)
     if ext not in SUPPORTED_EXTENSIONS:
         raise ValueError(f"Unsupported file type: .{ext}")
 
-    bio = BytesIO(file_bytes)
-
     if ext == "pdf":
-        reader = PdfReader(bio)
-        return "\n".join([(p.extract_text() or "") for p in reader.pages])
+        yield from _iter_pdf_pages(file_bytes, pdf_workers)
+        return
 
     if ext == "txt":
-        return file_bytes.decode("utf-8", errors="ignore")
+        for line in StringIO(file_bytes.decode("utf-8", errors="ignore")):
+            yield line.rstrip("\n")
+        return
 
     if ext == "docx":
-        document = docx.Document(bio)
-        return "\n".join([p.text for p in document.paragraphs])
+        import docx
+
+        document = docx.Document(BytesIO(file_bytes))
+        for p in document.paragraphs:
+            yield p.text
+        return
 
     if ext == "csv":
-        text = file_bytes.decode("utf-8", errors="ignore")
-        df = pd.read_csv(StringIO(text))
-        return df.to_string(index=False)
+        for doc in iter_csv_chunks(file_bytes, source=filename):
+            yield doc.page_content
+        return
 
     raise ValueError(f"Unsupported file type: .{ext}")
 
 
-def build_vectorstore_from_upload(file_bytes: bytes, filename: str) -> BuiltIndex:
-    file_hash = compute_file_hash(file_bytes)
-    raw_text = extract_text(file_bytes, filename)
+def extract_text(file_bytes: bytes, filename: str) -> str:
+    return "\n".join(iter_text_segments(file_bytes, filename))
+
+
+# ---------------------------------------------------------------------
+# Chunking
+# ---------------------------------------------------------------------
+def iter_chunks(segments: Iterable[str], source: str) -> Iterator[Document]:
+    """
+    Split a stream of text segments into overlapping chunks.
+
+    Segments are buffered until there is enough text to split; the last
+    chunk of every split is carried over, because it may continue in the
+    next segment.
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
 
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
     )
-    chunks = splitter.split_text(raw_text)
+    chunk_index = count()
+    buffer = ""
+
+    def make(piece: str) -> Document:
+        return Document(
+            page_content=piece,
+            metadata={"source": source, "chunk_index": next(chunk_index)},
+        )
+
+    for segment in segments:
+        buffer = f"{buffer}\n{segment}" if buffer else segment
+        if len(buffer) < _STREAM_BUFFER_CHARS:
+            continue
+
+        pieces = splitter.split_text(buffer)
+        for piece in pieces[:-1]:
+            yield make(piece)
+        buffer = pieces[-1] if pieces else ""
+
+    if buffer:
+        for piece in splitter.split_text(buffer):
+            yield make(piece)
+
+
+def iter_csv_chunks(
+    file_bytes: bytes,
+    source: str,
+    max_chars: int = CHUNK_SIZE,
+) -> Iterator[Document]:
+    """
+    Read a CSV row by row and yield row-aligned chunks of up to
+    `max_chars`, each starting with the header line.
+
+    Rows are never cut in half, and every chunk records the (1-based,
+    inclusive) data rows it covers in `row_start` / `row_end`. Only the
+    current chunk is held in memory.
+    """
+    stream = TextIOWrapper(BytesIO(file_bytes), encoding="utf-8", errors="ignore", newline="")
+    reader = csv.reader(stream)
+
+    def render(row: List[str]) -> str:
+        out = StringIO()
+        csv.writer(out, lineterminator="").writerow(row)
+        return out.getvalue()
+
+    header = next(reader, None)
+    if not header:
+        return
+    header_line = render(header)
 
-    if not chunks:
+    chunk_index = count()
+    lines: List[str] = []
+    size = len(header_line)
+    row_start = 1
+
+    def flush(row_end: int) -> Document:
+        return Document(
+            page_content="\n".join([header_line, *lines]),
+            metadata={
+                "source": source,
+                "chunk_index": next(chunk_index),
+                "row_start": row_start,
+                "row_end": row_end,
+            },
+        )
+
+    row_number = 0
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        row_number += 1
+        line = render(row)
+
+        if lines and size + 1 + len(line) > max_chars:
+            yield flush(row_number - 1)
+            lines = []
+            size = len(header_line)
+            row_start = row_number
+
+        lines.append(line)
+        size += 1 + len(line)
+
+    if lines:
+        yield flush(row_number)
+
+
+def iter_documents(
+    file_bytes: bytes,
+    filename: str,
+    pdf_workers: int = PDF_EXTRACT_WORKERS,
+) -> Iterator[Document]:
+    """Streamed chunks of the document, ready to embed."""
+    if _ext(filename) == "csv":
+        return iter_csv_chunks(file_bytes, source=filename)
+    return iter_chunks(iter_text_segments(file_bytes, filename, pdf_workers), source=filename)
+
+
+def _batched(items: Iterable[Document], size: int) -> Iterator[List[Document]]:
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+# ---------------------------------------------------------------------
+# Index build
+# ---------------------------------------------------------------------
+def build_vectorstore_from_upload(
+    file_bytes: bytes,
+    filename: str,
+    progress_callback: Optional[ProgressCallback] = None,
+    embeddings: Optional[Embeddings] = None,
+) -> BuiltIndex:
+    """
+    Extract, chunk, embed and index an uploaded file.
+
+    `embeddings` defaults to the cached provider embeddings
+    (`get_embeddings()`); pass another implementation to build offline.
+    """
+    return build_index_from_documents(
+        iter_documents(file_bytes, filename),
+        compute_file_hash(file_bytes),
+        filename,
+        progress_callback=progress_callback,
+        embeddings=embeddings,
+    )
+
+
+def build_index_from_documents(
+    documents: Iterable[Document],
+    file_hash: str,
+    filename: str,
+    progress_callback: Optional[ProgressCallback] = None,
+    embeddings: Optional[Embeddings] = None,
+    rate_limiter: Optional[TokenBucket] = None,
+) -> BuiltIndex:
+    """
+    Embed and index already extracted chunks (e.g. chunked in a worker
+    process). `rate_limiter` lets concurrent builds share one quota.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    from backend.ann import finalize_index
+
+    started = time.perf_counter()
+    file_format = _ext(filename) or "unknown"
+    embeddings = embeddings or get_embeddings()
+
+    # Batches waiting for their vectors, keyed by submission order
+    waiting: dict[int, List[Document]] = {}
+    submitted = count()
+    produced = 0
+    embedded = 0
+    # Extraction + chunking and FAISS/BM25 inserts are interleaved with
+    # embedding; accumulate their time separately
+    extract_seconds = 0.0
+    index_seconds = 0.0
+
+    def text_batches() -> Iterator[List[str]]:
+        nonlocal produced, extract_seconds
+        batches = _batched(documents, EMBED_BATCH_SIZE)
+        while True:
+            t0 = time.perf_counter()
+            batch = next(batches, None)
+            extract_seconds += time.perf_counter() - t0
+            if batch is None:
+                return
+            waiting[next(submitted)] = batch
+            produced += len(batch)
+            yield [d.page_content for d in batch]
+
+    vectorstore: Optional[FAISS] = None
+    lexical = BM25Index()
+
+    for index, vectors in embed_batches(text_batches(), embeddings, rate_limiter=rate_limiter):
+        t0 = time.perf_counter()
+        batch = waiting.pop(index)
+        for d in batch:
+            # Chunk identity across documents (filenames can repeat)
+            d.metadata["doc_id"] = file_hash
+        text_embeddings = [(d.page_content, v) for d, v in zip(batch, vectors)]
+        metadatas = [d.metadata for d in batch]
+        ids = [str(uuid.uuid4()) for _ in batch]
+
+        if vectorstore is None:
+            vectorstore = FAISS.from_embeddings(
+                text_embeddings, embeddings, metadatas=metadatas, ids=ids
+            )
+        else:
+            vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+        for doc_id, d in zip(ids, batch):
+            lexical.add(doc_id, d.page_content)
+        index_seconds += time.perf_counter() - t0
+
+        embedded += len(batch)
+        if progress_callback:
+            progress_callback(embedded, produced)
+
+    if vectorstore is None:
         raise ValueError("No text could be extracted from this file.")
 
-    embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL_NAME)
-    vectorstore = FAISS.from_texts(chunks, embedding=embeddings)
+    # Chunks were appended to an exact index; switch to the configured
+    # (or size-appropriate) ANN index now that all vectors are known.
+    with metrics.span("ingest_finalize_index"):
+        finalize_index(vectorstore)
+
+    metrics.observe("ingest_seconds", time.perf_counter() - started, format=file_format)
+    metrics.observe("ingest_extract_seconds", extract_seconds, format=file_format)
+    metrics.observe("ingest_index_add_seconds", index_seconds, format=file_format)
+    metrics.increment("documents_ingested", format=file_format)
+    metrics.increment("chunks_ingested", embedded, format=file_format)
+
+    return BuiltIndex(
+        vectorstore=vectorstore,
+        file_hash=file_hash,
+        filename=filename,
+        lexical=lexical,
+    )
+
+
+def merge_indexes(parts: Iterable[BuiltIndex], file_hash: str, filename: str) -> BuiltIndex:
+    """
+    One index over the chunks of several built indexes (no re-embedding):
+    vectors are read back from each index, chunk ids and metadata are
+    kept, and the merged index gets the ANN type that suits its size.
+    """
+    import numpy as np
+    from langchain_community.vectorstores import FAISS
+
+    from backend.ann import finalize_index, index_vectors
+    from backend.compact_store import iter_stored_chunks
+
+    vectorstore: Optional[FAISS] = None
+    lexical = BM25Index()
+
+    for part in parts:
+        vs = part.vectorstore
+        if vs.index.ntotal == 0:
+            continue
+        vectors = index_vectors(vs.index)
+        ids, docs = zip(*iter_stored_chunks(vs))
+        text_embeddings = [(d.page_content, v) for d, v in zip(docs, np.asarray(vectors).tolist())]
+        metadatas = [d.metadata for d in docs]
+
+        if vectorstore is None:
+            vectorstore = FAISS.from_embeddings(text_embeddings, vs.embeddings, metadatas=metadatas, ids=ids)
+        else:
+            vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        for doc_id, d in zip(ids, docs):
+            lexical.add(doc_id, d.page_content)
+
+    if vectorstore is None:
+        raise ValueError("No indexed chunks to merge.")
+
+    with metrics.span("ingest_finalize_index"):
+        finalize_index(vectorstore)
 
-    return BuiltIndex(vectorstore=vectorstore, file_hash=file_hash, filename=filename)
+    return BuiltIndex(vectorstore=vectorstore, file_hash=file_hash, filename=filename, lexical=lexical)
@@ -0,0 +1,240 @@
+# backend/embedding_cache.py
+"""
+Persistent, content-addressed cache for chunk embeddings.
+
+Vectors are keyed by (embedding model name, sha256 of the chunk text) and
+stored in a small SQLite file on local disk. When the cache grows past its
+byte budget, the least recently used vectors are evicted first.
+
+`CachedEmbeddings` wraps any LangChain `Embeddings` object so that only
+chunks that were never embedded before reach the remote provider.
+"""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+from backend.config import CACHE_DIR, EMBEDDING_CACHE_MAX_BYTES
+
+
+def _cache_key(model_name: str, text: str) -> str:
+    digest = hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+    return f"{model_name}:{digest}"
+
+
+def _pack(vector: Sequence[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    vec = array("f")
+    vec.frombytes(blob)
+    return vec.tolist()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed vector store with size-based LRU eviction.
+
+    Safe to share between threads; all access goes through one lock.
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_access ON embeddings(last_access)"
+        )
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()
+        self._total_bytes = int(row[0])
+
+    # -----------------------------------------------------------------
+    # Lookups
+    # -----------------------------------------------------------------
+    def get_many(self, model_name: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Return cached vectors for `texts`, with None for every miss.
+        """
+        keys = [_cache_key(model_name, t) for t in texts]
+        found: dict[str, bytes] = {}
+
+        with self._lock:
+            # SQLite caps the number of bound parameters per statement
+            for start in range(0, len(keys), 500):
+                batch = list(dict.fromkeys(keys[start:start + 500]))
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, k) for k in found],
+                )
+                self._conn.commit()
+
+            results = [(_unpack(found[k]) if k in found else None) for k in keys]
+            hit_count = sum(1 for r in results if r is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+
+        return results
+
+    # -----------------------------------------------------------------
+    # Inserts + eviction
+    # -----------------------------------------------------------------
+    def put_many(
+        self,
+        model_name: str,
+        texts: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+    ) -> None:
+        if not texts:
+            return
+
+        now = time.time()
+        rows = {}
+        for text, vector in zip(texts, vectors):
+            blob = _pack(vector)
+            rows[_cache_key(model_name, text)] = blob
+
+        with self._lock:
+            keys = list(rows)
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                existing = self._conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchone()
+                self._total_bytes -= int(existing[0])
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings(key, vector, size, last_access) VALUES (?, ?, ?, ?)",
+                [(k, blob, len(blob), now) for k, blob in rows.items()],
+            )
+            self._total_bytes += sum(len(blob) for blob in rows.values())
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self) -> None:
+        """Drop least recently used vectors until we are under budget."""
+        while self._total_bytes > self.max_bytes:
+            victims = self._conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_access ASC LIMIT 256"
+            ).fetchall()
+            if not victims:
+                self._total_bytes = 0
+                return
+
+            for key, size in victims:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+
+    # -----------------------------------------------------------------
+    # Introspection
+    # -----------------------------------------------------------------
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "total_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._total_bytes = 0
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain `Embeddings` wrapper that serves document vectors from an
+    `EmbeddingCache` and only forwards cache misses to `underlying`.
+
+    Query embeddings are passed straight through: they are short,
+    one-off and not worth persisting.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, cache: EmbeddingCache):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.cache = cache
+
+    def lookup(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached vectors for `texts`, None for every miss."""
+        return self.cache.get_many(self.model_name, texts)
+
+    def embed_and_store(self, texts: List[str]) -> List[List[float]]:
+        """Embed `texts` with the underlying model and cache the result."""
+        fresh = self.underlying.embed_documents(texts)
+        self.cache.put_many(self.model_name, texts, fresh)
+        # Round-trip through float32 so fresh and cached vectors match exactly
+        return [_unpack(_pack(v)) for v in fresh]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cached = self.lookup(texts)
+
+        # Deduplicate misses so repeated chunks are embedded once
+        missing = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+        if missing:
+            by_text = dict(zip(missing, self.embed_and_store(missing)))
+            cached = [v if v is not None else by_text[t] for t, v in zip(texts, cached)]
+
+        return cached
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+
+@lru_cache(maxsize=1)
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Process-wide embedding cache under CACHE_DIR.
+    """
+    return EmbeddingCache(Path(CACHE_DIR) / "embeddings.sqlite3")
@@ -0,0 +1,186 @@
+# backend/embedding_pipeline.py
+"""
+Batched, concurrent, rate-limited embedding of document chunks.
+
+Chunks are sent in fixed-size batches on a bounded worker pool. Every
+request to the provider first takes a token from a shared token bucket,
+and batches that hit a quota error (`ResourceExhausted`) are retried with
+exponential backoff. Vectors that were already produced are kept: cached
+chunks never leave the process and successful batches are written to the
+embedding cache immediately, so a retry after a final failure only
+embeds what is left.
+
+`embed_batches` consumes its input lazily, so callers can feed it from a
+generator (e.g. streaming extraction) and keep extracting while earlier
+batches are being embedded.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from google.api_core.exceptions import ResourceExhausted
+from langchain_core.embeddings import Embeddings
+
+from backend import metrics
+from backend.config import (
+    EMBED_BATCH_SIZE,
+    EMBED_MAX_RETRIES,
+    EMBED_MAX_WORKERS,
+    EMBED_REQUESTS_PER_MINUTE,
+    EMBED_RETRY_BASE_DELAY,
+)
+from backend.embedding_cache import CachedEmbeddings
+
+# progress_callback(done_chunks, total_chunks)
+ProgressCallback = Callable[[int, int], None]
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts of up
+    to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self, tokens: float) -> float:
+        """Take `tokens` if available (returns 0), else the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until `tokens` are available, then take them."""
+        while (wait_for := self._take(tokens)) > 0:
+            time.sleep(wait_for)
+
+    async def aacquire(self, tokens: float = 1.0) -> None:
+        """`acquire` for coroutines: waits without holding a thread."""
+        while (wait_for := self._take(tokens)) > 0:
+            await asyncio.sleep(wait_for)
+
+
+class EmbeddingPipelineError(RuntimeError):
+    """Raised when some batches still fail after all retries."""
+
+
+def _make_batch_embedder(
+    embeddings: Embeddings,
+    limiter: TokenBucket,
+    max_retries: int,
+) -> Callable[[Sequence[str]], List[List[float]]]:
+    """
+    Return a function that embeds one batch: cache first, then the
+    provider (rate limited, retried on quota errors) for the misses.
+    """
+
+    def embed_batch(batch: Sequence[str]) -> List[List[float]]:
+        if isinstance(embeddings, CachedEmbeddings):
+            vectors = embeddings.lookup(batch)
+            call = embeddings.embed_and_store
+        else:
+            vectors = [None] * len(batch)
+            call = embeddings.embed_documents
+
+        # Duplicate chunks inside a batch are embedded once
+        missing = list(dict.fromkeys(t for t, v in zip(batch, vectors) if v is None))
+        metrics.increment("embedding_cache_hits", len(batch) - sum(v is None for v in vectors))
+        if not missing:
+            return vectors
+        metrics.increment("embedding_cache_misses", len(missing))
+
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
+            try:
+                with metrics.span("embed_request"):
+                    fresh = dict(zip(missing, call(missing)))
+                break
+            except ResourceExhausted:
+                metrics.increment("quota_errors", stage="embedding")
+                if attempt == max_retries:
+                    raise
+                delay = EMBED_RETRY_BASE_DELAY * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay / 2))
+
+        return [v if v is not None else list(fresh[t]) for t, v in zip(batch, vectors)]
+
+    return embed_batch
+
+
+def embed_batches(
+    batches: Iterable[Sequence[str]],
+    embeddings: Embeddings,
+    *,
+    max_workers: int = EMBED_MAX_WORKERS,
+    requests_per_minute: float = EMBED_REQUESTS_PER_MINUTE,
+    max_retries: int = EMBED_MAX_RETRIES,
+    rate_limiter: Optional[TokenBucket] = None,
+) -> Iterator[Tuple[int, List[List[float]]]]:
+    """
+    Embed batches of texts on a worker pool and yield
+    `(batch_index, vectors)` as each batch completes.
+
+    `batches` is pulled lazily with at most `2 * max_workers` batches in
+    flight, so a slow producer overlaps with embedding and a fast one
+    cannot run ahead unbounded. Batches that still fail after all retries
+    are skipped; an `EmbeddingPipelineError` is raised once the input is
+    exhausted.
+    """
+    limiter = rate_limiter or TokenBucket(requests_per_minute / 60.0)
+    embed_batch = _make_batch_embedder(embeddings, limiter, max_retries)
+    max_in_flight = 2 * max(1, max_workers)
+
+    submitted = 0
+    failures = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        in_flight = {}
+        source = iter(batches)
+        exhausted = False
+
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < max_in_flight:
+                batch = next(source, None)
+                if batch is None:
+                    exhausted = True
+                    break
+                in_flight[pool.submit(embed_batch, list(batch))] = submitted
+                submitted += 1
+
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = in_flight.pop(future)
+                try:
+                    vectors = future.result()
+                except ResourceExhausted:
+                    failures += 1
+                    continue
+                yield index, vectors
+
+    if failures:
+        raise EmbeddingPipelineError(
+            f"Embedding quota exhausted: {failures} of {submitted} batches failed. "
+            "Try again later; finished chunks are cached."
+        )
+
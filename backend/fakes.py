@@ -0,0 +1,165 @@
+# backend/fakes.py
+"""
+Offline stand-ins for the Gemini chat model and embeddings, for load
+tests and benchmarks.
+
+`FakeStreamingChatModel` streams a canned reply with a configurable
+time-to-first-token and token rate. Its sync path blocks (time.sleep)
+and its async path yields to the event loop (asyncio.sleep), like real
+network-bound clients, so the two serving paths can be compared without
+an API key or quota.
+
+`FakeEmbeddings` returns deterministic unit vectors derived from the text
+(the same text always gets the same vector) and can simulate request
+latency and a requests-per-minute quota that raises `ResourceExhausted`,
+like the Gemini API does.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from google.api_core.exceptions import ResourceExhausted
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from backend.tokens import estimate_message_tokens
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    reply: str = "This is a simulated answer from the fake chat model. " * 4
+    ttft_seconds: float = 0.3  # delay before the first token
+    tokens_per_second: float = 80.0
+    words_per_token: int = 1
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming-chat"
+
+    def _tokens(self) -> List[str]:
+        words = self.reply.split(" ")
+        n = self.words_per_token
+        return [" ".join(words[i:i + n]) + " " for i in range(0, len(words), n)]
+
+    def _delays(self):
+        yield self.ttft_seconds
+        while True:
+            yield 1.0 / self.tokens_per_second
+
+    def get_num_tokens_from_messages(self, messages: List[BaseMessage]) -> int:
+        return sum(estimate_message_tokens(m) for m in messages)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for token, delay in zip(self._tokens(), self._delays()):
+            time.sleep(delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for token, delay in zip(self._tokens(), self._delays()):
+            await asyncio.sleep(delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = "".join(c.message.content for c in self._stream(messages, stop, run_manager))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        parts = [c.message.content async for c in self._astream(messages, stop, run_manager)]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(parts)))])
+
+
+class FakeEmbeddings(Embeddings):
+    def __init__(
+        self,
+        size: int = 768,
+        latency_seconds: float = 0.0,
+        per_text_seconds: float = 0.0,
+        requests_per_minute: Optional[int] = None,
+    ):
+        """
+        latency_seconds: fixed delay per request (network round trip).
+        per_text_seconds: additional delay per text in a request.
+        requests_per_minute: simulated quota; requests beyond it within a
+        sliding minute raise ResourceExhausted.
+        """
+        self.size = size
+        self.latency_seconds = latency_seconds
+        self.per_text_seconds = per_text_seconds
+        self.requests_per_minute = requests_per_minute
+        self.model_name = f"fake-embedding-{size}"
+
+        self.requests = 0
+        self.rejected = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        v = np.random.default_rng(seed).standard_normal(self.size).astype("float32")
+        return (v / np.linalg.norm(v)).tolist()
+
+    def _request(self, n_texts: int) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self.requests_per_minute is not None:
+                while self._recent and now - self._recent[0] > 60.0:
+                    self._recent.popleft()
+                if len(self._recent) >= self.requests_per_minute:
+                    self.rejected += 1
+                    raise ResourceExhausted("Simulated embedding quota exceeded")
+                self._recent.append(now)
+            self.requests += 1
+
+        delay = self.latency_seconds + self.per_text_seconds * n_texts
+        if delay:
+            time.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._request(len(texts))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self._request(1)
+        return self._vector(text)
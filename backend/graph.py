@@ -3,27 +3,75 @@ backend/graph.py
 
 
 Flow:
-START ──► model
+START ──► model ──► END
 
 The graph:
 - Maintains conversation state (messages + metadata)
 - Trims message history to fit within a token budget
+  (per-message token counts are cached in the state, so each turn only
+  counts the new messages)
 - Invokes the chat model once per turn
 - Appends the model response back into the conversation state
+
+`HistoryCompactor` folds turns older than the last HISTORY_KEEP_TURNS into
+a running summary once the history passes a token threshold, which keeps
+the prompt size per turn roughly flat as a chat grows. It is not part of
+the graph: ChatService runs it in the background after a turn has
+returned and applies its result with `update_state`, so the summarizer
+call never holds up the end of a turn.
 """
 
-from typing import Sequence
+import uuid
+from typing import Dict, List, Optional, Sequence
 from typing_extensions import TypedDict, Annotated
 from datetime import date
 
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import BaseMessage, RemoveMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import trim_messages
+from langchain_core.runnables import RunnableLambda
+
+from langgraph.graph import StateGraph, START, END, add_messages
+
+from backend import metrics
+from backend.checkpoint import get_checkpointer
+from backend.config import (
+    HISTORY_COMPACT_MIN_TOKENS,
+    HISTORY_COMPACT_THRESHOLD_TOKENS,
+    HISTORY_KEEP_TURNS,
+    MAX_TOKENS,
+    SUMMARY_PROMPT,
+    SYSTEM_PROMPT,
+    TOKEN_COUNTER,
+)
+from backend.tokens import make_message_counter, trim_to_budget
+
+
+def merge_counts(left: Dict[str, int], right: Dict[str, Optional[int]]) -> Dict[str, int]:
+    """
+    Reducer: new per-message token counts are added to the cached ones.
+    A count of None drops the entry (its message was compacted away).
+    """
+    merged = {**(left or {}), **(right or {})}
+    return {k: v for k, v in merged.items() if v is not None}
 
-from langgraph.graph import StateGraph, START, add_messages
-from langgraph.checkpoint.memory import MemorySaver
 
-from backend.config import SYSTEM_PROMPT, MAX_TOKENS
+_ROLE_NAMES = {"human": "User", "ai": "Assistant"}
+
+
+def recent_turns_start(messages: Sequence[BaseMessage], turns: int) -> int:
+    """Index of the first message of the last `turns` turns (0 if there are fewer)."""
+    human_positions = [i for i, m in enumerate(messages) if m.type == "human"]
+    if len(human_positions) <= turns:
+        return 0
+    return human_positions[-turns]
+
+
+def _transcript(messages: Sequence[BaseMessage]) -> str:
+    lines = []
+    for m in messages:
+        content = m.content if isinstance(m.content, str) else str(m.content)
+        lines.append(f"{_ROLE_NAMES.get(m.type, m.type)}: {content}")
+    return "\n\n".join(lines)
 
 
 # ---------------------------------------------------------------------
@@ -46,17 +94,37 @@ class State(TypedDict):
 
     - retrieved_context:
         Optional RAG context (can be empty if RAG is not used).
+
+    - recalled_memory:
+        Relevant earlier turns of this chat recalled from long-term
+        memory (see backend/memory.py); empty if none.
+
+    - token_counts:
+        Cached token count per message id. Checkpointed with the
+        conversation, so a message is only ever counted once.
+
+    - summary:
+        Running summary of the turns that were compacted out of
+        `messages` (empty until the first compaction).
     """
     messages: Annotated[Sequence[BaseMessage], add_messages]
     persona: str
     language: str
     retrieved_context: str
+    recalled_memory: str
+    token_counts: Annotated[Dict[str, int], merge_counts]
+    summary: str
 
 
 # ---------------------------------------------------------------------
 # Graph Builder
 # ---------------------------------------------------------------------
-def build_graph(model):
+def build_graph(
+    model,
+    token_counter=TOKEN_COUNTER,
+    checkpointer=None,
+    verbatim_turns: Optional[int] = None,
+):
     """
     Builds and compiles the LangGraph.
 
@@ -65,23 +133,30 @@ def build_graph(model):
             A LangChain-compatible chat model instance
             (must support `.invoke()`).
 
+        token_counter:
+            "local" (fast offline estimate), "model" (the model's own
+            tokenizer; remote for Gemini) or a callable(message) -> int.
+
+        checkpointer:
+            LangGraph checkpointer for conversation state. Defaults to the
+            shared, bounded SQLite store (see backend/checkpoint.py).
+
+        verbatim_turns:
+            Send at most this many earlier turns verbatim (None: as many
+            as fit in MAX_TOKENS). Used with conversation memory, which
+            recalls the older turns.
+
     Returns:
-        A compiled LangGraph runnable with memory checkpointing.
+        A compiled LangGraph runnable with persistent checkpointing.
     """
 
     # -----------------------------------------------------------------
-    # 1) Message Trimmer
+    # 1) Message Token Counter
     # -----------------------------------------------------------------
     # Ensures that conversation history stays within MAX_TOKENS.
-    # Keeps the most recent messages and always preserves system messages.
-    trimmer = trim_messages(
-        max_tokens=MAX_TOKENS,
-        strategy="last",          # Keep most recent messages
-        token_counter=model,      # Use model's tokenizer for accuracy
-        include_system=True,      # Preserve system prompt
-        allow_partial=False,      # Do not keep partial messages
-        start_on="human"          # Trim starting at human message boundary
-    )
+    # Counts are cached per message in the state (see trim_to_budget),
+    # so trimming cost does not grow with conversation length.
+    count_message = make_message_counter(token_counter, model=model)
 
     # -----------------------------------------------------------------
     # 2) Prompt Template
@@ -102,50 +177,182 @@ def build_graph(model):
     # -----------------------------------------------------------------
     # 3) Graph Node: Call the Model
     # -----------------------------------------------------------------
-    def call_model(state: State):
-        """
-        Graph node that:
-        - Trims the message history
-        - Formats the prompt
-        - Invokes the chat model
-        - Returns the model response to be appended to state
-        """
+    # Each node has a sync and an async variant; graph.stream() runs the
+    # first, graph.astream() the second (no worker thread per session).
+    def prepare_model_input(state: State):
+        """Trim the history and format the prompt."""
 
-        # Trim conversation messages to stay within token limits
-        trimmed_messages = trimmer.invoke(state["messages"])
+        # Trim conversation messages to stay within token limits,
+        # counting only messages that have no cached count yet
+        with metrics.span("history_trim"):
+            messages = state["messages"]
+            if verbatim_turns is not None:
+                # The earlier turns plus the new question
+                messages = messages[recent_turns_start(messages, verbatim_turns + 1):]
+            token_counts = state.get("token_counts") or {}
+            trimmed_messages, new_counts = trim_to_budget(
+                messages,
+                token_counts,
+                count_message,
+                MAX_TOKENS,
+            )
+        if metrics.is_enabled():
+            counts = {**token_counts, **new_counts}
+            metrics.increment(
+                "prompt_history_tokens",
+                sum(counts.get(m.id, 0) for m in trimmed_messages),
+            )
 
         # Inputs passed to the prompt template
         prompt_input = {
             "messages": trimmed_messages,
             "persona": state["persona"],
             "language": state["language"],
+            "summary": state.get("summary", ""),
             "retrieved_context": state.get("retrieved_context", ""),
+            "recalled_memory": state.get("recalled_memory", ""),
             "today_date": date.today().isoformat(),
         }
 
-        # Step 1: Format prompt into messages
-        formatted_prompt = prompt.invoke(prompt_input)
+        # Format prompt into messages
+        with metrics.span("prompt_format"):
+            return prompt.invoke(prompt_input), new_counts
 
-        # Step 2: Invoke the model with formatted messages
-        response = model.invoke(formatted_prompt)
+    def model_output(response, new_counts: Dict[str, int]):
+        # Give the reply its id now so its token count can be cached
+        if response.id is None:
+            response.id = str(uuid.uuid4())
+        new_counts[response.id] = count_message(response)
+        metrics.increment("completion_tokens", new_counts[response.id])
 
         # IMPORTANT:
         # Return messages as a list so LangGraph can safely append them
-        return {"messages": [response]}
+        return {"messages": [response], "token_counts": new_counts}
+
+    def call_model(state: State):
+        """
+        Graph node that:
+        - Trims the message history
+        - Formats the prompt
+        - Invokes the chat model
+        - Returns the model response to be appended to state
+        """
+        formatted_prompt, new_counts = prepare_model_input(state)
+        with metrics.span("model_call"):
+            response = model.invoke(formatted_prompt)
+        return model_output(response, new_counts)
+
+    async def acall_model(state: State):
+        formatted_prompt, new_counts = prepare_model_input(state)
+        with metrics.span("model_call"):
+            response = await model.ainvoke(formatted_prompt)
+        return model_output(response, new_counts)
 
     # -----------------------------------------------------------------
     # 4) Define Graph Structure
     # -----------------------------------------------------------------
     graph = StateGraph(State)
 
-    # Add the single model node
-    graph.add_node("model", call_model)
+    # Add the model node
+    graph.add_node("model", RunnableLambda(call_model, afunc=acall_model))
 
-    # Connect START → model
+    # Connect START → model → END
     graph.add_edge(START, "model")
+    graph.add_edge("model", END)
 
     # -----------------------------------------------------------------
-    # 5) Compile Graph with Memory
+    # 5) Compile Graph with a Checkpointer
     # -----------------------------------------------------------------
-    # MemorySaver enables state persistence between turns
-    return graph.compile(checkpointer=MemorySaver())
+    # State persists between turns (and restarts) on disk; only the
+    # latest checkpoints per thread are kept and idle threads expire
+    if checkpointer is None:
+        checkpointer = get_checkpointer()
+    return graph.compile(checkpointer=checkpointer)
+
+
+# ---------------------------------------------------------------------
+# History Compaction
+# ---------------------------------------------------------------------
+class HistoryCompactor:
+    """
+    Folds turns older than the last `keep_turns` into the running summary.
+
+    Compaction starts once the stored history passes `threshold_tokens`,
+    and only if at least `min_tokens` would be folded. The minimum is the
+    hysteresis: when the kept turns alone are over the threshold, a
+    summarizer call is made once enough older history has built up again,
+    not on every turn.
+
+    `compact` / `acompact` return the state update (new summary, removed
+    messages and their token counts), or None when nothing needs to be
+    folded; the caller applies it with `graph.update_state`.
+    """
+
+    def __init__(
+        self,
+        model,
+        token_counter=TOKEN_COUNTER,
+        summary_model=None,
+        threshold_tokens: int = HISTORY_COMPACT_THRESHOLD_TOKENS,
+        min_tokens: int = HISTORY_COMPACT_MIN_TOKENS,
+        keep_turns: int = HISTORY_KEEP_TURNS,
+    ):
+        """
+        model: the chat model (used to count tokens, and to summarize
+        unless `summary_model` is given).
+        """
+        self.summarizer = summary_model or model
+        self.threshold_tokens = threshold_tokens
+        self.min_tokens = min_tokens
+        self.keep_turns = keep_turns
+        self._count_message = make_message_counter(token_counter, model=model)
+        self._prompt = ChatPromptTemplate.from_messages([
+            ("system", SUMMARY_PROMPT),
+            ("human", "{transcript}"),
+        ])
+
+    def messages_to_fold(self, state: dict) -> List[BaseMessage]:
+        """The messages the next compaction would fold (empty if none is due)."""
+        messages = list(state.get("messages") or [])
+        counts = state.get("token_counts") or {}
+
+        def tokens(items) -> int:
+            return sum(counts.get(m.id) or self._count_message(m) for m in items)
+
+        if tokens(messages) <= self.threshold_tokens:
+            return []
+        old = messages[:recent_turns_start(messages, self.keep_turns)]
+        if tokens(old) < self.min_tokens:
+            return []
+        return old
+
+    def _summary_input(self, state: dict, old: Sequence[BaseMessage]):
+        return self._prompt.invoke({
+            "language": state.get("language", ""),
+            "summary": state.get("summary") or "(none yet)",
+            "transcript": _transcript(old),
+        })
+
+    @staticmethod
+    def _update(old: Sequence[BaseMessage], summary) -> dict:
+        return {
+            "summary": summary.content,
+            "messages": [RemoveMessage(id=m.id) for m in old],
+            "token_counts": {m.id: None for m in old},
+        }
+
+    def compact(self, state: dict) -> Optional[dict]:
+        old = self.messages_to_fold(state)
+        if not old:
+            return None
+        with metrics.span("history_compaction"):
+            summary = self.summarizer.invoke(self._summary_input(state, old))
+        return self._update(old, summary)
+
+    async def acompact(self, state: dict) -> Optional[dict]:
+        old = self.messages_to_fold(state)
+        if not old:
+            return None
+        with metrics.span("history_compaction"):
+            summary = await self.summarizer.ainvoke(self._summary_input(state, old))
+        return self._update(old, summary)
@@ -0,0 +1,403 @@
+# backend/index_registry.py
+"""
+Process-wide registry of document indexes, keyed by file hash.
+
+The registry is consulted *before* any extraction or embedding work:
+
+1. in-memory hit   → return the shared index as-is
+2. disk snapshot   → load it lazily (vectors are read into memory)
+3. miss            → build it once, snapshot it to disk, keep it in memory
+
+Every chat that uses the same file shares the same index object. Chats
+hold references (`acquire` / `release`) but only keep the file hash as a
+handle (see DocumentCollection). Once the registry goes over its memory
+budget, resident indexes are spilled, least recently used first:
+unreferenced ones before ones still attached to a chat, which are
+reloaded from their snapshot when that chat is active or queried again.
+Indexes without references are forgotten entirely; their snapshots stay
+on disk for the next hit.
+
+With CHUNK_STORE = "compact", snapshots keep chunks in a memory-mapped
+chunk file (backend/compact_store.py) instead of a pickled docstore, and
+freshly built indexes are served from that snapshot, so a resident index
+costs its vectors plus two small lookup tables.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import pickle
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from backend.config import (
+    ANN_FLAT_MAX_VECTORS,
+    ANN_HNSW_M,
+    ANN_HNSW_MAX_VECTORS,
+    ANN_INDEX_TYPE,
+    ANN_IVF_FLAT_MAX_VECTORS,
+    ANN_PQ_BITS,
+    CACHE_DIR,
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    CHUNK_STORE,
+    EMBEDDING_MODEL_NAME,
+    INDEX_REGISTRY_MEMORY_BUDGET_BYTES,
+    VECTOR_ENCODING,
+)
+from backend.document_rag import (
+    BuiltIndex,
+    build_vectorstore_from_upload,
+    compute_file_hash,
+    get_embeddings,
+)
+from backend.ann import configure_search, vector_bytes
+from backend.lexical import BM25Index
+from backend.embedding_pipeline import ProgressCallback
+
+
+def _settings_fingerprint(chunk_store: str = CHUNK_STORE) -> str:
+    """
+    Snapshots are only valid for the chunking/embedding settings and the
+    storage format (index type, vector encoding, chunk store) they were
+    built with. Query-time knobs (nprobe, efSearch) are applied on load
+    and are not part of it.
+    """
+    raw = "|".join(
+        str(setting)
+        for setting in (
+            EMBEDDING_MODEL_NAME,
+            CHUNK_SIZE,
+            CHUNK_OVERLAP,
+            ANN_INDEX_TYPE,
+            ANN_FLAT_MAX_VECTORS,
+            ANN_HNSW_MAX_VECTORS,
+            ANN_IVF_FLAT_MAX_VECTORS,
+            ANN_HNSW_M,
+            ANN_PQ_BITS,
+            VECTOR_ENCODING,
+            chunk_store,
+        )
+    )
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()[:8]
+
+
+def estimate_index_bytes(vectorstore) -> int:
+    """
+    Rough resident size of a vectorstore: vectors + chunk text (for a
+    compact store, its lookup tables; the text is memory-mapped).
+    """
+    if hasattr(vectorstore, "resident_bytes"):
+        return vectorstore.resident_bytes()
+    text_bytes = sum(
+        len(doc.page_content) for doc in vectorstore.docstore._dict.values()
+    )
+    return vector_bytes(vectorstore.index) + text_bytes
+
+
+@dataclass
+class _Entry:
+    built: Optional[BuiltIndex] = None
+    owners: Set[str] = field(default_factory=set)
+    nbytes: int = 0
+    last_used: float = 0.0
+
+
+class IndexRegistry:
+    def __init__(
+        self,
+        snapshot_dir: str | Path,
+        memory_budget_bytes: int = INDEX_REGISTRY_MEMORY_BUDGET_BYTES,
+        embeddings=None,
+        chunk_store: str = CHUNK_STORE,
+    ):
+        """
+        embeddings: used to build and reload indexes (default: the
+        provider embeddings, `get_embeddings()`).
+        chunk_store: snapshot format for chunks, "compact" or "docstore".
+        """
+        if chunk_store not in ("compact", "docstore"):
+            raise ValueError(f"Unknown chunk store: {chunk_store}")
+        self.snapshot_dir = Path(snapshot_dir)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.embeddings = embeddings
+        self.chunk_store = chunk_store
+
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.builds = 0
+        self.evictions = 0
+        self.spills = 0
+
+    # -----------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------
+    def get(self, file_hash: str) -> Optional[BuiltIndex]:
+        """
+        Return the index for `file_hash` from memory or disk, or None.
+        A spilled index is reloaded (and may push others out).
+        """
+        with self._lock:
+            entry = self._entries.get(file_hash)
+            if entry is not None and entry.built is not None:
+                entry.last_used = time.time()
+                self.memory_hits += 1
+                return entry.built
+
+        built = self._load_snapshot(file_hash)
+        if built is None:
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            return self._remember_locked(file_hash, built)
+
+    def acquire(
+        self,
+        file_bytes: bytes,
+        filename: str,
+        owner: str,
+        file_hash: Optional[str] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+    ) -> BuiltIndex:
+        """
+        Return the index for this file, building it only if neither
+        memory nor disk has it, and register `owner` as a user of it.
+        """
+        file_hash = file_hash or compute_file_hash(file_bytes)
+
+        # Serialize builds per file so concurrent sessions uploading the
+        # same document embed it once.
+        with self._build_lock(file_hash):
+            built = self.get(file_hash)
+            if built is None:
+                built = build_vectorstore_from_upload(
+                    file_bytes,
+                    filename,
+                    progress_callback=progress_callback,
+                    embeddings=self.embeddings,
+                )
+                built = self._save_snapshot(file_hash, built)
+                with self._lock:
+                    self.builds += 1
+
+            with self._lock:
+                built = self._remember_locked(file_hash, built, owner=owner)
+
+        return built
+
+    def contains(self, file_hash: str) -> bool:
+        """True if the index is resident or has a snapshot on disk."""
+        with self._lock:
+            entry = self._entries.get(file_hash)
+            if entry is not None and entry.built is not None:
+                return True
+        return self._has_snapshot(file_hash)
+
+    def store(self, built: BuiltIndex) -> BuiltIndex:
+        """
+        Register an index built outside `acquire` (e.g. by bulk ingest):
+        snapshot it to disk and keep it as an evictable entry.
+        """
+        built = self._save_snapshot(built.file_hash, built)
+        with self._lock:
+            self.builds += 1
+            return self._remember_locked(built.file_hash, built)
+
+    def discard(self, file_hash: str) -> None:
+        """Forget an index and delete its snapshot (e.g. a superseded library)."""
+        with self._lock:
+            self._entries.pop(file_hash, None)
+        path = self._snapshot_path(file_hash)
+        if path.exists():
+            for child in path.iterdir():
+                child.unlink()
+            path.rmdir()
+
+    def release(self, file_hash: Optional[str], owner: str) -> None:
+        """
+        Drop `owner`'s reference. Unreferenced indexes are evicted first
+        and forgotten once they leave memory.
+        """
+        if not file_hash:
+            return
+        with self._lock:
+            entry = self._entries.get(file_hash)
+            if entry is None:
+                return
+            entry.owners.discard(owner)
+            if entry.built is None and not entry.owners:
+                del self._entries[file_hash]
+            self._evict_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            resident = [e for e in self._entries.values() if e.built is not None]
+            return {
+                "known_indexes": len(self._entries),
+                "resident_indexes": len(resident),
+                "resident_bytes": sum(e.nbytes for e in resident),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "builds": self.builds,
+                "evictions": self.evictions,
+                "spills": self.spills,
+            }
+
+    # -----------------------------------------------------------------
+    # Memory bookkeeping
+    # -----------------------------------------------------------------
+    def _build_lock(self, file_hash: str) -> threading.Lock:
+        with self._lock:
+            return self._build_locks.setdefault(file_hash, threading.Lock())
+
+    def _remember_locked(
+        self,
+        file_hash: str,
+        built: BuiltIndex,
+        owner: Optional[str] = None,
+    ) -> BuiltIndex:
+        entry = self._entries.setdefault(file_hash, _Entry())
+        if owner is not None:
+            entry.owners.add(owner)
+        if entry.built is None:
+            # Another thread may have loaded it meanwhile; keep the first
+            entry.built = built
+            entry.nbytes = estimate_index_bytes(built.vectorstore)
+        entry.last_used = time.time()
+        self._evict_locked(keep=file_hash)
+        return entry.built
+
+    def _evict_locked(self, keep: Optional[str] = None) -> None:
+        resident = [
+            (key, e)
+            for key, e in self._entries.items()
+            if e.built is not None and key != keep
+        ]
+        total = sum(e.nbytes for _, e in resident)
+        if keep in self._entries:
+            total += self._entries[keep].nbytes
+        if total <= self.memory_budget_bytes:
+            return
+
+        # Unreferenced indexes first, then those attached to chats (only
+        # if they can be reloaded); least recently used first. Searches
+        # already holding an index keep using it until they finish.
+        candidates = sorted(
+            (
+                (key, e)
+                for key, e in resident
+                if not e.owners or self._has_snapshot(key)
+            ),
+            key=lambda item: (bool(item[1].owners), item[1].last_used),
+        )
+        for key, entry in candidates:
+            if total <= self.memory_budget_bytes:
+                break
+            total -= entry.nbytes
+            if entry.owners:
+                entry.built = None
+                entry.nbytes = 0
+                self.spills += 1
+            else:
+                del self._entries[key]
+                self.evictions += 1
+
+    # -----------------------------------------------------------------
+    # Disk snapshots
+    # -----------------------------------------------------------------
+    def _snapshot_path(self, file_hash: str) -> Path:
+        return self.snapshot_dir / f"{file_hash}-{_settings_fingerprint(self.chunk_store)}"
+
+    def _has_snapshot(self, file_hash: str) -> bool:
+        return (self._snapshot_path(file_hash) / "index.faiss").exists()
+
+    def _save_snapshot(self, file_hash: str, built: BuiltIndex) -> BuiltIndex:
+        """
+        Write the snapshot and return the index to keep resident: the
+        compact store read back from it, or `built` itself.
+        """
+        import faiss
+
+        from backend.compact_store import CHUNK_FILE, ChunkStore, iter_stored_chunks
+
+        path = self._snapshot_path(file_hash)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.mkdir(parents=True, exist_ok=True)
+
+        vs = built.vectorstore
+        faiss.write_index(vs.index, str(tmp / "index.faiss"))
+        if self.chunk_store == "compact":
+            ChunkStore.write(tmp / CHUNK_FILE, iter_stored_chunks(vs))
+        else:
+            # Same layout as FAISS.save_local, so snapshots stay loadable
+            # with FAISS.load_local as well.
+            with open(tmp / "index.pkl", "wb") as f:
+                pickle.dump((vs.docstore, vs.index_to_docstore_id), f)
+        if built.lexical is not None:
+            (tmp / "lexical.bm25").write_bytes(built.lexical.to_bytes())
+        (tmp / "meta.json").write_text(
+            json.dumps({"filename": built.filename, "file_hash": file_hash}),
+            encoding="utf-8",
+        )
+
+        if path.exists():
+            for child in path.iterdir():
+                child.unlink()
+            path.rmdir()
+        tmp.rename(path)
+
+        if self.chunk_store == "compact":
+            return self._load_snapshot(file_hash) or built
+        return built
+
+    def _load_snapshot(self, file_hash: str) -> Optional[BuiltIndex]:
+        if not self._has_snapshot(file_hash):
+            return None
+        path = self._snapshot_path(file_hash)
+
+        import faiss
+
+        from backend.compact_store import CHUNK_FILE, ChunkStore, CompactVectorStore
+
+        index = faiss.read_index(str(path / "index.faiss"))
+        configure_search(index)
+
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+
+        lexical = None
+        if (path / "lexical.bm25").exists():
+            lexical = BM25Index.from_bytes((path / "lexical.bm25").read_bytes())
+
+        embeddings = self.embeddings or get_embeddings()
+        if (path / CHUNK_FILE).exists():
+            vectorstore = CompactVectorStore(embeddings, index, ChunkStore(path / CHUNK_FILE))
+        else:
+            from langchain_community.vectorstores import FAISS
+
+            with open(path / "index.pkl", "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+            vectorstore = FAISS(embeddings, index, docstore, index_to_docstore_id)
+        return BuiltIndex(
+            vectorstore=vectorstore,
+            file_hash=file_hash,
+            filename=meta.get("filename", ""),
+            lexical=lexical,
+        )
+
+
+@lru_cache(maxsize=1)
+def get_index_registry() -> IndexRegistry:
+    """
+    Registry shared by every session in this process.
+    """
+    return IndexRegistry(Path(CACHE_DIR) / "indexes")
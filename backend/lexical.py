@@ -0,0 +1,194 @@
+# backend/lexical.py
+"""
+Compact BM25 inverted index for lexical retrieval.
+
+Built during ingest next to the FAISS index, so exact identifiers
+(part numbers, error codes, function names) that embeddings tend to blur
+can still be matched. Postings are stored as typed arrays rather than
+Python objects, which keeps the index small in memory and cheap to
+serialize alongside the vector snapshot.
+
+Each document has its own index. When several are searched together,
+`corpus_stats` sums their statistics (document count, total length,
+per-term document frequency) and every index scores with those, so the
+scores of different indexes can be compared and merged directly.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import pickle
+import re
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Words, plus identifiers joined by - . / _ (e.g. ERR-404, v1.2.3, a/b)
+_TOKEN_RE = re.compile(r"\w+(?:[-./]\w+)*")
+
+_FORMAT_VERSION = 1
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased tokens. Compound identifiers are kept whole *and* split
+    into their parts, so "ERR-404" matches both "err-404" and "404".
+    """
+    tokens: List[str] = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group(0)
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(p for p in re.split(r"[-./_]", token) if p)
+    return tokens
+
+
+@dataclass(frozen=True)
+class CorpusStats:
+    """BM25 statistics of a set of indexes, for the terms of one query."""
+
+    n_docs: int
+    total_length: int
+    doc_freqs: Dict[str, int]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a growing set of documents.
+
+    Documents are identified by caller-supplied string ids (e.g. the
+    FAISS docstore ids) and stored internally as dense integers.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        self.doc_ids: List[str] = []
+        self.doc_lengths = array("I")
+        self.vocab: Dict[str, int] = {}
+        self.postings: List[array] = []   # term id -> doc numbers
+        self.frequencies: List[array] = []  # term id -> term frequency per posting
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @property
+    def total_length(self) -> int:
+        return self._total_length
+
+    def doc_freq(self, term: str) -> int:
+        term_id = self.vocab.get(term)
+        return 0 if term_id is None else len(self.postings[term_id])
+
+    # -----------------------------------------------------------------
+    # Build
+    # -----------------------------------------------------------------
+    def add(self, doc_id: str, text: str) -> None:
+        doc_num = len(self.doc_ids)
+        tokens = tokenize(text)
+
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(len(tokens))
+        self._total_length += len(tokens)
+
+        for term, tf in Counter(tokens).items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                term_id = len(self.postings)
+                self.vocab[term] = term_id
+                self.postings.append(array("I"))
+                self.frequencies.append(array("H"))
+            self.postings[term_id].append(doc_num)
+            self.frequencies[term_id].append(min(tf, 0xFFFF))
+
+    # -----------------------------------------------------------------
+    # Search
+    # -----------------------------------------------------------------
+    def search(
+        self,
+        query: str,
+        k: int,
+        stats: Optional[CorpusStats] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Top-k (doc_id, BM25 score), best first. Documents that share no
+        term with the query are not returned.
+
+        stats: collection-wide statistics (`corpus_stats`) to score with
+        instead of this index's own, when results of several indexes are
+        merged.
+        """
+        if not self.doc_ids:
+            return []
+
+        if stats is None:
+            n_docs, total_length = len(self.doc_ids), self._total_length
+        else:
+            n_docs, total_length = stats.n_docs, stats.total_length
+        avg_length = total_length / n_docs or 1.0
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+
+            docs = self.postings[term_id]
+            tfs = self.frequencies[term_id]
+            df = len(docs) if stats is None else stats.doc_freqs.get(term, len(docs))
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+
+            for doc_num, tf in zip(docs, tfs):
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[doc_num] / avg_length)
+                scores[doc_num] = scores.get(doc_num, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.doc_ids[doc_num], score) for doc_num, score in best]
+
+    # -----------------------------------------------------------------
+    # Serialization
+    # -----------------------------------------------------------------
+    def to_bytes(self) -> bytes:
+        return pickle.dumps(
+            (
+                _FORMAT_VERSION,
+                self.k1,
+                self.b,
+                self.doc_ids,
+                self.doc_lengths,
+                self.vocab,
+                self.postings,
+                self.frequencies,
+            ),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BM25Index":
+        version, k1, b, doc_ids, doc_lengths, vocab, postings, frequencies = pickle.loads(data)
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index format: {version}")
+
+        index = cls(k1=k1, b=b)
+        index.doc_ids = doc_ids
+        index.doc_lengths = doc_lengths
+        index.vocab = vocab
+        index.postings = postings
+        index.frequencies = frequencies
+        index._total_length = sum(doc_lengths)
+        return index
+
+
+def corpus_stats(indexes: Sequence[BM25Index], query: str) -> CorpusStats:
+    """Statistics of `indexes` taken together, for the terms of `query`."""
+    return CorpusStats(
+        n_docs=sum(len(index) for index in indexes),
+        total_length=sum(index.total_length for index in indexes),
+        doc_freqs={
+            term: sum(index.doc_freq(term) for index in indexes)
+            for term in set(tokenize(query))
+        },
+    )
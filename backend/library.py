@@ -0,0 +1,132 @@
+# backend/library.py
+"""
+Document libraries: directory trees ingested ahead of time.
+
+`scripts/ingest_dir.py` indexes every supported file under a directory
+into the shared IndexRegistry (one snapshot per file, keyed by file hash)
+and then merges them into a single library index. This module holds the
+library manifest, which records per-file progress (so an interrupted
+ingest resumes where it stopped) and the id of the merged index.
+
+Chat entry points attach a library without loading it:
+
+    collection = load_library("handbooks").collection()
+
+The merged index is read from its snapshot on the first query.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from backend.config import CACHE_DIR
+from backend.collection import DocumentCollection
+
+LIBRARY_DIR = Path(CACHE_DIR) / "libraries"
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def _check_name(name: str) -> str:
+    if not _NAME_RE.match(name):
+        raise ValueError(f"Invalid library name: {name!r} (letters, digits, '.', '_', '-')")
+    return name
+
+
+class Library:
+    def __init__(self, name: str, directory: str | Path = LIBRARY_DIR):
+        self.name = _check_name(name)
+        self.path = Path(directory) / f"{name}.json"
+
+        self.root: Optional[str] = None
+        # relative path -> {"file_hash", "size", "mtime", "chunks"} or {"error"}
+        self.files: Dict[str, dict] = {}
+        # Merged index: registry id and the file hashes it was built from
+        self.index_id: Optional[str] = None
+        self.index_fingerprint: Optional[str] = None
+        self.updated: Optional[float] = None
+
+    @classmethod
+    def load(cls, name: str, directory: str | Path = LIBRARY_DIR) -> Library:
+        """The saved manifest, or an empty library if there is none yet."""
+        library = cls(name, directory)
+        if library.path.exists():
+            data = json.loads(library.path.read_text(encoding="utf-8"))
+            library.root = data.get("root")
+            library.files = data.get("files", {})
+            library.index_id = data.get("index_id")
+            library.index_fingerprint = data.get("index_fingerprint")
+            library.updated = data.get("updated")
+        return library
+
+    def save(self) -> None:
+        """Write the manifest atomically (a crash never leaves it half-written)."""
+        self.updated = time.time()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(
+            json.dumps(
+                {
+                    "name": self.name,
+                    "root": self.root,
+                    "files": self.files,
+                    "index_id": self.index_id,
+                    "index_fingerprint": self.index_fingerprint,
+                    "updated": self.updated,
+                },
+                indent=1,
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
+
+    # -----------------------------------------------------------------
+    # File records
+    # -----------------------------------------------------------------
+    def indexed_hashes(self) -> List[str]:
+        """Distinct file hashes of every successfully ingested file."""
+        return sorted({r["file_hash"] for r in self.files.values() if "error" not in r})
+
+    def failed(self) -> Dict[str, str]:
+        return {path: r["error"] for path, r in self.files.items() if "error" in r}
+
+    def fingerprint(self) -> str:
+        """Identity of the current file set; the merged index is rebuilt when it changes."""
+        return hashlib.md5(",".join(self.indexed_hashes()).encode("ascii")).hexdigest()
+
+    # -----------------------------------------------------------------
+    # Chat entry points
+    # -----------------------------------------------------------------
+    @property
+    def ready(self) -> bool:
+        return self.index_id is not None
+
+    def collection(self, registry=None) -> DocumentCollection:
+        """A collection with the merged library index attached (not loaded yet)."""
+        if not self.ready:
+            raise ValueError(f"Library {self.name!r} has no index yet; run scripts/ingest_dir.py")
+        collection = DocumentCollection(registry)
+        collection.attach(self.index_id, f"library:{self.name}")
+        return collection
+
+
+def load_library(name: str, directory: str | Path = LIBRARY_DIR) -> Library:
+    library = Library.load(name, directory)
+    if not library.path.exists():
+        raise FileNotFoundError(f"Unknown library: {name!r}")
+    return library
+
+
+def list_libraries(directory: str | Path = LIBRARY_DIR) -> List[str]:
+    """Names of libraries with a merged index, ready to attach."""
+    directory = Path(directory)
+    if not directory.exists():
+        return []
+    return sorted(
+        p.stem for p in directory.glob("*.json") if Library.load(p.stem, directory).ready
+    )
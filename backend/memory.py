@@ -0,0 +1,227 @@
+# backend/memory.py
+"""
+Long-term conversation memory: a per-thread vector index of past turns.
+
+Every finished turn (user message + assistant reply) is embedded in a
+background thread and stored in a local SQLite file. Before a new turn,
+the few past turns most similar to the query are recalled and added to
+the prompt next to the document context. Only turns outside the verbatim
+history window (the last MEMORY_VERBATIM_TURNS, see build_graph) are
+recalled, so the window can stay small without losing early facts.
+
+Per-thread vectors are loaded lazily into a small LRU of numpy matrices;
+nothing else is held in memory.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from google.api_core.exceptions import ResourceExhausted
+
+from backend import metrics
+from backend.config import (
+    CACHE_DIR,
+    CHECKPOINT_MAX_IDLE_SECONDS,
+    MEMORY_LOADED_THREADS,
+    MEMORY_MAX_TURN_CHARS,
+    MEMORY_MIN_SIMILARITY,
+    MEMORY_TOKEN_BUDGET,
+    MEMORY_TOP_K,
+    MEMORY_VERBATIM_TURNS,
+)
+from backend.document_rag import get_embeddings
+from backend.lru import LRUCache
+from backend.rag import embed_query
+from backend.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def format_turn(user: str, assistant: str) -> str:
+    return f"User: {user}\nAssistant: {assistant}"[:MEMORY_MAX_TURN_CHARS]
+
+
+def _report_store_failure(future: Future) -> None:
+    error = future.exception()
+    if error is None:
+        return
+    if isinstance(error, ResourceExhausted):
+        metrics.increment("quota_errors", stage="memory")
+    logger.warning("Conversation turn was not stored in memory: %r", error)
+
+
+class ConversationMemory:
+    def __init__(
+        self,
+        embeddings,
+        path: str | Path,
+        max_idle_seconds: Optional[float] = CHECKPOINT_MAX_IDLE_SECONDS,
+    ):
+        """
+        embeddings: LangChain `Embeddings` used for both turns and queries.
+        Turn vectors live only in this store (and are deleted with their
+        thread), so pass an uncached client, not the document embeddings.
+        """
+        self.embeddings = embeddings
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS turns (
+                thread_id TEXT NOT NULL,
+                turn INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (thread_id, turn)
+            )
+            """
+        )
+        self._conn.commit()
+
+        # thread_id -> (texts, unit-normalized float32 matrix)
+        self._loaded = LRUCache(MEMORY_LOADED_THREADS)
+        # One worker keeps each thread's turns in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory")
+
+        if max_idle_seconds is not None:
+            self.forget_idle(max_idle_seconds)
+
+    # -----------------------------------------------------------------
+    # Writing
+    # -----------------------------------------------------------------
+    def remember(self, thread_id: str, user: str, assistant: str) -> Future:
+        """Embed and store a finished turn in the background (failures are logged)."""
+        future = self._executor.submit(self._store_turn, thread_id, format_turn(user, assistant))
+        future.add_done_callback(_report_store_failure)
+        return future
+
+    def _store_turn(self, thread_id: str, text: str) -> None:
+        vector = np.asarray(self.embeddings.embed_documents([text])[0], dtype="float32")
+        with self._lock:
+            (last,) = self._conn.execute(
+                "SELECT COALESCE(MAX(turn), -1) FROM turns WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT INTO turns VALUES (?, ?, ?, ?, ?)",
+                (thread_id, last + 1, text, vector.tobytes(), time.time()),
+            )
+            self._conn.commit()
+            # Reloaded (with the new row) on next access
+            self._loaded.pop(thread_id)
+
+    def forget(self, thread_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM turns WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+        self._loaded.pop(thread_id)
+
+    def forget_idle(self, max_idle_seconds: float) -> None:
+        """Delete threads whose newest turn is older than `max_idle_seconds`."""
+        cutoff = time.time() - max_idle_seconds
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM turns WHERE thread_id IN ("
+                "SELECT thread_id FROM turns GROUP BY thread_id HAVING MAX(created_at) < ?)",
+                (cutoff,),
+            )
+            self._conn.commit()
+        self._loaded.clear()
+
+    def flush(self) -> None:
+        """Wait until every turn submitted so far is stored."""
+        self._executor.submit(lambda: None).result()
+
+    # -----------------------------------------------------------------
+    # Reading
+    # -----------------------------------------------------------------
+    def _load(self, thread_id: str) -> Tuple[List[str], np.ndarray]:
+        loaded = self._loaded.get(thread_id)
+        if loaded is not None:
+            return loaded
+
+        # Under the lock, so a concurrent _store_turn cannot be overwritten
+        # by a stale load
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text, vector FROM turns WHERE thread_id = ? ORDER BY turn", (thread_id,)
+            ).fetchall()
+
+            texts = [text for text, _ in rows]
+            if rows:
+                matrix = np.stack([np.frombuffer(blob, dtype="float32") for _, blob in rows])
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            else:
+                matrix = np.zeros((0, 0), dtype="float32")
+
+            self._loaded.put(thread_id, (texts, matrix))
+        return texts, matrix
+
+    def search(
+        self,
+        thread_id: str,
+        query: str,
+        k: int = MEMORY_TOP_K,
+        skip_recent: int = MEMORY_VERBATIM_TURNS,
+        min_similarity: float = MEMORY_MIN_SIMILARITY,
+    ) -> List[Tuple[str, float]]:
+        """
+        Past turns most similar to `query`, best first, as (text, cosine).
+        The newest `skip_recent` turns are excluded (they are still in the
+        verbatim history).
+        """
+        texts, matrix = self._load(thread_id)
+        candidates = len(texts) - max(0, skip_recent)
+        if candidates <= 0 or k <= 0:
+            return []
+
+        q = np.asarray(embed_query(self.embeddings, query), dtype="float32")
+        q /= max(float(np.linalg.norm(q)), 1e-12)
+
+        scores = matrix[:candidates] @ q
+        top = np.argsort(-scores)[:k]
+        return [(texts[i], float(scores[i])) for i in top if scores[i] >= min_similarity]
+
+    def recall(
+        self,
+        thread_id: str,
+        query: str,
+        token_budget: int = MEMORY_TOKEN_BUDGET,
+        **search_kwargs,
+    ) -> str:
+        """Relevant past turns as a prompt section of at most ~`token_budget` tokens."""
+        packed: List[str] = []
+        used = 0
+        for text, _ in self.search(thread_id, query, **search_kwargs):
+            cost = estimate_tokens(text)
+            if used + cost > token_budget:
+                break
+            packed.append(text)
+            used += cost
+        return "\n\n".join(packed)
+
+    async def arecall(self, thread_id: str, query: str, **kwargs) -> str:
+        """Async `recall` (embedding + SQLite run in a worker thread)."""
+        return await asyncio.to_thread(self.recall, thread_id, query, **kwargs)
+
+
+@lru_cache(maxsize=1)
+def get_conversation_memory() -> ConversationMemory:
+    """
+    Process-wide memory store under CACHE_DIR. Embeds with the provider
+    client directly: turn vectors stay out of the document embedding cache.
+    """
+    return ConversationMemory(get_embeddings().underlying, Path(CACHE_DIR) / "memory.sqlite")
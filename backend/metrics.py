@@ -0,0 +1,261 @@
+# backend/metrics.py
+"""
+Lightweight in-process metrics: timing spans, counters and histograms.
+
+    from backend import metrics
+
+    with metrics.span("retrieve", mode="hybrid"):
+        ...
+    metrics.increment("chunks_ingested", 42)
+    metrics.observe("chat_ttft_seconds", 0.31)
+
+Every event is aggregated in the process-wide registry (`snapshot()`,
+`prometheus_text()`) and forwarded to any registered sinks (e.g. a
+logger, StatsD or OpenTelemetry bridge). A span named "x" is recorded
+as the histogram "x_seconds".
+
+When disabled (METRICS_ENABLED = False or `set_enabled(False)`), spans
+are a shared no-op context manager and counters return immediately, so
+instrumented code pays one attribute check.
+"""
+from __future__ import annotations
+
+import bisect
+import logging
+import threading
+import time
+from typing import Dict, List, Protocol, Tuple
+
+from backend.config import METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Histogram upper bounds (seconds-oriented, also fine for small counts)
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class MetricsSink(Protocol):
+    def record(self, kind: str, name: str, value: float, labels: Dict[str, str]) -> None:
+        """kind is "counter" or "histogram"."""
+
+
+class LoggingSink:
+    """Logs every event at DEBUG level (or `level`)."""
+
+    def __init__(self, level: int = logging.DEBUG):
+        self.level = level
+
+    def record(self, kind: str, name: str, value: float, labels: Dict[str, str]) -> None:
+        logger.log(self.level, "%s %s=%.6g %s", kind, name, value, labels)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "n")
+
+    def __init__(self, n_buckets: int):
+        self.counts = [0] * (n_buckets + 1)  # last slot: +Inf
+        self.total = 0.0
+        self.n = 0
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+        self._sinks: List[MetricsSink] = []
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink: MetricsSink) -> None:
+        with self._lock:
+            self._sinks.append(sink)
+
+    def remove_sink(self, sink: MetricsSink) -> None:
+        with self._lock:
+            if sink in self._sinks:
+                self._sinks.remove(sink)
+
+    def _emit(self, kind: str, name: str, value: float, labels: Dict[str, str]) -> None:
+        for sink in self._sinks:
+            try:
+                sink.record(kind, name, value, labels)
+            except Exception:  # a broken sink must never break a request
+                logger.exception("Metrics sink %r failed", sink)
+
+    def increment(self, name: str, value: float = 1.0, labels: Dict[str, str] = None) -> None:
+        labels = labels or {}
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+        if self._sinks:
+            self._emit("counter", name, value, labels)
+
+    def observe(self, name: str, value: float, labels: Dict[str, str] = None) -> None:
+        labels = labels or {}
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram(len(self.buckets))
+            hist.counts[bisect.bisect_left(self.buckets, value)] += 1
+            hist.total += value
+            hist.n += 1
+        if self._sinks:
+            self._emit("histogram", name, value, labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict:
+        """Counters and histogram summaries as plain dicts."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h.n,
+                    "sum": h.total,
+                    "mean": h.total / h.n if h.n else 0.0,
+                }
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def prometheus_text(self, prefix: str = "ragflow_") -> str:
+        """Prometheus text exposition format (counters + cumulative histograms)."""
+
+        def fmt_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            items = labels + extra
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in items) + "}"
+
+        lines: List[str] = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+            seen = set()
+            for (name, labels), value in counters:
+                metric = f"{prefix}{name}_total"
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} counter")
+                    seen.add(metric)
+                lines.append(f"{metric}{fmt_labels(labels)} {value:g}")
+
+            for (name, labels), h in histograms:
+                metric = f"{prefix}{name}"
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} histogram")
+                    seen.add(metric)
+                cumulative = 0
+                for bound, count in zip(self.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{fmt_labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{metric}_bucket{fmt_labels(labels, (('le', '+Inf'),))} {h.n}")
+                lines.append(f"{metric}_sum{fmt_labels(labels)} {h.total:g}")
+                lines.append(f"{metric}_count{fmt_labels(labels)} {h.n}")
+
+        return "\n".join(lines) + "\n"
+
+
+class _Span:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name: str, labels: Dict[str, str]):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = self.labels
+        if exc_type is not None:
+            labels = {**labels, "error": exc_type.__name__}
+        _registry.observe(f"{self.name}_seconds", time.perf_counter() - self.start, labels)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+_registry = MetricsRegistry()
+_enabled = METRICS_ENABLED
+
+
+# ---------------------------------------------------------------------
+# Module-level API (process-wide registry)
+# ---------------------------------------------------------------------
+def set_enabled(enabled: bool) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def get_registry() -> MetricsRegistry:
+    return _registry
+
+
+def span(name: str, **labels: str):
+    """Time a block; recorded as the histogram `{name}_seconds`."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(name, labels)
+
+
+def increment(name: str, value: float = 1.0, **labels: str) -> None:
+    if _enabled:
+        _registry.increment(name, value, labels)
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    if _enabled:
+        _registry.observe(name, value, labels)
+
+
+def add_sink(sink: MetricsSink) -> None:
+    _registry.add_sink(sink)
+
+
+def remove_sink(sink: MetricsSink) -> None:
+    _registry.remove_sink(sink)
+
+
+def snapshot() -> dict:
+    return _registry.snapshot()
+
+
+def prometheus_text() -> str:
+    return _registry.prometheus_text()
+
+
+def reset() -> None:
+    _registry.reset()
@@ -1,6 +1,110 @@
 # backend/rag.py
 
-from backend.config import RAG_TOP_K
+import asyncio
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from backend import metrics
+from backend.config import (
+    QUERY_EMBEDDING_CACHE_SIZE,
+    RAG_CONTEXT_CANDIDATES,
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+    RAG_FETCH_K,
+    RAG_RETRIEVAL_MODE,
+    RAG_TOP_K,
+    RETRIEVAL_CACHE_SIZE,
+    RETRIEVAL_CACHE_TTL_SECONDS,
+    RRF_K,
+)
+from backend.context import pack_context
+from backend.lru import LRUCache
+
+RETRIEVAL_MODES = {"vector", "lexical", "hybrid"}
+
+# Process-wide: ChatService creates a new RAGService every turn.
+# Query embeddings are keyed by (embedding model, normalized query);
+# results by (index version, mode, k, normalized query), so any change to
+# the index yields new keys and stale results are never served.
+_query_embedding_cache = LRUCache(QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL_SECONDS)
+_retrieval_cache = LRUCache(RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL_SECONDS)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def get_cache_stats() -> dict:
+    return {
+        "query_embeddings": _query_embedding_cache.stats(),
+        "retrieval_results": _retrieval_cache.stats(),
+    }
+
+
+def clear_caches() -> None:
+    _query_embedding_cache.clear()
+    _retrieval_cache.clear()
+
+
+def _query_embedding_key(embeddings, query: str):
+    model = getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None)
+    return model or type(embeddings).__name__, normalize_query(query)
+
+
+def cached_query_embedding(embeddings, query: str) -> Optional[List[float]]:
+    """The query's embedding if this turn already computed it, else None (no provider call)."""
+    return _query_embedding_cache.get(_query_embedding_key(embeddings, query))
+
+
+def embed_query(embeddings, query: str) -> List[float]:
+    """
+    Query embedding through the process-wide cache, keyed by
+    (embedding model, normalized query). Shared by document retrieval and
+    conversation memory, so a turn embeds its query at most once.
+    """
+    key = _query_embedding_key(embeddings, query)
+
+    vector = _query_embedding_cache.get(key)
+    if vector is None:
+        metrics.increment("query_embedding_cache", result="miss")
+        with metrics.span("query_embedding"):
+            vector = embeddings.embed_query(query)
+        _query_embedding_cache.put(key, vector)
+    else:
+        metrics.increment("query_embedding_cache", result="hit")
+    return vector
+
+
+def _doc_key(doc: Document):
+    """
+    Identity of a chunk across result lists: its document (file hash;
+    filenames can repeat within a collection) and position.
+    """
+    meta = doc.metadata or {}
+    if "chunk_index" in meta:
+        return (meta.get("doc_id") or meta.get("source"), meta["chunk_index"])
+    return doc.page_content
+
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[List[Document]],
+    k: int,
+    rrf_k: int = RRF_K,
+) -> List[Document]:
+    """
+    Fuse ranked lists: each document scores sum(1 / (rrf_k + rank)).
+    Rank-based, so BM25 scores and vector distances need no calibration.
+    """
+    scores: Dict[object, float] = {}
+    docs: Dict[object, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = _doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ranked[:k]]
 
 
 class RAGService:
@@ -11,7 +115,9 @@ class RAGService:
 
     def __init__(self, vectorstore=None):
         """
-        vectorstore: any LangChain-compatible vectorstore (e.g. FAISS)
+        vectorstore: any LangChain-compatible vectorstore (e.g. FAISS),
+        or a DocumentCollection, which searches all of its documents
+        and merges their top-k.
         """
         self.vectorstore = vectorstore
 
@@ -21,14 +127,114 @@ class RAGService:
         """
         return self.vectorstore is not None
 
-    def retrieve(self, query: str) -> str:
+    def supports_lexical(self) -> bool:
         """
-        Retrieve relevant document chunks for a query
-        and return them as a single string.
+        Lexical (BM25) search needs a store that carries a lexical index,
+        i.e. a DocumentCollection.
+        """
+        return hasattr(self.vectorstore, "lexical_search")
+
+    def index_version(self) -> Optional[str]:
+        """
+        Cache key for the current contents of the store: a collection's
+        document set. Plain vectorstores have no stable content identity,
+        so their results are not cached.
+        """
+        return getattr(self.vectorstore, "fingerprint", None)
+
+    def _embed_query(self, query: str) -> Optional[List[float]]:
+        embeddings = getattr(self.vectorstore, "embeddings", None)
+        if embeddings is None:
+            return None
+        return embed_query(embeddings, query)
+
+    def _vector_search(self, query: str, k: int) -> List[Document]:
+        embedding = self._embed_query(query)
+        with metrics.span("similarity_search"):
+            if embedding is None:
+                return self.vectorstore.similarity_search(query, k=k)
+            return self.vectorstore.similarity_search_by_vector(embedding, k=k)
+
+    def retrieve_documents(
+        self,
+        query: str,
+        mode: Optional[str] = None,
+        k: int = RAG_TOP_K,
+    ) -> List[Document]:
+        """
+        Retrieve the top-k chunks for a query.
+
+        mode:
+            "vector"  - embedding similarity only
+            "lexical" - BM25 only
+            "hybrid"  - both, fused with reciprocal rank fusion
+            Defaults to RAG_RETRIEVAL_MODE. Stores without a lexical index
+            always fall back to "vector".
         """
         if not self.vectorstore:
-            return ""
+            return []
 
-        docs = self.vectorstore.similarity_search(query, k=RAG_TOP_K)
+        mode = mode or RAG_RETRIEVAL_MODE
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
 
-        return "\n\n".join(doc.page_content for doc in docs)
+        if not self.supports_lexical():
+            mode = "vector"
+
+        version = self.index_version()
+        cache_key = (version, mode, k, normalize_query(query))
+        if version is not None:
+            docs = _retrieval_cache.get(cache_key)
+            if docs is not None:
+                metrics.increment("retrieval_cache", result="hit")
+                return docs
+            metrics.increment("retrieval_cache", result="miss")
+
+        if mode == "vector":
+            docs = self._vector_search(query, k=k)
+        elif mode == "lexical":
+            with metrics.span("lexical_search"):
+                docs = self.vectorstore.lexical_search(query, k=k)
+        else:
+            fetch_k = max(k, RAG_FETCH_K)
+            vector_docs = self._vector_search(query, k=fetch_k)
+            with metrics.span("lexical_search"):
+                lexical_docs = self.vectorstore.lexical_search(query, k=fetch_k)
+            docs = reciprocal_rank_fusion([vector_docs, lexical_docs], k=k)
+
+        if version is not None:
+            _retrieval_cache.put(cache_key, docs)
+        return docs
+
+    def retrieve(
+        self,
+        query: str,
+        mode: Optional[str] = None,
+        token_budget: Optional[int] = None,
+    ) -> str:
+        """
+        Retrieve relevant document chunks for a query
+        and return them as a single string.
+
+        Candidates are merged, deduplicated, MMR-ordered and packed into
+        `token_budget` tokens (default RAG_CONTEXT_TOKEN_BUDGET).
+        """
+        with metrics.span("retrieve", mode=mode or RAG_RETRIEVAL_MODE):
+            docs = self.retrieve_documents(query, mode=mode, k=RAG_CONTEXT_CANDIDATES)
+            with metrics.span("context_pack"):
+                if token_budget is None:
+                    return pack_context(docs)
+                return pack_context(docs, token_budget=token_budget)
+
+    async def aretrieve(
+        self,
+        query: str,
+        mode: Optional[str] = None,
+        token_budget: Optional[int] = None,
+    ) -> str:
+        """
+        Async `retrieve`. Query embedding and index search are blocking
+        (network + FAISS), so they run in a worker thread and the event
+        loop stays free for other sessions.
+        """
+        return await asyncio.to_thread(self.retrieve, query, mode, token_budget)
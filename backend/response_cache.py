@@ -0,0 +1,151 @@
+# backend/response_cache.py
+"""
+Opt-in answer cache for repeated questions.
+
+Answers are scoped by (document set, persona, language, hash of the
+retrieved context): the same question about the same documents, asked in
+the same style, with the same grounding, gets the same answer. Within a
+scope a question matches by normalized text first and, failing that, by
+query-embedding cosine similarity above a threshold.
+
+ChatService only consults it for the first turn of a conversation, where
+the answer does not depend on chat history. Hits replay the stored answer
+as a stream without calling the model.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Hashable, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.config import (
+    RESPONSE_CACHE_SCAN_LIMIT,
+    RESPONSE_CACHE_SIMILARITY,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL_SECONDS,
+)
+from backend.lru import LRUCache
+from backend.rag import normalize_query
+
+_REPLAY_RE = re.compile(r"\S+\s*")
+
+
+def context_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def replay_chunks(answer: str, words_per_chunk: int = 4) -> Iterator[str]:
+    """Split a cached answer into small stream-sized pieces."""
+    words = _REPLAY_RE.findall(answer)
+    for i in range(0, len(words), words_per_chunk):
+        yield "".join(words[i:i + words_per_chunk])
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_SIZE,
+        ttl_seconds: Optional[float] = RESPONSE_CACHE_TTL_SECONDS,
+        similarity_threshold: float = RESPONSE_CACHE_SIMILARITY,
+        scan_limit: int = RESPONSE_CACHE_SCAN_LIMIT,
+    ):
+        # (scope, normalized query) -> answer; owns eviction and TTL
+        self._answers = LRUCache(max_entries, ttl_seconds)
+        # scope -> normalized query -> unit query vector, for similarity
+        # matches; at most `scan_limit` most recent questions per scope
+        self._vectors: "dict[Hashable, OrderedDict[str, np.ndarray]]" = {}
+        self._lock = threading.Lock()
+
+        self.similarity_threshold = similarity_threshold
+        self.scan_limit = scan_limit
+        self.semantic_hits = 0
+
+    @staticmethod
+    def scope(doc_set: Optional[str], persona: str, language: str, context: str) -> Tuple:
+        return (doc_set or "", persona, language, context_hash(context))
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype="float32")
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def get(
+        self,
+        scope: Tuple,
+        query: str,
+        query_vector: Optional[Sequence[float]] = None,
+    ) -> Optional[str]:
+        """
+        Cached answer for `query` in `scope`, or None. `query_vector`
+        enables matching paraphrases (cosine >= similarity_threshold).
+        """
+        key = normalize_query(query)
+        answer = self._answers.get((scope, key))
+        if answer is not None or query_vector is None:
+            return answer
+
+        with self._lock:
+            candidates = list(self._vectors.get(scope, {}).items())
+        if not candidates:
+            return None
+
+        q = self._unit(query_vector)
+        matrix = np.stack([v for _, v in candidates])
+        scores = matrix @ q
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+
+        matched_key = candidates[best][0]
+        answer = self._answers.get((scope, matched_key))
+        if answer is None:
+            # Evicted or expired: drop it from the similarity index too
+            with self._lock:
+                self._vectors.get(scope, {}).pop(matched_key, None)
+            return None
+
+        self.semantic_hits += 1
+        return answer
+
+    def put(
+        self,
+        scope: Tuple,
+        query: str,
+        answer: str,
+        query_vector: Optional[Sequence[float]] = None,
+    ) -> None:
+        key = normalize_query(query)
+        self._answers.put((scope, key), answer)
+        if query_vector is None:
+            return
+
+        with self._lock:
+            vectors = self._vectors.setdefault(scope, OrderedDict())
+            vectors[key] = self._unit(query_vector)
+            vectors.move_to_end(key)
+            while len(vectors) > self.scan_limit:
+                vectors.popitem(last=False)
+            # Keep the number of scopes bounded like the answers themselves
+            while len(self._vectors) > self._answers.max_entries:
+                self._vectors.pop(next(iter(self._vectors)))
+
+    def clear(self) -> None:
+        self._answers.clear()
+        with self._lock:
+            self._vectors.clear()
+
+    def stats(self) -> dict:
+        stats = self._answers.stats()
+        stats["semantic_hits"] = self.semantic_hits
+        return stats
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> ResponseCache:
+    """Process-wide answer cache, shared by every chat session."""
+    return ResponseCache()
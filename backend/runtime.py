@@ -0,0 +1,69 @@
+# backend/runtime.py
+"""
+Process-wide backend shared by every session.
+
+The chat model client, the compiled graph (with its checkpointer), the
+conversation memory and the response cache are stateless per request, so
+one instance of each serves every browser session, CLI run or API request
+in the process. Sessions stay isolated by their `thread_id` (checkpointer)
+and session id (memory), not by separate objects.
+
+    chat_service = get_chat_service()
+"""
+from __future__ import annotations
+
+import time
+from functools import lru_cache
+
+from backend import metrics
+from backend.chat_service import ChatService
+from backend.config import (
+    CONVERSATION_MEMORY,
+    HISTORY_COMPACTION,
+    MEMORY_VERBATIM_TURNS,
+    RESPONSE_CACHE,
+)
+
+
+def build_chat_service(model=None) -> ChatService:
+    """
+    Model → graph → ChatService, with memory, response cache and history
+    compaction as configured. `model` defaults to the provider chat model.
+    """
+    from backend.graph import HistoryCompactor, build_graph
+
+    started = time.perf_counter()
+    if model is None:
+        from backend.model import get_chat_model
+
+        model = get_chat_model()
+
+    memory = None
+    if CONVERSATION_MEMORY:
+        from backend.memory import get_conversation_memory
+
+        memory = get_conversation_memory()
+
+    response_cache = None
+    if RESPONSE_CACHE:
+        from backend.response_cache import get_response_cache
+
+        response_cache = get_response_cache()
+
+    compactor = HistoryCompactor(model) if HISTORY_COMPACTION else None
+
+    service = ChatService(
+        # Older turns come from memory recall, not the verbatim history
+        build_graph(model, verbatim_turns=MEMORY_VERBATIM_TURNS if memory is not None else None),
+        memory=memory,
+        response_cache=response_cache,
+        compactor=compactor,
+    )
+    metrics.observe("backend_init_seconds", time.perf_counter() - started)
+    return service
+
+
+@lru_cache(maxsize=1)
+def get_chat_service() -> ChatService:
+    """The process-wide ChatService (built on first use)."""
+    return build_chat_service()
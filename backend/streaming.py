@@ -0,0 +1,105 @@
+# backend/streaming.py
+"""
+Coalescing of streamed replies for display.
+
+`ChatService.stream` yields one chunk per model token. Rendering each one
+(Streamlit re-renders the whole growing answer, terminals flush a write,
+SSE sends an event) costs far more than the token itself. `coalesce`
+turns the chunk stream into text batches that are flushed when
+STREAM_FLUSH_INTERVAL_SECONDS have passed since the last flush or
+STREAM_FLUSH_CHARS characters are pending, whichever comes first. The
+first piece of text is flushed immediately, so time to first token is
+unchanged; the remainder is flushed at the end.
+
+    for text in coalesce(chat_service.stream(...)):
+        print(text, end="", flush=True)
+"""
+from __future__ import annotations
+
+import time
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional
+
+from langchain_core.messages import AIMessage
+
+from backend.config import STREAM_FLUSH_CHARS, STREAM_FLUSH_INTERVAL_SECONDS
+
+
+class TextCoalescer:
+    def __init__(
+        self,
+        interval_seconds: float = STREAM_FLUSH_INTERVAL_SECONDS,
+        max_chars: int = STREAM_FLUSH_CHARS,
+    ):
+        self.interval_seconds = interval_seconds
+        self.max_chars = max_chars
+
+        self.parts: List[str] = []  # everything received, in order
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._last_flush: Optional[float] = None
+
+    def add(self, text: str) -> Optional[str]:
+        """Buffer `text`; returns the batch to render when a boundary is hit."""
+        if not text:
+            return None
+        self.parts.append(text)
+        self._pending.append(text)
+        self._pending_chars += len(text)
+
+        if (
+            self._last_flush is None
+            or self._pending_chars >= self.max_chars
+            or time.monotonic() - self._last_flush >= self.interval_seconds
+        ):
+            return self.flush()
+        return None
+
+    def flush(self) -> str:
+        """Pending text since the last flush ('' if none)."""
+        batch = "".join(self._pending)
+        self._pending.clear()
+        self._pending_chars = 0
+        self._last_flush = time.monotonic()
+        return batch
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def _chunk_text(chunk) -> str:
+    if isinstance(chunk, AIMessage) and isinstance(chunk.content, str):
+        return chunk.content
+    return ""
+
+
+def coalesce(
+    stream: Iterable,
+    interval_seconds: float = STREAM_FLUSH_INTERVAL_SECONDS,
+    max_chars: int = STREAM_FLUSH_CHARS,
+) -> Iterator[str]:
+    """Text batches of a `ChatService.stream` output ((chunk, metadata) pairs)."""
+    buffer = TextCoalescer(interval_seconds, max_chars)
+    for chunk, _ in stream:
+        batch = buffer.add(_chunk_text(chunk))
+        if batch:
+            yield batch
+    batch = buffer.flush()
+    if batch:
+        yield batch
+
+
+async def acoalesce(
+    stream: AsyncIterable,
+    interval_seconds: float = STREAM_FLUSH_INTERVAL_SECONDS,
+    max_chars: int = STREAM_FLUSH_CHARS,
+) -> AsyncIterator[str]:
+    """Async version of `coalesce`, for `ChatService.astream`."""
+    buffer = TextCoalescer(interval_seconds, max_chars)
+    async for chunk, _ in stream:
+        batch = buffer.add(_chunk_text(chunk))
+        if batch:
+            yield batch
+    batch = buffer.flush()
+    if batch:
+        yield batch
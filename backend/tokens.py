@@ -0,0 +1,119 @@
+# backend/tokens.py
+"""
+Cheap, local token estimates.
+
+Good enough for budgeting prompt sections and trimming history without a
+round-trip to the provider's tokenizer. Tuned to over- rather than
+under-estimate.
+"""
+from __future__ import annotations
+
+import math
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+from langchain_core.messages import BaseMessage
+
+MessageCounter = Callable[[BaseMessage], int]
+
+# Gemini/SentencePiece-style tokenizers average ~4 characters per token
+# on English prose; non-Latin scripts are denser, so count those higher.
+_CHARS_PER_TOKEN = 4.0
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    ascii_chars = len(text) - non_ascii
+    return math.ceil(ascii_chars / _CHARS_PER_TOKEN + non_ascii / 2.0)
+
+
+# Role markers / separators the provider adds around every message
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _content_text(content) -> str:
+    if isinstance(content, str):
+        return content
+    # Multimodal content: list of str / {"type": "text", "text": ...} parts
+    parts = []
+    for part in content or []:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict) and isinstance(part.get("text"), str):
+            parts.append(part["text"])
+    return "".join(parts)
+
+
+def estimate_message_tokens(message: BaseMessage) -> int:
+    return estimate_tokens(_content_text(message.content)) + _MESSAGE_OVERHEAD_TOKENS
+
+
+def make_message_counter(kind_or_fn: Union[str, MessageCounter] = "local", model=None) -> MessageCounter:
+    """
+    Resolve a per-message token counter.
+
+    - "local": fast offline estimate (default)
+    - "model": the chat model's own tokenizer (may be a remote call)
+    - any callable(message) -> int
+    """
+    if callable(kind_or_fn):
+        return kind_or_fn
+    if kind_or_fn == "local":
+        return estimate_message_tokens
+    if kind_or_fn == "model":
+        if model is None:
+            raise ValueError('token_counter="model" needs a model')
+        return lambda message: model.get_num_tokens_from_messages([message])
+    raise ValueError(f"Unknown token counter: {kind_or_fn}")
+
+
+def trim_to_budget(
+    messages: Sequence[BaseMessage],
+    counts: Dict[str, int],
+    counter: MessageCounter,
+    max_tokens: int,
+) -> Tuple[List[BaseMessage], Dict[str, int]]:
+    """
+    Keep the most recent messages that fit in `max_tokens`.
+
+    `counts` maps message id -> token count from earlier turns; only
+    messages missing from it are counted. The walk starts at the newest
+    message and stops at the first one that does not fit, so the cost is
+    proportional to what is kept, not to the whole history.
+
+    Mirrors trim_messages(strategy="last", include_system=True,
+    allow_partial=False, start_on="human"), but always keeps the newest
+    message. Returns (kept messages, newly computed counts by id).
+    """
+    new_counts: Dict[str, int] = {}
+
+    def count(message: BaseMessage) -> int:
+        n = counts.get(message.id) if message.id else None
+        if n is None:
+            n = counter(message)
+            if message.id:
+                new_counts[message.id] = n
+        return n
+
+    system = None
+    body = list(messages)
+    if body and body[0].type == "system":
+        system, body = body[0], body[1:]
+
+    budget = max_tokens - (count(system) if system is not None else 0)
+    total = 0
+    start = len(body)
+    for i in range(len(body) - 1, -1, -1):
+        n = count(body[i])
+        if total + n > budget and start < len(body):
+            break
+        total += n
+        start = i
+
+    kept = body[start:]
+    # Start on a human message, as the model expects
+    while len(kept) > 1 and kept[0].type != "human":
+        kept = kept[1:]
+
+    return ([system] if system is not None else []) + kept, new_counts
@@ -2,7 +2,8 @@
 from __future__ import annotations
 
 import streamlit as st
-from langchain_core.messages import AIMessage
+
+from backend.streaming import coalesce
 
 
 def render_chat(chat: dict, chat_service) -> None:
@@ -31,19 +32,21 @@ def render_chat(chat: dict, chat_service) -> None:
 
     with st.chat_message("assistant"):
         placeholder = st.empty()
-        full_response = ""
+        parts = []
 
-        for chunk, _ in chat_service.stream(
+        # Tokens are batched (backend/streaming.py) so the growing answer
+        # is re-rendered a few times per second, not once per token
+        for text in coalesce(chat_service.stream(
             query=user_input,
             session_id=st.session_state.active_chat_id,
             persona=chat["persona"],
             language=chat["language"],
             use_rag=chat.get("use_rag", False),
-            vectorstore=chat.get("vectorstore", None),
-        ):
-            if isinstance(chunk, AIMessage) and chunk.content:
-                full_response += chunk.content
-                placeholder.markdown(full_response + "▌")
+            vectorstore=chat.get("collection", None),
+        )):
+            parts.append(text)
+            placeholder.markdown("".join(parts) + "▌")
 
+        full_response = "".join(parts)
         placeholder.markdown(full_response)
         chat["messages"].append(("assistant", full_response))
@@ -5,6 +5,57 @@ import streamlit as st
 from frontend.state import apply_rename, create_new_chat, safe_index
 
 
+@st.cache_data(ttl=60, show_spinner=False)
+def _library_names() -> list:
+    from backend.library import list_libraries
+
+    return list_libraries()
+
+
+def _render_library_picker(chat: dict, libraries: list) -> None:
+    """Attach (by handle, loaded on first query) or detach an ingested library."""
+    from backend.library import load_library
+
+    current = chat.get("library")
+    options = ["(none)"] + libraries
+    choice = st.selectbox(
+        "Library",
+        options,
+        index=safe_index(options, current[0] if current else "(none)", "(none)"),
+        key=f"library_{st.session_state.active_chat_id}",
+    )
+    if current and choice == current[0]:
+        return
+
+    collection = chat["collection"]
+    if current:
+        collection.remove(current[1])
+        chat["library"] = None
+    if choice != "(none)":
+        try:
+            library = load_library(choice)
+            collection.attach(library.index_id, f"library:{choice}")
+            chat["library"] = (choice, library.index_id)
+            chat["use_rag"] = True
+        except (FileNotFoundError, ValueError) as e:
+            st.error(f"Library unavailable: {e}")
+
+
+def _remove_document(chat_id: str, doc_id: str) -> None:
+    """Remove button callback: detach a document and release the chat's handle."""
+    from backend.index_registry import get_index_registry
+
+    chat = st.session_state.all_chats[chat_id]
+    chat["collection"].remove(doc_id)
+    get_index_registry().release(doc_id, owner=chat_id)
+
+    # Still in the uploader, it would be attached again on the next run;
+    # start with an empty uploader (the other documents stay attached)
+    if doc_id in chat["upload_hashes"].values():
+        chat["upload_hashes"] = {}
+        chat["uploader_version"] += 1
+
+
 def render_sidebar(chat: dict) -> None:
     """
     Render sidebar UI and mutate the active chat dict in-place.
@@ -51,33 +102,114 @@ def render_sidebar(chat: dict) -> None:
 
         # ---------- RAG section ----------
         st.divider()
-        st.subheader("📄 Document (RAG)")
+        st.subheader("📄 Documents (RAG)")
 
-        uploaded = st.file_uploader(
-            "Upload a file",
+        chat_id = st.session_state.active_chat_id
+        uploader_key = f"uploader_{chat_id}_{chat['uploader_version']}"
+
+        # Streamlit drops the state of widgets that were not rendered, so
+        # after a chat switch this chat's uploader comes back empty. Only an
+        # uploader that was rendered on the previous run can tell us a file
+        # was removed from it.
+        uploader_was_rendered = uploader_key in st.session_state
+
+        uploaded_files = st.file_uploader(
+            "Upload files",
             type=["pdf", "txt", "docx", "csv"],
-            key=f"uploader_{st.session_state.active_chat_id}",
+            accept_multiple_files=True,
+            key=uploader_key,
         )
 
-        if uploaded is not None:
-            from backend.document_rag import build_vectorstore_from_upload
+        from backend.document_rag import compute_file_hash
+
+        # The collection is the source of truth for the chat's documents;
+        # the uploader only adds to it (and detaches files taken out of it).
+        # upload_hashes holds the uploader's files as of its last render.
+        # Hash each upload once; Streamlit reruns this on every interaction.
+        collection = chat["collection"]
+        previous = chat["upload_hashes"] if uploader_was_rendered else {}
+        upload_hashes = {}
+        current = {}
+        for uploaded in uploaded_files or []:
+            file_hash = previous.get(uploaded.file_id)
+            if file_hash is None:
+                file_hash = compute_file_hash(uploaded.getvalue())
+            upload_hashes[uploaded.file_id] = file_hash
+            current[file_hash] = uploaded
+        chat["upload_hashes"] = upload_hashes
+
+        removed = {
+            file_hash
+            for file_id, file_hash in previous.items()
+            if file_id not in upload_hashes and file_hash not in current
+        }
+
+        # The registry (and FAISS) is only loaded once the chat has documents
+        if current or removed:
+            from backend.index_registry import get_index_registry
+
+            registry = get_index_registry()
 
-            file_bytes = uploaded.getvalue()
-            filename = uploaded.name
+            # Attach new documents (shared index from the registry, built if needed)
+            for file_hash, uploaded in current.items():
+                if file_hash in collection:
+                    continue
 
-            try:
-                built = build_vectorstore_from_upload(file_bytes, filename)
+                filename = uploaded.name
+                progress = st.progress(0.0, text=f"Embedding {filename}...")
 
-                if chat.get("last_file_hash") != built.file_hash:
-                    chat["vectorstore"] = built.vectorstore
-                    chat["last_file_hash"] = built.file_hash
+                def on_progress(done: int, total: int) -> None:
+                    progress.progress(
+                        done / total if total else 1.0,
+                        text=f"Embedding {filename}: {done}/{total} chunks",
+                    )
+
+                try:
+                    built = registry.acquire(
+                        uploaded.getvalue(),
+                        filename,
+                        owner=chat_id,
+                        file_hash=file_hash,
+                        progress_callback=on_progress,
+                    )
+                    progress.empty()
+
+                    collection.add(built)
                     chat["use_rag"] = True
                     st.success(f"✅ Embedded: {built.filename}. RAG enabled for this chat.")
-                else:
-                    st.info("ℹ️ Same file already loaded for this chat. Skipping embedding.")
 
-            except Exception as e:
-                st.error(f"Upload failed: {e}")
+                except Exception as e:
+                    # Don't leave a half-filled bar behind the error
+                    progress.empty()
+                    st.error(f"Upload failed: {e}")
+
+            # Detach documents the user took out of the uploader
+            library = chat.get("library")
+            for doc_id in removed:
+                if doc_id in collection and not (library and doc_id == library[1]):
+                    collection.remove(doc_id)
+                    registry.release(doc_id, owner=chat_id)
+
+        # Libraries built offline by scripts/ingest_dir.py
+        libraries = _library_names()
+        if libraries or chat.get("library"):
+            _render_library_picker(chat, libraries)
+
+        if len(collection):
+            st.caption(f"{len(collection)} document(s) in this chat:")
+            library = chat.get("library")
+            for doc_id, name in collection.documents():
+                col1, col2 = st.columns([0.85, 0.15])
+                col1.caption(name)
+                # Libraries are detached with the picker above
+                if not (library and doc_id == library[1]):
+                    col2.button(
+                        "✖",
+                        key=f"remove_{chat_id}_{doc_id}",
+                        help=f"Remove {name} from this chat",
+                        on_click=_remove_document,
+                        args=(chat_id, doc_id),
+                    )
 
         chat["use_rag"] = st.checkbox(
             "Use document context (RAG)",
@@ -4,6 +4,8 @@ from __future__ import annotations
 import uuid
 import streamlit as st
 
+from backend.collection import DocumentCollection
+
 
 def new_chat_state() -> dict:
     return {
@@ -12,8 +14,10 @@ def new_chat_state() -> dict:
         "persona": "Friendly Assistant",
         "language": "English",
         "use_rag": False,
-        "vectorstore": None,
-        "last_file_hash": None,
+        "collection": DocumentCollection(),  # index handles, resolved via the registry
+        "upload_hashes": {},  # uploader file_id -> file hash, as of its last render
+        "uploader_version": 0,  # bumped to give the chat a fresh, empty uploader
+        "library": None,  # (name, index id) of an attached ingested library
         "renaming": False,
     }
 
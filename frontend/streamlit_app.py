@@ -11,9 +11,7 @@ sys.path.insert(0, str(PROJECT_ROOT))
 os.environ["GOOGLE_API_KEY"] = st.secrets["GOOGLE_API_KEY"]
 
 # --- Backend imports ---
-from backend.model import get_chat_model
-from backend.graph import build_graph
-from backend.chat_service import ChatService
+from backend.runtime import get_chat_service
 
 # --- Frontend imports ---
 from frontend.state import init_state
@@ -21,17 +19,19 @@ from frontend.sidebar import render_sidebar
 from frontend.chat_ui import render_chat
 
 
-def init_backend():
-    if "chat_service" not in st.session_state:
-        model = get_chat_model()
-        graph = build_graph(model)
-        st.session_state.chat_service = ChatService(graph)
+@st.cache_resource(show_spinner=False)
+def get_backend():
+    """
+    One model client, compiled graph and checkpointer for the whole
+    server process; browser sessions are isolated by chat id (thread_id).
+    """
+    return get_chat_service()
 
 
 def main():
     st.set_page_config(page_title="RAGFlow Chat", layout="wide")
 
-    init_backend()
+    chat_service = get_backend()
     init_state()
 
     # Centered title + subtitle
@@ -70,8 +70,12 @@ def main():
     # Sidebar UI
     render_sidebar(chat)
 
+    # Reload the active chat's spilled indexes (if any) before it is queried
+    if len(chat["collection"]):
+        chat["collection"].warm()
+
     # Main chat UI
-    render_chat(chat, st.session_state.chat_service)
+    render_chat(chat, chat_service)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+# scripts/ann_report.py
+"""
+Recall-vs-latency report for the ANN index types in backend/ann.py.
+
+Every index type is built over the same vectors and compared against
+exact (flat) search: recall@k is the fraction of the true top-k that the
+approximate index returns. `--encoding` picks how vectors are stored
+(float32, float16 or int8; ivf_pq is always compressed).
+
+Vectors come either from a saved flat index (e.g. a registry snapshot's
+index.faiss) or from a synthetic clustered corpus, so the report runs
+offline and without an API key.
+
+Usage:
+    python scripts/ann_report.py --n 200000 --dim 768
+    python scripts/ann_report.py --index .ragflow_cache/indexes/<hash>/index.faiss
+    python scripts/ann_report.py --n 50000 --json ann_report.json
+    python scripts/ann_report.py --n 50000 --encoding int8
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# --- Fix import path ---
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import faiss
+import numpy as np
+
+from backend.ann import VECTOR_ENCODINGS, build_index, configure_search
+from backend.config import VECTOR_ENCODING
+
+INDEX_TYPES = ["flat", "hnsw", "ivf_flat", "ivf_pq"]
+
+
+def synthetic_corpus(n: int, dim: int, n_queries: int, seed: int = 0):
+    """Clustered gaussian vectors; queries are perturbed corpus points."""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, n // 500)
+    centers = rng.normal(size=(n_clusters, dim)).astype("float32")
+    labels = rng.integers(0, n_clusters, size=n)
+    corpus = centers[labels] + 0.3 * rng.normal(size=(n, dim)).astype("float32")
+    picks = rng.integers(0, n, size=n_queries)
+    queries = corpus[picks] + 0.1 * rng.normal(size=(n_queries, dim)).astype("float32")
+    return corpus.astype("float32"), queries.astype("float32")
+
+
+def vectors_from_index(path: str, n_queries: int, seed: int = 0):
+    index = faiss.read_index(path)
+    corpus = index.reconstruct_n(0, index.ntotal)
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(corpus), size=n_queries)
+    noise = 0.01 * corpus.std() * rng.normal(size=(n_queries, corpus.shape[1]))
+    return corpus, (corpus[picks] + noise).astype("float32")
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / (len(truth) * k)
+
+
+def run(corpus, queries, k: int, nprobes, ef_searches, encoding: str = VECTOR_ENCODING):
+    rows = []
+
+    exact = faiss.IndexFlatL2(corpus.shape[1])
+    exact.add(corpus)
+    _, truth = exact.search(queries, k)
+
+    for index_type in INDEX_TYPES:
+        start = time.perf_counter()
+        index = build_index(corpus, index_type, encoding)
+        build_s = time.perf_counter() - start
+
+        if index_type.startswith("ivf"):
+            settings = [{"nprobe": p} for p in nprobes]
+        elif index_type == "hnsw":
+            settings = [{"ef_search": ef} for ef in ef_searches]
+        else:
+            settings = [{}]
+
+        for params in settings:
+            configure_search(index, **params)
+            start = time.perf_counter()
+            _, found = index.search(queries, k)
+            elapsed = time.perf_counter() - start
+
+            rows.append({
+                "index_type": index_type,
+                "params": params,
+                "recall_at_k": round(recall_at_k(truth, found), 4),
+                "latency_ms_per_query": round(1000 * elapsed / len(queries), 4),
+                "build_seconds": round(build_s, 2),
+                "index_bytes": len(faiss.serialize_index(index)),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", help="Flat FAISS index file to take vectors from")
+    parser.add_argument("--n", type=int, default=100_000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=768, help="Synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--encoding", choices=sorted(VECTOR_ENCODINGS), default=VECTOR_ENCODING)
+    parser.add_argument("--json", help="Also write the rows to this JSON file")
+    args = parser.parse_args()
+
+    if args.index:
+        corpus, queries = vectors_from_index(args.index, args.queries)
+    else:
+        corpus, queries = synthetic_corpus(args.n, args.dim, args.queries)
+
+    print(f"\nCorpus: {corpus.shape[0]:,} vectors x {corpus.shape[1]} dims, "
+          f"{len(queries)} queries, k={args.k}\n")
+
+    rows = run(corpus, queries, args.k, args.nprobe, args.ef_search, args.encoding)
+
+    print(f"{'index':<10} {'params':<18} {'recall@k':>9} {'ms/query':>10} {'build s':>8} {'size MB':>9}")
+    for r in rows:
+        params = ", ".join(f"{k}={v}" for k, v in r["params"].items()) or "-"
+        print(
+            f"{r['index_type']:<10} {params:<18} {r['recall_at_k']:>9.3f} "
+            f"{r['latency_ms_per_query']:>10.3f} {r['build_seconds']:>8.1f} "
+            f"{r['index_bytes'] / 1e6:>9.1f}"
+        )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2), encoding="utf-8")
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# scripts/api_server.py
+"""
+Run the streaming HTTP API (backend/api.py).
+
+Usage:
+    python scripts/api_server.py --host 0.0.0.0 --port 8080
+
+Example:
+    curl -s -X POST localhost:8080/sessions -d '{"persona": "Tutor"}'
+    curl -s -F file=@handbook.pdf localhost:8080/sessions/<id>/documents
+    curl -N -X POST localhost:8080/sessions/<id>/chat -d '{"message": "Summarize the handbook"}'
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# --- Fix import path ---
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+
+# --- Load secrets from .streamlit/secrets.toml ---
+try:
+    import tomllib  # Python 3.11+
+except ModuleNotFoundError:
+    raise RuntimeError("Python 3.11+ is required for tomllib")
+
+SECRETS_PATH = ".streamlit/secrets.toml"
+
+if not os.path.exists(SECRETS_PATH):
+    raise FileNotFoundError(
+        f"Secrets file not found at {SECRETS_PATH}. "
+        "Make sure .streamlit/secrets.toml exists."
+    )
+
+with open(SECRETS_PATH, "rb") as f:
+    secrets = tomllib.load(f)
+
+# Export secrets as environment variables
+os.environ["GOOGLE_API_KEY"] = secrets["GOOGLE_API_KEY"]
+os.environ["LANGSMITH_API_KEY"] = secrets.get("LANGSMITH_API_KEY", "")
+
+# --- Backend imports (after env vars are set) ---
+from aiohttp import web
+
+from backend.api import create_app
+from backend.config import API_HOST, API_KEEPALIVE_SECONDS, API_PORT
+from backend.runtime import get_chat_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    # One model + graph for the whole process, shared by every request
+    web.run_app(
+        create_app(get_chat_service()),
+        host=args.host,
+        port=args.port,
+        keepalive_timeout=API_KEEPALIVE_SECONDS,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+# scripts/batch_qa.py
+"""
+Batch question answering: run a JSONL file of questions through
+ChatService with bounded concurrency and write one JSONL result per
+question.
+
+    python scripts/batch_qa.py questions.jsonl --library handbooks --out answers.jsonl
+    python scripts/batch_qa.py questions.jsonl --docs policy.pdf faq.docx --concurrency 16
+
+Input lines:  {"query": "...", "id": "q1", "persona": "...", "language": "...",
+               "retrieval_mode": "hybrid"}   (only "query" is required; "question"
+               is accepted as an alias)
+Output lines: {"index", "id", "query", "answer", "chunks": [{"source", "chunk_range",
+               "text"}], "latency_s", "ttft_s", "tokens": {...}, "error"}
+              ("chunks" are the passages packed into the prompt, after merging,
+               dedupe, MMR and the token budget)
+
+Every question runs in its own conversation thread (isolated, in-memory,
+deleted when the answer is written) on the async path (`astream`), with
+at most `--concurrency` questions in flight. Retrieval, query-embedding
+and index caches are process-wide, so repeated or overlapping questions
+reuse them. `--rpm` caps model requests per minute at the provider's
+limit (taken right before each model request, see ChatService); throughput
+grows with `--concurrency` until that cap.
+
+Results are written as questions finish (`index` is the input line
+number). Use `--fake-model` to exercise the runner without an API key.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import List
+
+# --- Fix import path ---
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from backend.chat_service import ChatService
+from backend.config import RAG_CONTEXT_CANDIDATES
+from backend.context import pack_passages
+from backend.embedding_pipeline import TokenBucket
+from backend.graph import build_graph
+from backend.rag import RETRIEVAL_MODES, RAGService
+from backend.tokens import estimate_tokens
+
+
+def load_secrets() -> None:
+    """Export the API key from .streamlit/secrets.toml unless already set."""
+    if os.environ.get("GOOGLE_API_KEY"):
+        return
+    import tomllib
+
+    secrets_path = PROJECT_ROOT / ".streamlit" / "secrets.toml"
+    if not secrets_path.exists():
+        raise FileNotFoundError(
+            f"Secrets file not found at {secrets_path}; set GOOGLE_API_KEY or create it."
+        )
+    with open(secrets_path, "rb") as f:
+        secrets = tomllib.load(f)
+    os.environ["GOOGLE_API_KEY"] = secrets["GOOGLE_API_KEY"]
+
+
+def read_questions(path: Path) -> List[dict]:
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            query = item.get("query") or item.get("question")
+            if not query:
+                raise ValueError(f"{path}:{line_no}: missing \"query\"")
+            questions.append({**item, "query": query, "index": line_no})
+    return questions
+
+
+def load_documents(args):
+    """The document set every question is asked against (or None)."""
+    if args.library:
+        from backend.library import load_library
+
+        return load_library(args.library).collection()
+
+    if args.docs:
+        from backend.collection import DocumentCollection
+        from backend.index_registry import get_index_registry
+
+        registry = get_index_registry()
+        collection = DocumentCollection(registry)
+        for doc in args.docs:
+            path = Path(doc)
+            collection.add(registry.acquire(path.read_bytes(), path.name, owner="batch-qa"))
+        return collection
+
+    return None
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def answer_one(
+    service: ChatService,
+    item: dict,
+    args,
+    documents,
+    run_id: str,
+) -> dict:
+    query = item["query"]
+    mode = item.get("retrieval_mode") or args.retrieval_mode
+    thread_id = f"batch-{run_id}-{item['index']}"
+    use_rag = documents is not None
+    result = {"index": item["index"], "id": item.get("id"), "query": query}
+
+    t0 = time.perf_counter()
+    ttft = None
+    parts = []
+    chunks = []
+    state = {}
+    error = None
+    try:
+        # Same cached candidates ChatService retrieves, packed the same way
+        # (pack_context), so the chunks are exactly what the prompt got
+        if use_rag:
+            docs = await asyncio.to_thread(
+                RAGService(documents).retrieve_documents, query, mode, RAG_CONTEXT_CANDIDATES
+            )
+            chunks = pack_passages(docs)
+
+        async for chunk, metadata in service.astream(
+            query,
+            thread_id,
+            item.get("persona") or args.persona,
+            item.get("language") or args.language,
+            use_rag=use_rag,
+            vectorstore=documents,
+            retrieval_mode=mode,
+        ):
+            if metadata is None:  # quota message from ChatService
+                error = "quota_exceeded"
+                break
+            if isinstance(chunk, AIMessage) and isinstance(chunk.content, str) and chunk.content:
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                parts.append(chunk.content)
+
+        config = {"configurable": {"thread_id": thread_id}}
+        state = (await service.graph.aget_state(config)).values
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        await service.graph.checkpointer.adelete_thread(thread_id)
+
+    answer = "".join(parts)
+    messages = state.get("messages") or []
+    usage = getattr(messages[-1], "usage_metadata", None) if messages else None
+    result.update(
+        answer=answer,
+        chunks=chunks,
+        latency_s=round(time.perf_counter() - t0, 3),
+        ttft_s=round(ttft, 3) if ttft is not None else None,
+        tokens={
+            "question": estimate_tokens(query),
+            "context": estimate_tokens(state.get("retrieved_context") or ""),
+            "answer": estimate_tokens(answer),
+            # Provider-reported usage, when the model returns it
+            "usage": dict(usage) if usage else None,
+        },
+        error=error,
+    )
+    return result
+
+
+async def run(args, questions: List[dict], service: ChatService, documents) -> List[dict]:
+    run_id = uuid.uuid4().hex[:8]
+    slots = asyncio.Semaphore(args.concurrency)
+    results = []
+
+    out = open(args.out, "w", encoding="utf-8")
+
+    async def bounded(item: dict) -> None:
+        async with slots:
+            result = await answer_one(service, item, args, documents, run_id)
+        results.append(result)
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+        status = "✗" if result["error"] else "✓"
+        print(f"  {status} [{len(results)}/{len(questions)}] {result['latency_s']:.2f}s  {item['query'][:60]}")
+
+    try:
+        await asyncio.gather(*(bounded(item) for item in questions))
+    finally:
+        out.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", type=Path, help="JSONL file of questions")
+    parser.add_argument("--out", default="answers.jsonl", help="JSONL results file")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--library", help="Library built by scripts/ingest_dir.py")
+    source.add_argument("--docs", nargs="+", help="Document files to ask against")
+    parser.add_argument("--concurrency", type=int, default=8, help="Questions in flight")
+    parser.add_argument("--rpm", type=float, default=None, help="Model requests per minute cap")
+    parser.add_argument("--persona", default="Formal Expert")
+    parser.add_argument("--language", default="English")
+    parser.add_argument("--retrieval-mode", choices=sorted(RETRIEVAL_MODES), default=None)
+    parser.add_argument("--fake-model", action="store_true", help="Offline fake chat model (no API key)")
+    args = parser.parse_args()
+
+    questions = read_questions(args.questions)
+
+    if args.fake_model:
+        from backend.fakes import FakeStreamingChatModel
+
+        model = FakeStreamingChatModel(ttft_seconds=0.2, tokens_per_second=100)
+    else:
+        load_secrets()
+        from backend.model import get_chat_model
+
+        model = get_chat_model()
+
+    documents = load_documents(args)
+
+    # Batch threads are throwaway: in-memory state, no long-term memory
+    # or answer cache, so questions cannot influence each other
+    service = ChatService(
+        build_graph(model, checkpointer=MemorySaver()),
+        max_concurrency=args.concurrency,
+        rate_limiter=TokenBucket(args.rpm / 60.0) if args.rpm else None,
+    )
+
+    print(f"{len(questions)} question(s), concurrency {args.concurrency}"
+          + (f", {args.rpm:g} requests/min" if args.rpm else ""))
+    started = time.perf_counter()
+    results = asyncio.run(run(args, questions, service, documents))
+    wall = time.perf_counter() - started
+
+    latencies = [r["latency_s"] for r in results if not r["error"]]
+    errors = sum(1 for r in results if r["error"])
+    answer_tokens = sum(r["tokens"]["answer"] for r in results)
+    print(
+        f"\n{len(results)} answered in {wall:.1f}s ({len(results) / wall:.2f} q/s), {errors} error(s); "
+        f"latency p50 {percentile(latencies, 0.5):.2f}s p95 {percentile(latencies, 0.95):.2f}s; "
+        f"~{answer_tokens} answer tokens"
+    )
+    print(f"Wrote {args.out}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+# scripts/benchmark.py
+"""
+Offline performance benchmarks for the backend.
+
+Everything runs against deterministic stand-ins (backend/fakes.py), so no
+API key, network or quota is needed and runs are comparable over time:
+
+- extraction   extract_text + chunking throughput per format (txt, csv, docx, pdf)
+- index_build  build_vectorstore_from_upload with simulated embedding latency
+- retrieve     candidate retrieval p50/p99 per mode, cold and warm caches
+               (query embedding at --embed-latency), and context packing
+- storage      memory/disk footprint, load time, search latency and recall of
+               the pickled docstore (float32) vs the compact chunk store
+               with float32/float16/int8 vectors, over the same chunks
+- trimming     per-turn history trimming cost (as in build_graph), with and
+               without cached token counts
+- chat_stream  time-to-first-token and tokens/s through ChatService.stream
+
+Results are written as JSON (one object per section) for diffing runs.
+
+Usage:
+    python scripts/benchmark.py --out bench.json
+    python scripts/benchmark.py --quick --only retrieve trimming
+    python scripts/benchmark.py --embed-latency 0.2 --embed-rpm 300
+"""
+import argparse
+import dataclasses
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+
+# --- Fix import path ---
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import docx
+import numpy as np
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from backend import config
+from backend.ann import build_index, index_vectors, vector_bytes
+from backend.chat_service import ChatService
+from backend.checkpoint import SQLiteCheckpointer
+from backend.collection import DocumentCollection
+from backend.document_rag import build_vectorstore_from_upload, extract_text, iter_documents
+from backend.fakes import FakeEmbeddings, FakeStreamingChatModel
+from backend.graph import build_graph
+from backend.index_registry import IndexRegistry, estimate_index_bytes
+from backend.context import pack_context
+from backend.rag import RAGService, clear_caches
+from backend.tokens import estimate_message_tokens, trim_to_budget
+
+SECTIONS = ["extraction", "index_build", "retrieve", "storage", "trimming", "chat_stream"]
+
+# (chunk store, vector encoding); the first is the baseline
+_STORAGE_VARIANTS = [
+    ("docstore", "float32"),
+    ("compact", "float32"),
+    ("compact", "float16"),
+    ("compact", "int8"),
+]
+
+_VOCAB = (
+    "policy employee leave request approval manager payroll benefit insurance claim "
+    "travel expense report deadline quarter budget security access laptop account "
+    "password training onboarding review contract vendor invoice office remote hours"
+).split()
+
+
+# ---------------------------------------------------------------------
+# Synthetic documents
+# ---------------------------------------------------------------------
+def synthetic_lines(n_lines: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    for i in range(n_lines):
+        words = rng.choice(_VOCAB, size=int(rng.integers(8, 20)))
+        yield f"{i}. " + " ".join(words).capitalize() + "."
+
+
+def make_txt(n_lines: int) -> bytes:
+    return "\n".join(synthetic_lines(n_lines)).encode("utf-8")
+
+
+def make_csv(n_lines: int) -> bytes:
+    rows = ["id,department,description,amount"]
+    for i, line in enumerate(synthetic_lines(n_lines)):
+        rows.append(f'{i},dept-{i % 7},"{line}",{(i * 37) % 1000}.50')
+    return "\n".join(rows).encode("utf-8")
+
+
+def make_docx(n_lines: int) -> bytes:
+    document = docx.Document()
+    for line in synthetic_lines(n_lines):
+        document.add_paragraph(line)
+    buffer = BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def make_pdf(n_lines: int, lines_per_page: int = 50) -> bytes:
+    """Minimal multi-page text PDF (Helvetica), readable by PyPDF2."""
+    lines = list(synthetic_lines(n_lines))
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects = []  # object bodies, numbered from 1
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_obj = add(b"")  # filled in below
+    page_ids = []
+    for page_lines in pages:
+        text = "".join(
+            "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj T* "
+            for line in page_lines
+        )
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text}ET".encode("latin-1", errors="replace")
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_obj, font, content)
+        ))
+    kids = b" ".join(b"%d 0 R" % p for p in page_ids)
+    objects[pages_obj - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_obj)
+
+    out = BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog, xref))
+    return out.getvalue()
+
+
+MAKERS = {"txt": make_txt, "csv": make_csv, "docx": make_docx, "pdf": make_pdf}
+
+
+# ---------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------
+def percentiles(samples_s):
+    ordered = sorted(samples_s)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "n": len(ordered),
+        "p50_ms": round(1000 * pick(0.50), 3),
+        "p99_ms": round(1000 * pick(0.99), 3),
+        "mean_ms": round(1000 * statistics.fmean(ordered), 3),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# ---------------------------------------------------------------------
+# Sections
+# ---------------------------------------------------------------------
+def bench_extraction(args) -> dict:
+    results = {}
+    for fmt, make in MAKERS.items():
+        data = make(args.lines)
+        filename = f"bench.{fmt}"
+        text, extract_s = timed(extract_text, data, filename)
+        chunks, chunk_s = timed(lambda: sum(1 for _ in iter_documents(data, filename)))
+        results[fmt] = {
+            "file_bytes": len(data),
+            "text_chars": len(text),
+            "extract_seconds": round(extract_s, 4),
+            "extract_mb_per_s": round(len(data) / 1e6 / extract_s, 2),
+            "chunks": chunks,
+            "extract_and_chunk_seconds": round(chunk_s, 4),
+            "chunks_per_s": round(chunks / chunk_s, 1),
+        }
+    return results
+
+
+def bench_index_build(args) -> dict:
+    data = make_txt(args.lines)
+    embeddings = FakeEmbeddings(
+        size=args.dim,
+        latency_seconds=args.embed_latency,
+        requests_per_minute=args.embed_rpm,
+    )
+    built, seconds = timed(build_vectorstore_from_upload, data, "bench.txt", embeddings=embeddings)
+    chunks = built.vectorstore.index.ntotal
+    return {
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "chunks_per_s": round(chunks / seconds, 1),
+        "embedding_requests": embeddings.requests,
+        "quota_rejections": embeddings.rejected,
+        "embed_latency_s": args.embed_latency,
+        "embed_batch_size": config.EMBED_BATCH_SIZE,
+        "embed_workers": config.EMBED_MAX_WORKERS,
+    }
+
+
+def bench_retrieve(args) -> dict:
+    embeddings = FakeEmbeddings(size=args.dim)
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = IndexRegistry(tmp, embeddings=embeddings)
+        built = registry.acquire(make_txt(args.lines * 4), "corpus.txt", owner="benchmark")
+        collection = DocumentCollection(registry)
+        collection.add(built)
+        service = RAGService(collection)
+        rng = np.random.default_rng(1)
+        queries = [" ".join(rng.choice(_VOCAB, size=4)) for _ in range(args.queries)]
+
+        # Query embeddings pay the simulated provider round trip (the index
+        # itself was built without it), so cold vs warm shows the caches
+        embeddings.latency_seconds = args.embed_latency
+        k = config.RAG_CONTEXT_CANDIDATES
+
+        results = {"chunks": built.vectorstore.index.ntotal, "embed_latency_s": args.embed_latency}
+        for mode in ["vector", "lexical", "hybrid"]:
+            cold, warm = [], []
+            for q in queries:
+                clear_caches()
+                cold.append(timed(service.retrieve_documents, q, mode, k)[1])
+                # Right after the cold call, while its cache entries exist
+                warm.append(timed(service.retrieve_documents, q, mode, k)[1])
+            # Packing runs on every call, cached candidates or not
+            pack = [timed(pack_context, service.retrieve_documents(q, mode, k))[1] for q in queries]
+            results[mode] = {
+                "cold": percentiles(cold),
+                "warm": percentiles(warm),
+                "context_pack": percentiles(pack),
+            }
+        clear_caches()
+    return results
+
+
+def bench_storage(args, workdir: Path) -> dict:
+    embeddings = FakeEmbeddings(size=args.dim)
+    built = build_vectorstore_from_upload(make_txt(args.lines * 4), "corpus.txt", embeddings=embeddings)
+    vectors = index_vectors(built.vectorstore.index)
+    rng = np.random.default_rng(2)
+    queries = [embeddings.embed_query(" ".join(rng.choice(_VOCAB, size=4))) for _ in range(args.queries)]
+    k = config.RAG_TOP_K
+
+    results = {"chunks": len(vectors), "dim": args.dim, "text_bytes": 0}
+    baseline = None
+    for chunk_store, encoding in _STORAGE_VARIANTS:
+        name = f"{chunk_store}_{encoding}"
+        # Same chunks and vectors each time; only the storage differs
+        built.vectorstore.index = build_index(vectors, "flat", encoding)
+        IndexRegistry(workdir / name, embeddings=embeddings, chunk_store=chunk_store).store(
+            dataclasses.replace(built, file_hash=name)
+        )
+
+        # Load from the snapshot in a fresh registry, as a new process would
+        gc.collect()
+        tracemalloc.start()
+        loaded, load_s = timed(
+            IndexRegistry(workdir / name, embeddings=embeddings, chunk_store=chunk_store).get, name
+        )
+        # The BM25 index loads the same way for both stores; leave it out
+        vs = loaded.vectorstore
+        del loaded
+        gc.collect()
+        heap_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        top_k, latencies = [], []
+        for q in queries:
+            hits, seconds = timed(vs.similarity_search_with_score_by_vector, q, k=k)
+            latencies.append(seconds)
+            top_k.append({doc.metadata["chunk_index"] for doc, _ in hits})
+        if baseline is None:
+            baseline = top_k
+            results["text_bytes"] = sum(len(doc.page_content) for doc in vs.docstore._dict.values())
+
+        snapshot = next((workdir / name).iterdir())
+        results[name] = {
+            "disk_bytes": sum(f.stat().st_size for f in snapshot.iterdir()),
+            "load_s": round(load_s, 4),
+            # Python objects created by the load (docstore Documents, dicts);
+            # FAISS allocations are counted in vector_bytes
+            "python_heap_bytes": heap_bytes,
+            "vector_bytes": vector_bytes(vs.index),
+            "resident_estimate_bytes": estimate_index_bytes(vs),
+            "search": percentiles(latencies),
+            "recall_at_k": round(
+                statistics.fmean(len(a & b) / k for a, b in zip(top_k, baseline)), 4
+            ),
+        }
+    return results
+
+
+def _history(n_messages: int):
+    messages = [SystemMessage(content="system prompt " * 50, id="sys")]
+    for i, line in enumerate(synthetic_lines(n_messages)):
+        cls = HumanMessage if i % 2 == 0 else AIMessage
+        messages.append(cls(content=line * 3, id=f"m{i}"))
+    return messages
+
+
+def bench_trimming(args) -> dict:
+    results = {}
+    for n in args.history_sizes:
+        messages = _history(n)
+        # First turn of a loaded history: nothing cached yet
+        (kept, counts), cold = timed(
+            trim_to_budget, messages, {}, estimate_message_tokens, config.MAX_TOKENS
+        )
+        # Steady state: counts for the history are cached in the state
+        all_counts = {m.id: estimate_message_tokens(m) for m in messages}
+        warm = [
+            timed(trim_to_budget, messages, all_counts, estimate_message_tokens, config.MAX_TOKENS)[1]
+            for _ in range(args.repeats)
+        ]
+        results[str(n)] = {
+            "kept_messages": len(kept),
+            "cold_ms": round(1000 * cold, 3),
+            "warm": percentiles(warm),
+        }
+    return results
+
+
+def bench_chat_stream(args, workdir: Path) -> dict:
+    model = FakeStreamingChatModel(ttft_seconds=args.ttft, tokens_per_second=args.tps)
+    graph = build_graph(model, checkpointer=SQLiteCheckpointer(workdir / "bench-checkpoints.sqlite"))
+    service = ChatService(graph)
+
+    ttfts, rates, overheads = [], [], []
+    for turn in range(args.turns):
+        start = time.perf_counter()
+        first = None
+        tokens = 0
+        for chunk, _ in service.stream(f"question {turn}", "bench", "Assistant", "English"):
+            if chunk.content:
+                tokens += 1
+                if first is None:
+                    first = time.perf_counter()
+        end = time.perf_counter()
+        ttfts.append(first - start)
+        overheads.append(first - start - args.ttft)
+        if tokens > 1:
+            rates.append((tokens - 1) / (end - first))
+
+    return {
+        "turns": args.turns,
+        "simulated_ttft_s": args.ttft,
+        "simulated_tokens_per_s": args.tps,
+        "ttft": percentiles(ttfts),
+        "pipeline_overhead": percentiles(overheads),
+        "tokens_per_s_p50": round(statistics.median(rates), 1) if rates else None,
+    }
+
+
+# ---------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=SECTIONS, help="Run only these sections")
+    parser.add_argument("--quick", action="store_true", help="Small sizes, for a fast smoke run")
+    parser.add_argument("--lines", type=int, default=5000, help="Lines per synthetic document")
+    parser.add_argument("--dim", type=int, default=768, help="Fake embedding dimension")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Simulated seconds per embedding request")
+    parser.add_argument("--embed-rpm", type=int, default=None, help="Simulated embedding requests/minute quota")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--history-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--ttft", type=float, default=0.05, help="Simulated model time to first token (s)")
+    parser.add_argument("--tps", type=float, default=200.0, help="Simulated model tokens per second")
+    parser.add_argument(
+        "--out",
+        default=str(Path(config.CACHE_DIR) / "benchmark.json"),
+        help="JSON results file (default: under the local cache directory)",
+    )
+    args = parser.parse_args()
+
+    if args.quick:
+        args.lines, args.queries, args.repeats, args.turns = 500, 30, 10, 5
+        args.history_sizes = [100, 1000]
+        args.dim = min(args.dim, 128)
+
+    sections = args.only or SECTIONS
+    results = {"environment": environment(), "args": vars(args)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runners = {
+            "extraction": lambda: bench_extraction(args),
+            "index_build": lambda: bench_index_build(args),
+            "retrieve": lambda: bench_retrieve(args),
+            "storage": lambda: bench_storage(args, Path(tmp)),
+            "trimming": lambda: bench_trimming(args),
+            "chat_stream": lambda: bench_chat_stream(args, Path(tmp)),
+        }
+        for name in sections:
+            print(f"[{name}] running...", flush=True)
+            results[name], seconds = timed(runners[name])
+            print(f"[{name}] done in {seconds:.1f}s")
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"\nWrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
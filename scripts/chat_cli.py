@@ -1,6 +1,7 @@
 # scripts/chat_cli.py
 import os
 import sys
+import uuid
 from pathlib import Path
 
 # --- Fix import path ---
@@ -31,23 +32,16 @@ os.environ["GOOGLE_API_KEY"] = secrets["GOOGLE_API_KEY"]
 os.environ["LANGSMITH_API_KEY"] = secrets.get("LANGSMITH_API_KEY", "")
 
 # --- Backend imports (after env vars are set) ---
-from backend.model import get_chat_model
-from backend.graph import build_graph
-from backend.chat_service import ChatService
+from backend.runtime import get_chat_service
+from backend.streaming import coalesce
 
 
 def main():
-    # Step 1: Initialize model
-    model = get_chat_model()
+    # Model + graph + ChatService (no RAG)
+    chat_service = get_chat_service()
 
-    
-    # Step 2: Build LangGraph
-    graph = build_graph(model)
-
-    # Step 3: Create ChatService (no RAG)
-    chat_service = ChatService(graph)
-
-    session_id = "cli-session"
+    # Conversation state and memory persist on disk: a fresh thread per run
+    session_id = f"cli-session-{uuid.uuid4().hex[:8]}"
 
     print("\n🤖 Chatbot CLI")
     print("Type 'exit' or 'quit' to stop.\n")
@@ -60,14 +54,13 @@ def main():
 
         print("AI: ", end="", flush=True)
 
-        for chunk, _ in chat_service.stream(
+        for text in coalesce(chat_service.stream(
             query=user_input,
             session_id=session_id,
             persona="Friendly Assistant",
             language="English",
-        ):
-            if hasattr(chunk, "content"):
-                print(chunk.content, end="", flush=True)
+        )):
+            print(text, end="", flush=True)
 
         print("\n")
 
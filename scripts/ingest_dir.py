@@ -0,0 +1,304 @@
+# scripts/ingest_dir.py
+"""
+Bulk, resumable ingestion of a directory tree into a document library.
+
+    python scripts/ingest_dir.py ./handbooks --library handbooks
+    python scripts/rag_cli.py --library handbooks
+
+Every supported file (pdf, txt, docx, csv) under the directory is:
+
+1. skipped if unchanged: same size/mtime as in the manifest, or the same
+   content (`compute_file_hash`) as an index the registry already has
+   (files with the same content as one queued in this run are recorded
+   once that file's index is stored)
+2. extracted and chunked in a process pool (`--workers`)
+3. embedded with bounded concurrency (`--embed-files` files at once, each
+   on the usual batched pipeline) under one shared requests/minute budget
+4. snapshotted to disk as its own index, and recorded in the manifest
+
+The manifest is saved after every file, and embedded chunks go to the
+on-disk embedding cache as each batch finishes, so a crashed or
+quota-limited run picks up where it stopped when run again. Once every
+file is in, the per-file indexes are merged into one library index that
+the chat entry points attach without loading (read on the first query).
+Files removed from the directory are dropped from the library.
+
+Exit status: 0 when the library is complete, 2 when the embedding quota
+ran out (re-run later to resume), 1 when some files failed to ingest.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# --- Fix import path ---
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from google.api_core.exceptions import ResourceExhausted
+
+from backend.config import EMBED_REQUESTS_PER_MINUTE
+from backend.document_rag import (
+    SUPPORTED_EXTENSIONS,
+    build_index_from_documents,
+    compute_file_hash,
+    iter_documents,
+    merge_indexes,
+)
+from backend.embedding_pipeline import EmbeddingPipelineError, TokenBucket
+from backend.index_registry import IndexRegistry, get_index_registry
+from backend.library import LIBRARY_DIR, Library
+
+
+def load_secrets() -> None:
+    """Export the API key from .streamlit/secrets.toml unless already set."""
+    if os.environ.get("GOOGLE_API_KEY"):
+        return
+    import tomllib
+
+    secrets_path = PROJECT_ROOT / ".streamlit" / "secrets.toml"
+    if not secrets_path.exists():
+        raise FileNotFoundError(
+            f"Secrets file not found at {secrets_path}; set GOOGLE_API_KEY or create it."
+        )
+    with open(secrets_path, "rb") as f:
+        secrets = tomllib.load(f)
+    os.environ["GOOGLE_API_KEY"] = secrets["GOOGLE_API_KEY"]
+
+
+def extract_chunks(path: str, filename: str):
+    """Worker process: read, extract and chunk one file."""
+    return list(iter_documents(Path(path).read_bytes(), filename, pdf_workers=1))
+
+
+def scan(root: Path) -> List[Path]:
+    """Supported files under `root`, skipping hidden files and directories."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+            if ext in SUPPORTED_EXTENSIONS and not name.startswith("."):
+                found.append(Path(dirpath) / name)
+    return found
+
+
+def plan(
+    root: Path, library: Library, registry: IndexRegistry
+) -> Tuple[List[Tuple[str, Path, str]], Dict[str, List[Tuple[str, Path]]]]:
+    """
+    Update the manifest for unchanged/renamed files and drop deleted ones.
+    Returns (relative path, path, file hash) of the files to ingest, and,
+    per queued hash, the other files with the same content: those are
+    recorded only once that index is stored.
+    """
+    todo = []
+    seen = set()
+    twins: Dict[str, List[Tuple[str, Path]]] = {}
+    for path in scan(root):
+        rel = path.relative_to(root).as_posix()
+        seen.add(rel)
+        stat = path.stat()
+        record = library.files.get(rel)
+
+        # Fast path: same size and mtime as last time, index still there
+        if (
+            record is not None
+            and "error" not in record
+            and record.get("size") == stat.st_size
+            and record.get("mtime") == stat.st_mtime
+            and registry.contains(record["file_hash"])
+        ):
+            continue
+
+        file_hash = compute_file_hash(path.read_bytes())
+        if file_hash in twins:
+            # Same content as a file queued in this run
+            twins[file_hash].append((rel, path))
+            library.files.pop(rel, None)
+            continue
+        if registry.contains(file_hash):
+            # Same content as an index built before (a previous run,
+            # another library or a chat upload)
+            library.files[rel] = {
+                "file_hash": file_hash,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "chunks": (record or {}).get("chunks"),
+            }
+            continue
+        todo.append((rel, path, file_hash))
+        twins[file_hash] = []
+
+    for rel in list(library.files):
+        if rel not in seen:
+            del library.files[rel]
+    return todo, twins
+
+
+def ingest(
+    root: Path,
+    library: Library,
+    registry: IndexRegistry,
+    workers: int,
+    embed_files: int,
+    requests_per_minute: float,
+) -> int:
+    """Ingest the pending files; returns the process exit status."""
+    todo, twins = plan(root, library, registry)
+    library.root = str(root.resolve())
+    library.save()
+
+    total = len(todo)
+    indexed = sum("error" not in r for r in library.files.values())
+    print(f"{indexed} file(s) already indexed, {total} to ingest")
+    if not total:
+        return 0
+
+    limiter = TokenBucket(requests_per_minute / 60.0)
+    pending = iter(todo)
+    extracting: Dict[Future, Tuple[str, Path, str]] = {}
+    embedding: Dict[Future, Tuple[str, Path, str]] = {}
+    done = failed = 0
+    quota_exhausted = False
+    started = time.time()
+
+    def record(rel: str, path: Path, entry: dict, file_hash: str) -> None:
+        """Record a file and its same-content twins (checkpointed after every file)."""
+        for twin_rel, twin_path in [(rel, path), *twins.get(file_hash, [])]:
+            stat = twin_path.stat()
+            twin_entry = entry
+            if twin_rel != rel and "error" in entry:
+                twin_entry = {"error": f"same content as {rel}: {entry['error']}"}
+            library.files[twin_rel] = {**twin_entry, "size": stat.st_size, "mtime": stat.st_mtime}
+        library.save()
+
+    with ProcessPoolExecutor(max_workers=workers) as extract_pool, \
+            ThreadPoolExecutor(max_workers=embed_files) as embed_pool:
+        while True:
+            # Keep a bounded number of files in flight (extracted chunks
+            # waiting for embedding are held in memory)
+            while not quota_exhausted and len(extracting) + len(embedding) < 2 * (workers + embed_files):
+                item = next(pending, None)
+                if item is None:
+                    break
+                rel, path, _ = item
+                # The relative path is the chunks' source (names repeat across folders)
+                extracting[extract_pool.submit(extract_chunks, str(path), rel)] = item
+
+            if not extracting and not embedding:
+                break
+
+            finished, _ = wait([*extracting, *embedding], return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future in extracting:
+                    rel, path, file_hash = item = extracting.pop(future)
+                    try:
+                        documents = future.result()
+                    except Exception as e:
+                        failed += 1
+                        record(rel, path, {"error": f"extraction failed: {e}"}, file_hash)
+                        print(f"  ✗ {rel}: {e}")
+                        continue
+                    if quota_exhausted:
+                        continue
+                    embedding[embed_pool.submit(
+                        build_index_from_documents,
+                        documents,
+                        file_hash,
+                        rel,
+                        embeddings=registry.embeddings,
+                        rate_limiter=limiter,
+                    )] = item
+                    continue
+
+                rel, path, file_hash = embedding.pop(future)
+                try:
+                    built = future.result()
+                    registry.store(built)
+                except (EmbeddingPipelineError, ResourceExhausted) as e:
+                    # Finished batches are in the embedding cache; stop
+                    # queueing work and let the next run resume
+                    quota_exhausted = True
+                    print(f"  ⏸ {rel}: {e}")
+                    continue
+                except Exception as e:
+                    failed += 1
+                    record(rel, path, {"error": str(e)}, file_hash)
+                    print(f"  ✗ {rel}: {e}")
+                    continue
+
+                done += 1
+                record(rel, path, {"file_hash": file_hash, "chunks": built.vectorstore.index.ntotal}, file_hash)
+                elapsed = time.time() - started
+                print(f"  ✓ [{done + failed}/{total}] {rel} ({built.vectorstore.index.ntotal} chunks, {elapsed:.0f}s)")
+
+    if quota_exhausted:
+        print("Embedding quota exhausted; progress is saved. Run the same command again to resume.")
+        return 2
+    return 1 if failed else 0
+
+
+def compile_library(library: Library, registry: IndexRegistry) -> None:
+    """Merge the per-file indexes into the library index (if the file set changed)."""
+    fingerprint = library.fingerprint()
+    if library.ready and library.index_fingerprint == fingerprint and registry.contains(library.index_id):
+        print("Library index is up to date")
+        return
+
+    hashes = library.indexed_hashes()
+    if not hashes:
+        print("No indexed files; nothing to merge")
+        return
+
+    started = time.time()
+    print(f"Merging {len(hashes)} file index(es)...")
+    parts = (registry.get(h) for h in hashes)
+    index_id = f"library-{library.name}-{fingerprint[:12]}"
+    merged = merge_indexes((p for p in parts if p is not None), index_id, f"library:{library.name}")
+    registry.store(merged)
+
+    previous = library.index_id
+    library.index_id = index_id
+    library.index_fingerprint = fingerprint
+    library.save()
+    if previous and previous != index_id:
+        registry.discard(previous)
+    print(f"Library index: {merged.vectorstore.index.ntotal} chunks ({time.time() - started:.1f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--library", help="Library name (default: the directory name)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Extraction processes")
+    parser.add_argument("--embed-files", type=int, default=2, help="Files embedded concurrently")
+    parser.add_argument("--rpm", type=float, default=EMBED_REQUESTS_PER_MINUTE,
+                        help="Embedding requests per minute, shared by all files")
+    args = parser.parse_args()
+
+    root = args.directory
+    if not root.is_dir():
+        parser.error(f"Not a directory: {root}")
+
+    load_secrets()
+    library = Library.load(args.library or root.resolve().name, LIBRARY_DIR)
+    registry = get_index_registry()
+
+    status = ingest(root, library, registry, max(1, args.workers), max(1, args.embed_files), args.rpm)
+    if status != 2:
+        compile_library(library, registry)
+
+    failures = library.failed()
+    if failures:
+        print(f"{len(failures)} file(s) failed (retried on the next run):")
+        for rel, error in sorted(failures.items()):
+            print(f"  {rel}: {error}")
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# scripts/load_test.py
+"""
+Concurrent-session load test: sync `ChatService.stream` vs async
+`ChatService.astream`.
+
+Runs `--sessions` chats of `--turns` turns each against a fake streaming
+model (backend/fakes.py) with a simulated time-to-first-token and token
+rate, so it needs no API key and spends no quota.
+
+- sync:  one thread per session, as Streamlit runs each browser
+         session's script on its own thread (no concurrency limit)
+- async: all sessions run concurrently on one event loop, limited to
+         `--max-concurrency` turns generating at once
+
+Both run the sessions concurrently, so the comparison is `stream` on
+threads vs `astream` on one loop.
+
+Reports turns/s, time-to-first-token (p50/p99) and wall time.
+
+Usage:
+    python scripts/load_test.py --sessions 50 --turns 3
+    python scripts/load_test.py --sessions 200 --ttft 0.5 --tps 60 --max-concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# --- Fix import path ---
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.chat_service import ChatService
+from backend.checkpoint import SQLiteCheckpointer
+from backend.fakes import FakeStreamingChatModel
+from backend.graph import build_graph
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def make_service(args, workdir: Path, name: str) -> ChatService:
+    model = FakeStreamingChatModel(ttft_seconds=args.ttft, tokens_per_second=args.tps)
+    graph = build_graph(model, checkpointer=SQLiteCheckpointer(workdir / f"{name}.sqlite"))
+    return ChatService(graph, max_concurrency=args.max_concurrency)
+
+
+def run_sync(service: ChatService, args) -> dict:
+    ttfts = []
+    lock = threading.Lock()
+
+    def session(s: int):
+        for turn in range(args.turns):
+            t0 = time.perf_counter()
+            first = None
+            for chunk, _ in service.stream(f"question {turn}", f"sync-{s}", "Assistant", "English"):
+                if first is None and chunk.content:
+                    first = time.perf_counter() - t0
+            with lock:
+                ttfts.append(first or 0.0)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions, thread_name_prefix="session") as pool:
+        # list() re-raises any session's exception
+        list(pool.map(session, range(args.sessions)))
+    return summarize("sync", ttfts, time.perf_counter() - start)
+
+
+async def run_async(service: ChatService, args) -> dict:
+    ttfts = []
+
+    async def session(s: int):
+        for turn in range(args.turns):
+            t0 = time.perf_counter()
+            first = None
+            async for chunk, _ in service.astream(f"question {turn}", f"async-{s}", "Assistant", "English"):
+                if first is None and chunk.content:
+                    first = time.perf_counter() - t0
+            ttfts.append(first or 0.0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(s) for s in range(args.sessions)))
+    return summarize("async", ttfts, time.perf_counter() - start)
+
+
+def summarize(path: str, ttfts, wall: float) -> dict:
+    return {
+        "path": path,
+        "turns": len(ttfts),
+        "wall_seconds": round(wall, 2),
+        "turns_per_second": round(len(ttfts) / wall, 2),
+        "ttft_p50_ms": round(1000 * percentile(ttfts, 0.50), 1),
+        "ttft_p99_ms": round(1000 * percentile(ttfts, 0.99), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Simulated time to first token (s)")
+    parser.add_argument("--tps", type=float, default=80.0, help="Simulated tokens per second")
+    parser.add_argument("--max-concurrency", type=int, default=32)
+    parser.add_argument("--skip-sync", action="store_true", help="Only run the async path")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    print(f"\n{args.sessions} sessions x {args.turns} turns, "
+          f"ttft={args.ttft}s, {args.tps} tokens/s, max concurrency {args.max_concurrency}\n")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        if not args.skip_sync:
+            results.append(run_sync(make_service(args, workdir, "sync"), args))
+        results.append(asyncio.run(run_async(make_service(args, workdir, "async"), args)))
+
+    print(f"{'path':<6} {'turns':>6} {'wall s':>8} {'turns/s':>8} {'ttft p50 ms':>12} {'ttft p99 ms':>12}")
+    for r in results:
+        print(
+            f"{r['path']:<6} {r['turns']:>6} {r['wall_seconds']:>8.2f} {r['turns_per_second']:>8.2f} "
+            f"{r['ttft_p50_ms']:>12.1f} {r['ttft_p99_ms']:>12.1f}"
+        )
+    if len(results) == 2:
+        print(f"\nasync / sync throughput: {results[1]['turns_per_second'] / results[0]['turns_per_second']:.1f}x")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
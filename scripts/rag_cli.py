@@ -1,6 +1,8 @@
 # scripts/rag_cli.py
+import argparse
 import os
 import sys
+import uuid
 import time
 from pathlib import Path
 
@@ -28,14 +30,13 @@ os.environ["GOOGLE_API_KEY"] = secrets["GOOGLE_API_KEY"]
 os.environ["LANGSMITH_API_KEY"] = secrets.get("LANGSMITH_API_KEY", "")
 
 # --- Backend imports (after env vars are set) ---
-from backend.model import get_chat_model
-from backend.graph import build_graph
-from backend.chat_service import ChatService
-from backend.document_rag import extract_text, compute_file_hash
-from backend.config import CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL_NAME
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
+from backend.runtime import get_chat_service
+from backend.collection import DocumentCollection
+from backend.index_registry import get_index_registry
+from backend.library import load_library
+from backend.embedding_cache import get_embedding_cache
+from backend.streaming import coalesce
+from backend.config import CHUNK_SIZE, CHUNK_OVERLAP
 
 
 def build_rag_vectorstore_from_path(file_path: str):
@@ -43,62 +44,69 @@ def build_rag_vectorstore_from_path(file_path: str):
     if not path.exists() or not path.is_file():
         raise FileNotFoundError(f"File not found: {file_path}")
 
-    print("\n[1/4] Reading file...")
+    print("\n[1/2] Reading file...")
     file_bytes = path.read_bytes()
     print(f"      Size: {len(file_bytes) / (1024 * 1024):.2f} MB")
 
-    print("[2/4] Extracting text...")
-    raw_text = extract_text(file_bytes, path.name)
-    print(f"      Extracted: {len(raw_text):,} characters")
-
-    if not raw_text.strip():
-        raise ValueError("No text extracted from document (PDF may be scanned/image-only).")
-
-    print("[3/4] Chunking text...")
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
+    print(
+        "[2/2] Extracting, chunking and embedding (streamed; "
+        f"chunk_size={CHUNK_SIZE}, overlap={CHUNK_OVERLAP})..."
     )
-    chunks = splitter.split_text(raw_text)
-    print(f"      Chunks: {len(chunks)} (chunk_size={CHUNK_SIZE}, overlap={CHUNK_OVERLAP})")
-
-    print("[4/4] Creating embeddings + FAISS index (this can take a while)...")
-    embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL_NAME)
-
-    # Small heartbeat so it doesn't look frozen
     start = time.time()
-    last_ping = start
 
-    # FAISS.from_texts will call embeddings internally; we ping occasionally
-    # by wrapping in a simple timer loop around the call.
-    # (We can't easily stream per-chunk progress without rewriting FAISS build.)
-    vs = None
+    def on_progress(done: int, total: int) -> None:
+        elapsed = time.time() - start
+        print(f"\r      Embedded {done}/{total} chunks so far ({elapsed:.1f}s)", end="", flush=True)
+
     try:
-        vs = FAISS.from_texts(chunks, embedding=embeddings)
+        # Shared registry: re-running on the same file reuses its snapshot
+        built = get_index_registry().acquire(
+            file_bytes, path.name, owner="rag-cli", progress_callback=on_progress
+        )
+    except ValueError as e:
+        if "No text" in str(e):
+            raise ValueError("No text extracted from document (PDF may be scanned/image-only).") from e
+        raise
     finally:
-        now = time.time()
-        elapsed = now - start
-        print(f"      Done. Time: {elapsed:.1f}s")
+        elapsed = time.time() - start
+        print(f"\n      Done. Time: {elapsed:.1f}s")
+        stats = get_embedding_cache().stats()
+        print(f"      Embedding cache: {stats['hits']} hits, {stats['misses']} misses")
 
-    file_hash = compute_file_hash(file_bytes)
-    return vs, path.name, file_hash
+    # Wrap in a collection so hybrid (BM25 + vector) retrieval is available
+    collection = DocumentCollection()
+    collection.add(built)
+    return collection, built.filename, built.file_hash
 
 
 def main():
+    parser = argparse.ArgumentParser(description="CLI RAG over a local document or an ingested library")
+    parser.add_argument("--library", help="Chat over a library built by scripts/ingest_dir.py")
+    args = parser.parse_args()
+
     print("\n🤖 RAG CLI (backend-only)")
     print("Type 'exit' or 'quit' to stop.\n")
 
-    file_path = input("Enter document path (pdf/txt/docx/csv): ").strip().strip('"')
-    if file_path.lower() in {"exit", "quit"}:
-        return
-
-    try:
-        vectorstore, filename, _ = build_rag_vectorstore_from_path(file_path)
-    except Exception as e:
-        print(f"\n❌ Failed to build RAG index: {e}\n")
-        return
-
-    print(f"\n✅ Loaded + embedded: {filename}\n")
+    if args.library:
+        # Attached by handle; the index is loaded on the first question
+        try:
+            vectorstore = load_library(args.library).collection()
+        except (FileNotFoundError, ValueError) as e:
+            print(f"\n❌ {e}\n")
+            return
+        print(f"✅ Library: {args.library}\n")
+    else:
+        file_path = input("Enter document path (pdf/txt/docx/csv): ").strip().strip('"')
+        if file_path.lower() in {"exit", "quit"}:
+            return
+
+        try:
+            vectorstore, filename, _ = build_rag_vectorstore_from_path(file_path)
+        except Exception as e:
+            print(f"\n❌ Failed to build RAG index: {e}\n")
+            return
+
+        print(f"\n✅ Loaded + embedded: {filename}\n")
 
     persona = input("Persona [Friendly Assistant / Formal Expert / Tech Support] (default: Friendly Assistant): ").strip()
     if not persona:
@@ -108,12 +116,15 @@ def main():
     if not language:
         language = "English"
 
+    retrieval_mode = input("Retrieval [hybrid / vector / lexical] (default: hybrid): ").strip().lower()
+    if retrieval_mode not in {"hybrid", "vector", "lexical"}:
+        retrieval_mode = "hybrid"
+
     # Init backend
-    model = get_chat_model()
-    graph = build_graph(model)
-    chat_service = ChatService(graph)
+    chat_service = get_chat_service()
 
-    session_id = "rag-cli-session"
+    # Conversation state and memory persist on disk: a fresh thread per run
+    session_id = f"rag-cli-session-{uuid.uuid4().hex[:8]}"
 
     while True:
         user_input = input("You: ").strip()
@@ -123,16 +134,16 @@ def main():
 
         print("AI: ", end="", flush=True)
 
-        for chunk, _ in chat_service.stream(
+        for text in coalesce(chat_service.stream(
             query=user_input,
             session_id=session_id,
             persona=persona,
             language=language,
             use_rag=True,
             vectorstore=vectorstore,
-        ):
-            if hasattr(chunk, "content") and chunk.content:
-                print(chunk.content, end="", flush=True)
+            retrieval_mode=retrieval_mode,
+        )):
+            print(text, end="", flush=True)
 
         print("\n")
 
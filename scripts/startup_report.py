@@ -0,0 +1,172 @@
+# scripts/startup_report.py
+"""
+Startup-time report: what the app pays before its first render and what
+the first document upload pays on top.
+
+Each probe runs in a fresh interpreter, so module caches from one probe
+do not hide the cost of the next:
+
+- import      import time, peak RSS and heavy libraries loaded by each
+              entry module (what a cold Streamlit/CLI/API start imports)
+- backend     building the shared model client + graph + ChatService
+              (fake model, in-memory checkpointer) and the cost each
+              extra session would pay if it built its own
+- first_ingest  first document ingestion (fake embeddings), which loads
+              the format parsers and FAISS on demand
+
+Needs no API key. Results are printed and optionally written as JSON.
+
+Usage:
+    python scripts/startup_report.py
+    python scripts/startup_report.py --out startup.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Libraries that should only load once a feature needs them
+HEAVY_MODULES = [
+    "faiss",
+    "docx",
+    "PyPDF2",
+    "langchain_community",
+    "langchain_text_splitters",
+    "langchain_google_genai",
+    "streamlit",
+    "aiohttp",
+]
+
+ENTRY_MODULES = [
+    "backend.chat_service",
+    "backend.runtime",
+    "backend.document_rag",
+    "backend.memory",
+    "backend.index_registry",
+    "backend.api",
+    "frontend.chat_ui",
+]
+
+_PRELUDE = f"""
+import json, resource, sys, time
+sys.path.insert(0, {str(PROJECT_ROOT)!r})
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def loaded():
+    return [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+"""
+
+_IMPORT_PROBE = """
+t0 = time.perf_counter()
+import {module}
+print(json.dumps({{
+    "seconds": round(time.perf_counter() - t0, 3),
+    "peak_rss_mb": peak_rss_mb(),
+    "heavy_modules": loaded(),
+}}))
+"""
+
+_BACKEND_PROBE = """
+from langgraph.checkpoint.memory import MemorySaver
+t0 = time.perf_counter()
+from backend.chat_service import ChatService
+from backend.fakes import FakeStreamingChatModel
+from backend.graph import build_graph
+import_s = time.perf_counter() - t0
+
+t0 = time.perf_counter()
+service = ChatService(build_graph(FakeStreamingChatModel(), checkpointer=MemorySaver()))
+first_s = time.perf_counter() - t0
+rss_one = peak_rss_mb()
+
+t0 = time.perf_counter()
+extra = [build_graph(FakeStreamingChatModel(), checkpointer=MemorySaver()) for _ in range({sessions})]
+per_session_s = (time.perf_counter() - t0) / {sessions}
+
+print(json.dumps({{
+    "import_seconds": round(import_s, 3),
+    "first_build_seconds": round(first_s, 3),
+    "per_session_build_seconds": round(per_session_s, 4),
+    "peak_rss_mb_shared": rss_one,
+    "peak_rss_mb_per_session_builds": peak_rss_mb(),
+    "sessions": {sessions},
+}}))
+"""
+
+_INGEST_PROBE = """
+from backend.document_rag import build_vectorstore_from_upload
+from backend.fakes import FakeEmbeddings
+before = loaded()
+text = "\\n".join(f"line {{i}} about topic {{i % 50}}" for i in range({lines})).encode()
+t0 = time.perf_counter()
+build_vectorstore_from_upload(text, "doc.txt", embeddings=FakeEmbeddings(size=128))
+print(json.dumps({{
+    "seconds": round(time.perf_counter() - t0, 3),
+    "heavy_modules_before": before,
+    "heavy_modules_after": loaded(),
+    "peak_rss_mb": peak_rss_mb(),
+}}))
+"""
+
+
+def probe(code: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(_PRELUDE) + textwrap.dedent(code)],
+        capture_output=True,
+        text=True,
+        cwd=PROJECT_ROOT,
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions for the per-session build estimate")
+    parser.add_argument("--lines", type=int, default=2000, help="Lines of the first ingested document")
+    parser.add_argument("--out", default=None, help="Optional JSON results file")
+    args = parser.parse_args()
+
+    report = {"import": {}}
+
+    print(f"{'module':<24} {'import s':>9} {'peak MB':>8}  heavy libraries loaded")
+    for module in ENTRY_MODULES:
+        r = report["import"][module] = probe(_IMPORT_PROBE.format(module=module))
+        if "error" in r:
+            print(f"{module:<24} {'-':>9} {'-':>8}  {r['error']}")
+            continue
+        print(f"{module:<24} {r['seconds']:>9.2f} {r['peak_rss_mb']:>8.1f}  {', '.join(r['heavy_modules']) or '-'}")
+
+    r = report["backend"] = probe(_BACKEND_PROBE.format(sessions=args.sessions))
+    print()
+    if "error" in r:
+        print(f"backend: {r['error']}")
+    else:
+        print(f"backend: first build {r['first_build_seconds']:.3f}s, "
+              f"+{r['per_session_build_seconds'] * 1000:.1f} ms per session if not shared; "
+              f"peak {r['peak_rss_mb_shared']} MB shared vs "
+              f"{r['peak_rss_mb_per_session_builds']} MB with {r['sessions']} per-session builds")
+
+    r = report["first_ingest"] = probe(_INGEST_PROBE.format(lines=args.lines))
+    if "error" in r:
+        print(f"first ingest: {r['error']}")
+    else:
+        print(f"first ingest: {r['seconds']:.2f}s; loaded on demand: "
+              f"{', '.join(sorted(set(r['heavy_modules_after']) - set(r['heavy_modules_before']))) or '-'}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nWrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# tests/test_chat_switch.py
+"""
+Switching chats must not detach documents: Streamlit drops the state of
+the hidden chat's uploader, so it comes back empty when the chat is
+opened again.
+"""
+from pathlib import Path
+
+import pytest
+from langchain_core.documents import Document
+
+pytest.importorskip("streamlit.testing.v1")
+from streamlit.testing.v1 import AppTest
+
+import backend.index_registry
+import backend.runtime
+from backend.fakes import FakeEmbeddings
+from backend.index_registry import IndexRegistry
+
+APP = Path(__file__).resolve().parents[1] / "frontend" / "streamlit_app.py"
+
+NOTES = b"Invoices are paid within 30 days. Refunds need a receipt."
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    # Budget of one byte: every index is spilled to disk and reloaded by warm()
+    registry = IndexRegistry(
+        tmp_path / "indexes",
+        memory_budget_bytes=1,
+        embeddings=FakeEmbeddings(size=32),
+    )
+    monkeypatch.setattr(backend.index_registry, "get_index_registry", lambda: registry)
+    monkeypatch.setattr(backend.runtime, "get_chat_service", lambda: None)
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    return registry
+
+
+def _app() -> AppTest:
+    at = AppTest.from_file(str(APP), default_timeout=30)
+    at.secrets["GOOGLE_API_KEY"] = "test"
+    return at
+
+
+def test_switching_chats_keeps_document_handles(registry):
+    at = _app()
+    at.run()
+    chat_a = at.session_state.active_chat_id
+
+    # Attach a document to chat A, as the uploader does
+    built = registry.acquire(NOTES, "notes.txt", owner=chat_a)
+    at.session_state.all_chats[chat_a]["collection"].add(built)
+    at.run()
+
+    # Open a new chat, then switch back to A
+    next(b for b in at.button if b.label == "➕ New chat").click().run()
+    assert at.session_state.active_chat_id != chat_a
+    at.button(key=f"open_{chat_a}").click().run()
+    assert at.session_state.active_chat_id == chat_a
+    assert not at.exception
+
+    collection = at.session_state.all_chats[chat_a]["collection"]
+    assert built.file_hash in collection
+    assert collection.warm() == 1
+    assert chat_a in registry._entries[built.file_hash].owners
+    hits = collection.similarity_search("refunds", k=1)
+    assert isinstance(hits[0], Document)
+
+
+def test_remove_button_releases_document(registry):
+    at = _app()
+    at.run()
+    chat_a = at.session_state.active_chat_id
+
+    built = registry.acquire(NOTES, "notes.txt", owner=chat_a)
+    at.session_state.all_chats[chat_a]["collection"].add(built)
+    at.run()
+
+    at.button(key=f"remove_{chat_a}_{built.file_hash}").click().run()
+    assert not at.exception
+
+    assert built.file_hash not in at.session_state.all_chats[chat_a]["collection"]
+    entry = registry._entries.get(built.file_hash)
+    assert entry is None or chat_a not in entry.owners